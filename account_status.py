@@ -3,34 +3,31 @@
 Show available cash, all current positions, open orders, and trade fills for the last 24 hours.
 """
 
-import yaml
-from ibkr import IBKRClient
+from broker_client import BrokerClient, BrokerError
+from settings import load_settings
 import sqlite3
 from datetime import datetime, timedelta
 
 
 def show_account_status():
     # Load config
-    with open('config.yaml', 'r') as f:
-        config = yaml.safe_load(f)
+    config = load_settings()
 
-    # Connect to IBKR
-    ibkr = IBKRClient(
-        paper=config.get('paper_trading', True),
-        client_id=config['client_id'] + 50,  # Unique client ID
-        port=config['tws_port']
-    )
-    if not ibkr.connect():
-        print("❌ Failed to connect to IBKR Gateway")
+    # Read everything from the broker service instead of opening another IBKR connection
+    broker = BrokerClient(config.broker_socket)
+    try:
+        broker.ping()
+    except BrokerError as e:
+        print(f"❌ {e}")
         return
 
     try:
         print("\n💰 Available Cash:")
-        summary = ibkr.get_account_summary()
+        summary = broker.account_summary()
         cash = None
         for item in summary:
-            tag = getattr(item, 'tag', None) or item.get('tag')
-            value = getattr(item, 'value', None) or item.get('value')
+            tag = item.get('tag')
+            value = item.get('value')
             if tag in ('TotalCashBalance', 'CashBalance', 'AvailableFunds'):
                 cash = value
                 break
@@ -40,19 +37,18 @@ def show_account_status():
             print("  (Could not determine cash balance)")
 
         print("\n📊 Current Positions:")
-        positions = ibkr.ib.positions()
-        positions = list(positions) if positions else []
+        positions = broker.positions()
         if not positions:
             print("  (No open positions)")
         else:
             for pos in positions:
-                symbol = pos.contract.symbol
-                qty = pos.position
-                avg_price = getattr(pos, 'avgCost', 'N/A')
+                symbol = pos['symbol']
+                qty = pos['position']
+                avg_price = pos.get('avg_cost', 'N/A')
                 print(f"  {symbol}: {qty} shares @ {avg_price}")
 
         print("\n📋 Open Orders:")
-        open_orders = ibkr.get_open_orders()
+        open_orders = broker.orders()
         if not open_orders:
             print("  (No open orders)")
         else:
@@ -88,7 +84,7 @@ def show_account_status():
             print(f"  ⚠️  Could not query fills: {e}")
 
     finally:
-        ibkr.disconnect()
+        broker.close()
 
 if __name__ == "__main__":
     show_account_status() 
\ No newline at end of file
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark trade_logs.db query latency before and after the schema migrations.
+
+Builds a legacy (unindexed) database with N orders and N trades, times the hot
+TradeDB queries, then opens it with TradeDB - which migrates it in place - and
+times the same queries again.
+
+Usage: python bench_database.py [rows]   (default 1,000,000)
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from database import TradeDB
+
+SYMBOLS = ['TQQQ', 'SOXL', 'SPXL', 'UPRO', 'TECL']
+ITERATIONS = 20
+
+# Same statements TradeDB issues on the hot path
+QUERIES = {
+    'count_open_orders': ("SELECT COUNT(*) FROM orders WHERE symbol = ? AND action = ? AND status = 'Open'", ('TQQQ', 'BUY')),
+    'get_committed_cash': ("SELECT SUM(price * quantity) FROM orders WHERE symbol = ? AND action = 'BUY' AND status = 'Open'", ('TQQQ',)),
+    'order_exists': ('SELECT 1 FROM orders WHERE order_id = ?', None),
+    'update_order_status': ('UPDATE orders SET status = status WHERE order_id = ?', None),
+    'order_has_fill': ('SELECT 1 FROM trades WHERE trade_id = ?', None),
+    'recent_trades': ('SELECT price FROM trades WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1', ('TQQQ',)),
+}
+
+
+def build_legacy_db(path, rows):
+    """Create the pre-migration schema and fill it with synthetic grid history"""
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, action TEXT, price REAL,
+        quantity INTEGER, timestamp TEXT DEFAULT CURRENT_TIMESTAMP, order_id INTEGER, status TEXT DEFAULT 'Open')''')
+    conn.execute('''CREATE TABLE trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, action TEXT, price REAL,
+        quantity INTEGER, timestamp TEXT DEFAULT CURRENT_TIMESTAMP, trade_id INTEGER)''')
+    rng = random.Random(42)
+    statuses = ['Filled'] * 8 + ['Cancelled'] + ['Open']
+    conn.executemany(
+        'INSERT INTO orders (symbol, action, price, quantity, timestamp, order_id, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        ((rng.choice(SYMBOLS), rng.choice(('BUY', 'SELL')), round(rng.uniform(20, 120), 2), 30,
+          f'2025-{i % 12 + 1:02d}-01T00:00:{i % 60:02d}', i + 1, rng.choice(statuses)) for i in range(rows)))
+    conn.executemany(
+        'INSERT INTO trades (symbol, action, price, quantity, timestamp, trade_id) VALUES (?, ?, ?, ?, ?, ?)',
+        ((rng.choice(SYMBOLS), rng.choice(('BUY', 'SELL')), round(rng.uniform(20, 120), 2), 30,
+          f'2025-{i % 12 + 1:02d}-01T00:00:{i % 60:02d}', i + 1) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def time_queries(conn, rows):
+    """Return median latency in milliseconds for each benchmark query"""
+    rng = random.Random(7)
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        samples = []
+        for _ in range(ITERATIONS):
+            args = params if params is not None else (rng.randint(1, rows),)
+            start = time.perf_counter()
+            conn.execute(sql, args).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        conn.rollback()
+        samples.sort()
+        results[name] = samples[len(samples) // 2]
+    return results
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench_trade_logs.db')
+        print(f"Building legacy database with {rows:,} orders and {rows:,} trades...")
+        build_legacy_db(path, rows)
+
+        conn = sqlite3.connect(path)
+        before = time_queries(conn, rows)
+        conn.close()
+
+        start = time.perf_counter()
+        db = TradeDB(path)
+        migrate_seconds = time.perf_counter() - start
+        print(f"Migrated to schema version {db.get_schema_version()} in {migrate_seconds:.1f}s")
+        after = time_queries(db._get_conn(), rows)
+        db.close()
+
+    print(f"\n{'query':<22}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] > 0 else float('inf')
+        print(f"{name:<22}{before[name]:>14.3f}{after[name]:>14.3f}{speedup:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
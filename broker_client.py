@@ -0,0 +1,117 @@
+# grid-trading/broker_client.py
+
+import itertools
+import json
+import socket
+import threading
+
+from settings import DEFAULT_SOCKET_PATH
+
+
+class BrokerError(Exception):
+    """The broker service rejected or failed a request"""
+
+
+class BrokerUnavailable(BrokerError):
+    """No broker service is listening (start main.py or broker_service.py)"""
+
+
+class BrokerClient:
+    """
+    Blocking client for the local broker service.
+
+    Keeps one Unix socket connection open, so repeated reads are a round trip over the
+    socket rather than a new IB Gateway session. Calls are serialized, so one client can be
+    shared between threads (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise BrokerUnavailable(f"Broker service not reachable at {self.path}: {e}")
+            self._sock = sock
+            self._reader = sock.makefile('rb')
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = None
+            self._reader = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, method: str, **params):
+        with self._lock:
+            self.connect()
+            request_id = next(self._ids)
+            try:
+                self._sock.sendall(json.dumps({'id': request_id, 'method': method, 'params': params}).encode() + b'\n')
+                line = self._reader.readline()
+            except OSError as e:
+                self.close()
+                raise BrokerUnavailable(f"Lost connection to broker service: {e}")
+            if not line:
+                self.close()
+                raise BrokerUnavailable("Broker service closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise BrokerError(response['error'])
+        return response['result']
+
+    # --- Convenience wrappers ------------------------------------------------
+
+    def ping(self) -> dict:
+        return self.call('ping')
+
+    def quote(self, symbol: str) -> float:
+        return self.call('quote', symbol=symbol)['price']
+
+    def freshness(self) -> dict:
+        return self.call('freshness')
+
+    def positions(self, symbol: str = None) -> list:
+        return self.call('positions', symbol=symbol)
+
+    def position(self, symbol: str) -> float:
+        return sum(entry['position'] for entry in self.positions(symbol))
+
+    def orders(self, symbol: str = None, action: str = None) -> list:
+        return self.call('orders', symbol=symbol, action=action)
+
+    def count_orders(self, symbol: str, action: str) -> int:
+        return len(self.orders(symbol, action))
+
+    def account_summary(self) -> list:
+        return self.call('account_summary')
+
+    def place_limit_order(self, symbol: str, action: str, quantity: int, price: float):
+        return self.call('place_limit_order', symbol=symbol, action=action, quantity=quantity, price=price)['order_id']
+
+    def cancel_order(self, order_id: int) -> int:
+        return self.call('cancel_order', order_id=order_id)['cancelled']
+
+    def cancel_orders(self, symbol: str, action: str = None, min_price: float = None,
+                      max_price: float = None) -> dict:
+        return self.call('cancel_orders', symbol=symbol, action=action, min_price=min_price, max_price=max_price)
+
+    def stats(self) -> dict:
+        return self.call('stats')
@@ -0,0 +1,230 @@
+# grid-trading/broker_service.py
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+from settings import DEFAULT_SOCKET_PATH
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+def _jsonable(record: dict) -> dict:
+    """Ledger/position dict without the live ib_async objects"""
+    return {key: value for key, value in record.items() if key != 'trade'}
+
+
+class BrokerService:
+    """
+    Local RPC service in front of one AsyncIBKRClient connection.
+
+    Scripts and the dashboard talk to it over a Unix socket with newline-delimited JSON
+    ({"id", "method", "params"} -> {"id", "result"} or {"id", "error"}) instead of opening
+    their own IB connections. Positions and orders are served straight from the in-memory
+    position book and order ledger; quotes and the account summary are cached for a short TTL.
+    """
+
+    def __init__(self, client, path: str = DEFAULT_SOCKET_PATH, quote_ttl: float = 1.0,
+                 account_ttl: float = 30.0):
+        self.client = client
+        self.path = path
+        self.quote_ttl = quote_ttl
+        self.account_ttl = account_ttl
+        self._server = None
+        self._cache = {}  # key -> (expires_at, result)
+        self.requests = 0
+        self.errors = 0
+        self.methods = {
+            'ping': self.ping,
+            'quote': self.quote,
+            'freshness': self.freshness,
+            'positions': self.positions,
+            'orders': self.orders,
+            'account_summary': self.account_summary,
+            'place_limit_order': self.place_limit_order,
+            'cancel_order': self.cancel_order,
+            'cancel_orders': self.cancel_orders,
+            'stats': self.stats,
+        }
+
+    # --- Server lifecycle ----------------------------------------------------
+
+    def _socket_alive(self) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            if self._socket_alive():
+                raise RuntimeError(f"Broker service already running on {self.path}")
+            os.unlink(self.path)  # Left behind by a process that did not shut down cleanly
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"Broker service listening on {self.path}")
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            logger.info("Broker service stopped")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            self.close()
+
+    # --- Protocol ------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.dispatch(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, line: bytes) -> dict:
+        """Decode one request line and run it; errors are returned, never raised"""
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            handler = self.methods.get(request.get('method'))
+            if handler is None:
+                raise ValueError(f"Unknown method: {request.get('method')}")
+            result = await handler(**(request.get('params') or {}))
+            return {'id': request_id, 'result': result}
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Broker request failed: {e}")
+            return {'id': request_id, 'error': str(e)}
+
+    async def _cached(self, key, ttl: float, fetch):
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+        result = await fetch()
+        self._cache[key] = (time.monotonic() + ttl, result)
+        return result
+
+    def invalidate(self, *prefixes):
+        for key in [key for key in self._cache if key[0] in prefixes]:
+            del self._cache[key]
+
+    # --- Methods -------------------------------------------------------------
+
+    async def ping(self):
+        return {'connected': bool(self.client.connected), 'time': time.time()}
+
+    async def _contract(self, symbol: str):
+        contract = await self.client.get_stock_contract(symbol)
+        if contract is None:
+            raise ValueError(f"Cannot qualify a contract for {symbol}")
+        return contract
+
+    async def quote(self, symbol: str):
+        price = self.client.market_data.latest_price(symbol)
+        if price is not None:
+            return {'symbol': symbol, 'price': price, 'age': self.client.market_data.age(symbol)}
+
+        async def fetch():
+            contract = await self._contract(symbol)
+            return {'symbol': symbol, 'price': await self.client.get_market_price(contract), 'age': 0.0}
+        return await self._cached(('quote', symbol), self.quote_ttl, fetch)
+
+    async def freshness(self):
+        return self.client.get_price_freshness()
+
+    async def positions(self, symbol: str = None):
+        book = self.client.positions
+        symbols = [symbol] if symbol else book.symbols()
+        return [entry for sym in symbols for entry in book.get(sym) if entry['position']]
+
+    async def orders(self, symbol: str = None, action: str = None):
+        return [_jsonable(record.to_dict()) for record in self.client.ledger
+                if (symbol is None or record.symbol == symbol) and (action is None or record.action == action)]
+
+    async def account_summary(self):
+        async def fetch():
+            summary = await self.client.get_account_summary()
+            return [{'account': item.account, 'tag': item.tag, 'value': item.value, 'currency': item.currency}
+                    for item in summary]
+        return await self._cached(('account_summary',), self.account_ttl, fetch)
+
+    async def place_limit_order(self, symbol: str, action: str, quantity: int, price: float):
+        contract = await self._contract(symbol)
+        trade = await self.client.place_limit_order(contract, action, quantity, price)
+        self.invalidate('account_summary')
+        return {'order_id': trade.order.orderId if trade is not None else None}
+
+    async def cancel_order(self, order_id: int):
+        await self.client.cancel_order(order_id)
+        return {'cancelled': 1}
+
+    async def cancel_orders(self, symbol: str, action: str = None, min_price: float = None,
+                            max_price: float = None):
+        """Cancel the symbol's open orders, optionally only one side and/or a price band"""
+        return await self.client.cancel_orders(symbol, action, min_price=min_price, max_price=max_price)
+
+    async def stats(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'pacer': self.client.pacer.get_stats(),
+            'connection': self.client.supervisor.get_stats(),
+            'memory': self.client.retention.get_stats(),
+            'market_data': self.client.market_data.get_stats(),
+        }
+
+
+if __name__ == "__main__":
+    # Standalone mode: host the service on its own connection when the trading bot is not running
+    from ibkr import AsyncIBKRClient
+    from database import TradeDB
+    from settings import load_settings
+    from utils import setup_daily_logging
+
+    setup_daily_logging(log_folder='logs', log_level=logging.INFO)
+    config = load_settings()
+
+    async def run():
+        client = AsyncIBKRClient(paper=config.paper_trading, client_id=config.client_id,
+                                 port=config.tws_port, db=TradeDB('trade_logs.db'), settings=config)
+        if not await client.connect():
+            print("❌ Failed to connect to IBKR Gateway")
+            return
+        await client.sync_open_orders_from_ibkr()
+        service = BrokerService(client, path=config.broker_socket)
+        print(f"🛰️  Broker service listening on {service.path}")
+        try:
+            await service.serve_forever()
+        finally:
+            client.disconnect()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("👋 Broker service stopped")
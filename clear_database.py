@@ -41,6 +41,12 @@ def clear_database():
         conn.execute("DELETE FROM positions")
         print(f"🗑️  Deleted {positions_count} positions")
         
+        # Clear bracket lots, executions and the execution cursor (only present once TradeDB has migrated the file)
+        for table in ('lots', 'executions', 'sync_cursors'):
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                deleted = conn.execute(f"DELETE FROM {table}").rowcount
+                print(f"🗑️  Deleted {deleted} {table}")
+        
         # Note: cancels table has been removed in favor of status-based tracking
         
         # Clear latest_prices table
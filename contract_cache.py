@@ -0,0 +1,81 @@
+# grid-trading/contract_cache.py
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# Contract fields needed to rebuild a qualified Stock without asking IBKR again
+CONTRACT_FIELDS = ('conId', 'symbol', 'secType', 'exchange', 'primaryExchange', 'currency',
+                   'localSymbol', 'tradingClass')
+# ContractDetails fields the bot uses (tick rounding, session checks)
+DETAIL_FIELDS = ('minTick', 'longName', 'timeZoneId', 'tradingHours', 'liquidHours')
+
+
+class ContractCache:
+    """
+    On-disk cache of qualified stock contracts and their ContractDetails, keyed by symbol.
+
+    Shared by the bot, the dashboard and the ops scripts through one JSON file, so only the
+    first process after the TTL expires pays for qualifyContracts/reqContractDetails.
+    """
+
+    def __init__(self, path: str = 'contract_cache.json', ttl: float = 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable contract cache {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        # Write to a temp file and rename so a concurrent reader never sees a partial file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.contract_cache', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write contract cache {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """Cached entry for symbol, or None if missing or older than the TTL"""
+        entry = self._entries.get(symbol)
+        if entry is None or time.time() - entry.get('cached_at', 0) > self.ttl:
+            return None
+        return entry
+
+    def put(self, symbol: str, contract, details=None) -> dict:
+        """Store a qualified contract (and optionally its ContractDetails)"""
+        entry = {field: getattr(contract, field, None) for field in CONTRACT_FIELDS}
+        if details is not None:
+            entry.update({field: getattr(details, field, None) for field in DETAIL_FIELDS})
+        entry['cached_at'] = time.time()
+        with self._lock:
+            # Re-read first so entries written by other processes are not lost
+            self._entries = self._load()
+            self._entries[symbol] = entry
+            self._save()
+        return entry
+
+    def invalidate(self, symbol: str):
+        with self._lock:
+            self._entries = self._load()
+            if self._entries.pop(symbol, None) is not None:
+                self._save()
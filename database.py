@@ -1,16 +1,233 @@
 # grid-trading/database.py
 
+import logging
 import sqlite3
+import threading
+import time
 from datetime import datetime
 
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# Seconds SQLite's own busy handler waits before we count the statement as a lock wait
+LOCK_POLL_INTERVAL = 0.05
+
+
+# Ordered schema migrations applied in place to existing databases. Each entry is
+# (version, description, steps); a step is an SQL string or a callable taking the connection.
+# Never edit a released migration - append a new one instead.
+MIGRATIONS = [
+    (1, 'Index open-order lookups', [
+        # Covering index for count_open_orders / get_committed_cash
+        'CREATE INDEX IF NOT EXISTS idx_orders_symbol_action_status ON orders (symbol, action, status, price, quantity)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders (order_id)',
+    ]),
+    (2, 'Index trade lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_trades_trade_id ON trades (trade_id)',
+        'CREATE INDEX IF NOT EXISTS idx_trades_symbol_timestamp ON trades (symbol, timestamp)',
+    ]),
+    (3, 'Unique broker ids for idempotent upserts', [
+        # Keep the newest row for any broker id recorded more than once by the old check-then-insert path
+        'DELETE FROM orders WHERE order_id IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM orders WHERE order_id IS NOT NULL GROUP BY order_id)',
+        'DELETE FROM trades WHERE trade_id IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM trades WHERE trade_id IS NOT NULL GROUP BY trade_id)',
+        'DROP INDEX IF EXISTS idx_orders_order_id',
+        'DROP INDEX IF EXISTS idx_trades_trade_id',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_orders_order_id ON orders (order_id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_trades_trade_id ON trades (trade_id)',
+    ]),
+    (4, 'Bracket lot ledger and running cost basis for incremental PnL', [
+        '''CREATE TABLE IF NOT EXISTS lots (
+            parent_order_id INTEGER PRIMARY KEY,
+            child_order_id INTEGER UNIQUE,
+            symbol TEXT,
+            buy_quantity REAL DEFAULT 0,
+            buy_notional REAL DEFAULT 0,
+            sell_quantity REAL DEFAULT 0,
+            sell_notional REAL DEFAULT 0,
+            realized REAL DEFAULT 0,
+            status TEXT DEFAULT 'Open',
+            opened_at TEXT,
+            closed_at TEXT
+        )''',
+        'ALTER TABLE pnl ADD COLUMN buy_quantity REAL DEFAULT 0',
+        'ALTER TABLE pnl ADD COLUMN buy_notional REAL DEFAULT 0',
+        # Seed the running cost basis once from existing history
+        "INSERT OR IGNORE INTO pnl (symbol, realized) SELECT DISTINCT symbol, 0 FROM trades WHERE action = 'BUY'",
+        '''UPDATE pnl SET
+            buy_quantity = (SELECT COALESCE(SUM(quantity), 0) FROM trades WHERE trades.symbol = pnl.symbol AND action = 'BUY'),
+            buy_notional = (SELECT COALESCE(SUM(price * quantity), 0) FROM trades WHERE trades.symbol = pnl.symbol AND action = 'BUY')''',
+    ]),
+    (5, 'Per-execution fills and commissions', [
+        '''CREATE TABLE IF NOT EXISTS executions (
+            exec_id TEXT PRIMARY KEY,
+            order_id INTEGER,
+            perm_id INTEGER,
+            symbol TEXT,
+            action TEXT,
+            price REAL,
+            quantity REAL,
+            commission REAL,
+            exec_time TEXT
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_executions_order_id ON executions (order_id)',
+    ]),
+    (6, 'Average cost and unrealized PnL on positions', [
+        'ALTER TABLE positions ADD COLUMN avg_cost REAL',
+        'ALTER TABLE positions ADD COLUMN unrealized_pnl REAL',
+        'ALTER TABLE positions ADD COLUMN market_value REAL',
+        'ALTER TABLE positions ADD COLUMN updated_at TEXT',
+    ]),
+    (7, 'Execution backfill cursor', [
+        '''CREATE TABLE IF NOT EXISTS sync_cursors (
+            name TEXT PRIMARY KEY,
+            exec_time TEXT,
+            exec_id TEXT,
+            updated_at TEXT
+        )''',
+        # Start from the newest execution already on file
+        '''INSERT OR IGNORE INTO sync_cursors (name, exec_time, exec_id, updated_at)
+           SELECT 'executions', exec_time, exec_id, datetime('now') FROM executions
+           ORDER BY exec_time DESC, exec_id DESC LIMIT 1''',
+    ]),
+]
+
+_ADVANCE_EXEC_CURSOR_SQL = '''
+    INSERT INTO sync_cursors (name, exec_time, exec_id, updated_at) VALUES ('executions', ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET exec_time = excluded.exec_time, exec_id = excluded.exec_id, updated_at = excluded.updated_at
+    WHERE sync_cursors.exec_time IS NULL
+       OR excluded.exec_time > sync_cursors.exec_time
+       OR (excluded.exec_time = sync_cursors.exec_time AND excluded.exec_id > sync_cursors.exec_id)
+'''
+
+# Upserts keyed on the broker id. Re-recording an order never reopens it or loses a known price;
+# re-recording a trade refreshes its cumulative fill.
+_UPSERT_ORDER_SQL = '''
+    INSERT INTO orders (symbol, action, price, quantity, timestamp, order_id, status)
+    VALUES (?, ?, ?, ?, ?, ?, 'Open')
+    ON CONFLICT(order_id) DO UPDATE SET
+        symbol = excluded.symbol,
+        action = excluded.action,
+        price = COALESCE(excluded.price, orders.price),
+        quantity = excluded.quantity
+'''
+_UPSERT_TRADE_SQL = '''
+    INSERT INTO trades (symbol, action, price, quantity, timestamp, trade_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(trade_id) DO UPDATE SET
+        price = excluded.price,
+        quantity = excluded.quantity
+'''
+_UPDATE_STATUS_SQL = 'UPDATE orders SET status = ? WHERE order_id = ?'
+_UPSERT_LOT_SQL = '''
+    INSERT INTO lots (symbol, parent_order_id, child_order_id, opened_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(parent_order_id) DO UPDATE SET child_order_id = excluded.child_order_id
+'''
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that retries statements blocked by another writer and counts the waits."""
+
+    def execute(self, sql, parameters=()):
+        return self._db._retry_locked(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._db._retry_locked(super().executemany, sql, seq_of_parameters)
+
+
 class TradeDB:
-    def __init__(self, db_path):
+    def __init__(self, db_path, busy_timeout=5.0, cached_statements=256):
         self.db_path = db_path
-        # self.conn = sqlite3.connect(db_path)  # Remove persistent connection for safety
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        # One long-lived connection per thread; the bot loop, ib_async callbacks and the
+        # dashboard each get their own and WAL lets readers proceed while a write is in flight.
+        self._local = threading.local()
+        self._conns = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'connections_opened': 0,
+            'connection_reuses': 0,
+            'lock_waits': 0,
+            'lock_wait_seconds': 0.0,
+        }
         self._create_tables()
 
+    def _open_conn(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=LOCK_POLL_INTERVAL,
+            factory=_PooledConnection,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # only ever used by the owning thread, but close() may run elsewhere
+        )
+        conn._db = self
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(LOCK_POLL_INTERVAL * 1000)}')
+        with self._lock:
+            self._conns.append(conn)
+            self._stats['connections_opened'] += 1
+        return conn
+
     def _get_conn(self):
-        return sqlite3.connect(self.db_path)
+        """Return this thread's pooled connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._open_conn()
+            self._local.conn = conn
+            self._local.generation = self._generation
+        else:
+            with self._lock:
+                self._stats['connection_reuses'] += 1
+        return conn
+
+    def _retry_locked(self, fn, *args):
+        """Run fn, retrying while the database is locked for up to busy_timeout seconds."""
+        started = None
+        try:
+            while True:
+                try:
+                    return fn(*args)
+                except sqlite3.OperationalError as e:
+                    message = str(e)
+                    if 'locked' not in message and 'busy' not in message:
+                        raise
+                    now = time.monotonic()
+                    if started is None:
+                        started = now
+                        with self._lock:
+                            self._stats['lock_waits'] += 1
+                    if now - started >= self.busy_timeout:
+                        raise
+                    time.sleep(LOCK_POLL_INTERVAL)
+        finally:
+            if started is not None:
+                with self._lock:
+                    self._stats['lock_wait_seconds'] += time.monotonic() - started
+
+    def get_stats(self):
+        """Connection pool counters: connections opened, reuses, lock waits and time spent waiting."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_connections'] = len(self._conns)
+        return stats
+
+    def close(self):
+        """Close every pooled connection; threads transparently reconnect on next use."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._generation += 1
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def checkpoint(self):
+        """Merge the WAL back into the main database file without blocking readers"""
+        with self._get_conn() as conn:
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
 
     def _create_tables(self):
         with self._get_conn() as conn:
@@ -48,40 +265,244 @@ class TradeDB:
             )''')
             # Drop cancels table if it exists
             conn.execute('DROP TABLE IF EXISTS cancels')
-            conn.commit()
+            conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )''')
+        self._migrate()
 
-    def record_trade(self, symbol, action, price, quantity, trade_id=None):
+    def get_schema_version(self):
+        """Return the highest migration version applied to this database"""
         with self._get_conn() as conn:
-            conn.execute(
-                'INSERT INTO trades (symbol, action, price, quantity, timestamp, trade_id) VALUES (?, ?, ?, ?, ?, ?)',
-                (symbol, action, price, quantity, datetime.utcnow().isoformat(), trade_id)
-            )
+            row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+            return row[0] or 0
+
+    def _migrate(self):
+        """Apply pending MIGRATIONS in order, one transaction per migration."""
+        conn = self._get_conn()
+        for version, description, steps in MIGRATIONS:
+            if version <= self.get_schema_version():
+                continue
+            # BEGIN IMMEDIATE serialises concurrent migrators (bot + dashboard starting together)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                applied = conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone()
+                if not applied:
+                    for step in steps:
+                        if callable(step):
+                            step(conn)
+                        else:
+                            conn.execute(step)
+                    conn.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                                 (version, description, datetime.utcnow().isoformat()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Database migration {version} ({description}) failed")
+                raise
+            if not applied:
+                logger.info(f"Applied database migration {version}: {description}")
+
+    def record_trade(self, symbol, action, price, quantity, trade_id=None):
+        """Insert a trade, or update its cumulative fill if trade_id was already recorded"""
+        self.record_batch(trades=[(symbol, action, price, quantity, trade_id)])
 
     def record_order(self, symbol, action, price, quantity, order_id=None):
-        with self._get_conn() as conn:
-            conn.execute('INSERT INTO orders (symbol, action, price, quantity, timestamp, order_id, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                              (symbol, action, price, quantity, datetime.utcnow().isoformat(), order_id, 'Open'))
+        """Insert an order, or refresh it if order_id was already recorded"""
+        self.record_batch(orders=[(symbol, action, price, quantity, order_id)])
 
     def update_order_status(self, order_id, status):
+        self.record_batch(statuses=[(order_id, status)])
+
+    def record_orders(self, orders):
+        """Upsert many (symbol, action, price, quantity, order_id) rows in one transaction"""
+        self.record_batch(orders=orders)
+
+    def record_trades(self, trades):
+        """Upsert many (symbol, action, price, quantity, trade_id) rows in one transaction"""
+        self.record_batch(trades=trades)
+
+    def update_order_statuses(self, statuses):
+        """Apply many (order_id, status) updates in one transaction"""
+        self.record_batch(statuses=statuses)
+
+    def record_batch(self, orders=(), trades=(), statuses=(), lots=()):
+        """
+        Persist one cycle's order rows, trade rows and status changes in a single transaction.
+
+        Args:
+            orders: (symbol, action, price, quantity, order_id) tuples
+            trades: (symbol, action, price, quantity, trade_id) tuples
+            statuses: (order_id, status) tuples, applied after orders and trades
+            lots: (symbol, parent_order_id, child_order_id) bracket links
+        """
+        now = datetime.utcnow().isoformat()
+        order_rows = [(symbol, action, price, quantity, now, order_id)
+                      for symbol, action, price, quantity, order_id in orders]
+        trade_rows = [(symbol, action, price, quantity, now, trade_id)
+                      for symbol, action, price, quantity, trade_id in trades]
+        status_rows = [(status, order_id) for order_id, status in statuses if order_id is not None]
+        lot_rows = [(symbol, parent_id, child_id, now) for symbol, parent_id, child_id in lots]
+        if not (order_rows or trade_rows or status_rows or lot_rows):
+            return
         with self._get_conn() as conn:
-            conn.execute('UPDATE orders SET status = ? WHERE order_id = ?', (status, order_id))
+            if lot_rows:
+                conn.executemany(_UPSERT_LOT_SQL, lot_rows)
+            if order_rows:
+                conn.executemany(_UPSERT_ORDER_SQL, order_rows)
+            if trade_rows:
+                conn.executemany(_UPSERT_TRADE_SQL, trade_rows)
+            if status_rows:
+                conn.executemany(_UPDATE_STATUS_SQL, status_rows)
 
     def get_committed_cash(self, symbol):
         """Get total cash committed to open buy orders"""
         with self._get_conn() as conn:
-            result = conn.execute('SELECT SUM(price * quantity) FROM orders WHERE symbol = ? AND action = "BUY" AND status = "Open"', (symbol,)).fetchone()
+            result = conn.execute("SELECT SUM(price * quantity) FROM orders WHERE symbol = ? AND action = 'BUY' AND status = 'Open'", (symbol,)).fetchone()
             return result[0] if result[0] else 0.0
 
-    def record_realized_pnl(self, symbol, sell_price, quantity):
-        """Record realized PnL from a sell trade"""
+    def record_execution(self, exec_id, order_id, symbol, action, price, quantity, exec_time=None, perm_id=None):
+        """Record one broker execution; returns False if exec_id was already recorded"""
+        return bool(self.record_executions([(exec_id, order_id, symbol, action, price, quantity, exec_time, perm_id)]))
+
+    def record_executions(self, executions):
+        """
+        Record broker executions and advance the execution cursor in one transaction.
+
+        Args:
+            executions: (exec_id, order_id, symbol, action, price, quantity, exec_time, perm_id) tuples
+
+        Returns:
+            Set of exec_ids that had not been recorded before
+        """
+        now = datetime.utcnow().isoformat()
+        new_ids = set()
+        latest = None
+        with self._get_conn() as conn:
+            for exec_id, order_id, symbol, action, price, quantity, exec_time, perm_id in executions:
+                exec_time = exec_time or now
+                cursor = conn.execute(
+                    '''INSERT OR IGNORE INTO executions (exec_id, order_id, perm_id, symbol, action, price, quantity, exec_time)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (exec_id, order_id, perm_id, symbol, action, price, quantity, exec_time))
+                if cursor.rowcount == 1:
+                    new_ids.add(exec_id)
+                if latest is None or (exec_time, exec_id) > latest:
+                    latest = (exec_time, exec_id)
+            if latest is not None:
+                conn.execute(_ADVANCE_EXEC_CURSOR_SQL, (latest[0], latest[1], now))
+        return new_ids
+
+    def get_exec_cursor(self):
+        """(exec_time, exec_id) of the newest processed execution, or None"""
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT exec_time, exec_id FROM sync_cursors WHERE name = 'executions'").fetchone()
+            return (row[0], row[1]) if row and row[0] else None
+
+    def record_commission(self, exec_id, commission):
+        """Attach the commission report to its execution"""
         with self._get_conn() as conn:
-            # Get average buy price for this symbol
-            avg_buy = conn.execute(
-                'SELECT AVG(price) FROM trades WHERE symbol = ? AND action = "BUY"', (symbol,)).fetchone()[0] or 0.0
-            realized = (sell_price - avg_buy) * quantity
-            current = self.get_realized_pnl(symbol)
-            updated = current + realized
-            conn.execute('REPLACE INTO pnl (symbol, realized) VALUES (?, ?)', (symbol, updated))
+            conn.execute('UPDATE executions SET commission = ? WHERE exec_id = ?', (commission, exec_id))
+
+    def get_executions(self, order_id):
+        """Get all executions recorded for an order"""
+        with self._get_conn() as conn:
+            rows = conn.execute('''SELECT exec_id, symbol, action, price, quantity, commission, exec_time
+                                    FROM executions WHERE order_id = ? ORDER BY exec_time''', (order_id,)).fetchall()
+            return [
+                {
+                    'exec_id': row[0],
+                    'symbol': row[1],
+                    'action': row[2],
+                    'price': row[3],
+                    'quantity': row[4],
+                    'commission': row[5],
+                    'exec_time': row[6]
+                }
+                for row in rows
+            ]
+
+    def record_cost_basis(self, symbol, price, quantity, order_id=None):
+        """Add a BUY fill to its bracket lot and to the symbol's running cost basis"""
+        with self._get_conn() as conn:
+            if order_id is not None:
+                conn.execute('''UPDATE lots SET buy_quantity = buy_quantity + ?, buy_notional = buy_notional + ?, status = 'Holding'
+                                WHERE parent_order_id = ?''', (quantity, price * quantity, order_id))
+            conn.execute('''INSERT INTO pnl (symbol, realized, buy_quantity, buy_notional) VALUES (?, 0, ?, ?)
+                            ON CONFLICT(symbol) DO UPDATE SET
+                                buy_quantity = pnl.buy_quantity + excluded.buy_quantity,
+                                buy_notional = pnl.buy_notional + excluded.buy_notional''',
+                         (symbol, quantity, price * quantity))
+
+    def record_realized_pnl(self, symbol, sell_price, quantity, order_id=None):
+        """
+        Record realized PnL from a sell fill and return the amount realized.
+
+        A take-profit fill closes against its own bracket parent via the lots table.
+        Sells with no linked lot fall back to the symbol's running average cost.
+        """
+        with self._get_conn() as conn:
+            lot = None
+            if order_id is not None:
+                lot = conn.execute('SELECT parent_order_id, buy_quantity, buy_notional FROM lots WHERE child_order_id = ?',
+                                   (order_id,)).fetchone()
+            if lot and lot[1]:
+                cost = lot[2] / lot[1]
+            else:
+                row = conn.execute('SELECT buy_quantity, buy_notional FROM pnl WHERE symbol = ?', (symbol,)).fetchone()
+                cost = row[1] / row[0] if row and row[0] else 0.0
+            realized = (sell_price - cost) * quantity
+            if lot:
+                conn.execute('''UPDATE lots SET
+                                    sell_quantity = sell_quantity + ?,
+                                    sell_notional = sell_notional + ?,
+                                    realized = realized + ?,
+                                    status = CASE WHEN sell_quantity + ? >= buy_quantity THEN 'Closed' ELSE status END,
+                                    closed_at = CASE WHEN sell_quantity + ? >= buy_quantity THEN ? ELSE closed_at END
+                                WHERE parent_order_id = ?''',
+                             (quantity, sell_price * quantity, realized, quantity, quantity,
+                              datetime.utcnow().isoformat(), lot[0]))
+            conn.execute('''INSERT INTO pnl (symbol, realized) VALUES (?, ?)
+                            ON CONFLICT(symbol) DO UPDATE SET realized = pnl.realized + excluded.realized''',
+                         (symbol, realized))
+            return realized
+
+    def get_lot(self, parent_order_id):
+        """Get the bracket lot opened by a parent BUY order"""
+        with self._get_conn() as conn:
+            row = conn.execute('''SELECT symbol, parent_order_id, child_order_id, buy_quantity, buy_notional,
+                                          sell_quantity, sell_notional, realized, status
+                                   FROM lots WHERE parent_order_id = ?''', (parent_order_id,)).fetchone()
+            if row:
+                return {
+                    'symbol': row[0],
+                    'parent_order_id': row[1],
+                    'child_order_id': row[2],
+                    'buy_quantity': row[3],
+                    'buy_notional': row[4],
+                    'sell_quantity': row[5],
+                    'sell_notional': row[6],
+                    'realized': row[7],
+                    'status': row[8]
+                }
+            return None
+
+    def get_holding_lots(self, symbol):
+        """Bracket lots whose BUY has filled and whose take-profit has not, with their average buy price"""
+        with self._get_conn() as conn:
+            rows = conn.execute('''SELECT parent_order_id, child_order_id, buy_quantity - sell_quantity, buy_notional / buy_quantity
+                                   FROM lots WHERE symbol = ? AND status = 'Holding' AND buy_quantity > 0''',
+                                (symbol,)).fetchall()
+            return [
+                {
+                    'parent_order_id': row[0],
+                    'child_order_id': row[1],
+                    'quantity': row[2],
+                    'buy_price': row[3]
+                }
+                for row in rows
+            ]
 
     def get_realized_pnl(self, symbol):
         """Get total realized PnL for a symbol"""
@@ -125,37 +546,32 @@ class TradeDB:
 
     def clear_all(self):
         """Delete all records from orders, trades, positions, and other relevant tables."""
-        conn = self._get_conn()
-        try:
+        with self._get_conn() as conn:
             conn.execute('DELETE FROM orders')
             conn.execute('DELETE FROM trades')
             conn.execute('DELETE FROM positions')
+            conn.execute('DELETE FROM lots')
+            conn.execute('DELETE FROM executions')
+            conn.execute('DELETE FROM sync_cursors')
             # Add more tables here if needed
-            conn.commit()
-        finally:
-            conn.close()
 
     def get_position(self, symbol):
-        conn = self._get_conn()
-        try:
+        with self._get_conn() as conn:
             row = conn.execute('SELECT position FROM positions WHERE symbol = ?', (symbol,)).fetchone()
             return row[0] if row else 0
-        finally:
-            conn.close()
 
     def get_all_positions(self):
-        conn = self._get_conn()
-        try:
-            rows = conn.execute('SELECT symbol, position FROM positions').fetchall()
-            return [{"symbol": r[0], "position": r[1]} for r in rows]
-        finally:
-            conn.close()
+        with self._get_conn() as conn:
+            rows = conn.execute('SELECT symbol, position, avg_cost, unrealized_pnl, market_value FROM positions').fetchall()
+            return [{"symbol": r[0], "position": r[1], "avg_cost": r[2], "unrealized_pnl": r[3], "market_value": r[4]}
+                    for r in rows]
 
-    def update_position(self, symbol, position):
+    def update_position(self, symbol, position, avg_cost=None, unrealized_pnl=None, market_value=None):
         with self._get_conn() as conn:
             conn.execute(
-                'REPLACE INTO positions (symbol, position) VALUES (?, ?)',
-                (symbol, position)
+                'REPLACE INTO positions (symbol, position, avg_cost, unrealized_pnl, market_value, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (symbol, position, avg_cost, unrealized_pnl, market_value, datetime.utcnow().isoformat())
             )
 
     def order_exists(self, symbol, action, price, quantity, order_id=None):
@@ -218,17 +634,13 @@ class TradeDB:
 
     def mark_order_filled(self, order_id):
         """Mark an order as filled by updating status to 'Filled'"""
-        with self._get_conn() as conn:
-            conn.execute('UPDATE orders SET status = ? WHERE order_id = ?', ('Filled', order_id))
+        self.update_order_status(order_id, 'Filled')
 
     def record_cancel(self, symbol, action, price, quantity, order_id=None):
         """Record a cancelled order by updating status to 'Cancelled'"""
-        with self._get_conn() as conn:
-            if order_id is not None:
-                conn.execute('UPDATE orders SET status = ? WHERE order_id = ?', ('Cancelled', order_id))
-            else:
-                # If no order_id, we can't update, so this method is mainly for order_id-based cancels
-                pass
+        # Without an order_id there is no row to update, so this is mainly for order_id-based cancels
+        if order_id is not None:
+            self.update_order_status(order_id, 'Cancelled')
 
     def get_trade_by_order_id(self, order_id):
         with self._get_conn() as conn:
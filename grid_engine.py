@@ -0,0 +1,360 @@
+# grid-trading/grid_engine.py
+
+import asyncio
+import logging
+
+from grid_solver import solve_grid
+from ladder import WORKING, HOLDING, GridLadder
+from scheduler import StrategyScheduler
+from settings import GridSettings
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+class SymbolGrid:
+    """State and one loop iteration of the grid strategy for a single symbol"""
+
+    def __init__(self, client, db, settings: GridSettings):
+        self.client = client
+        self.db = db
+        self.settings = settings
+        self.symbol = settings.symbol
+        self.contract = None
+        self.price = None
+        self.lot_size = None
+        self.interval = None
+        self.ladder = None
+        self.errors = 0
+
+    def available_cash(self) -> float:
+        """Budget plus realized PnL minus cash committed to open buy orders"""
+        return (self.settings.strategy_budget + self.db.get_realized_pnl(self.symbol)
+                - self.client.get_committed_cash(self.symbol))
+
+    def size(self, available_cash: float):
+        """Lot size and interval from the trading plan formula, with the lot clamped to sane bounds"""
+        solution = solve_grid(
+            available_cash,
+            self.price,
+            crash_pct=self.settings.crash_pct,
+            range_fraction=self.settings.range_fraction,
+            num_levels=self.settings.num_levels
+        )
+        lot_size, interval = int(solution['lot_size'][0]), float(solution['interval'][0])
+        min_lot = self.settings.base_lot
+        max_lot = min(1000, int(available_cash * 0.1 / self.price))  # Max 10% of cash per order
+        if lot_size < min_lot:
+            logger.warning(f"[{self.symbol}] Calculated lot size ({lot_size}) is below minimum ({min_lot}). Using minimum lot size.")
+            lot_size = min_lot
+        elif lot_size > max_lot:
+            logger.warning(f"[{self.symbol}] Calculated lot size ({lot_size}) exceeds maximum ({max_lot}). Using maximum lot size.")
+            lot_size = max_lot
+        return lot_size, interval
+
+    async def update_price(self):
+        try:
+            self.price = await self.client.get_market_price(self.contract)
+            logger.info(f"[{self.symbol}] Current market price: ${self.price}")
+            # Store the latest price in the database for dashboard use
+            self.db.set_latest_price(self.symbol, self.price)
+        except Exception as price_error:
+            logger.error(f"[{self.symbol}] Failed to get market price: {price_error}")
+            fallback_price = self.db.get_latest_price(self.symbol)
+            if fallback_price:
+                self.price = fallback_price
+                logger.info(f"[{self.symbol}] Using fallback price from database: ${self.price}")
+            else:
+                self.price = self.settings.fallback_price
+                logger.info(f"[{self.symbol}] Using fallback price from config: ${self.price}")
+
+    def levels(self, count: int):
+        return [(self.client.round_price(self.contract, self.price - (self.interval * i)), self.lot_size)
+                for i in range(1, count + 1)]
+
+    def load_ladder(self):
+        """Rebuild the ladder from working brackets (broker) and bought lots awaiting their take-profit (DB)"""
+        ledger = self.client.ledger
+        lots = [lot for lot in self.db.get_holding_lots(self.symbol) if lot['child_order_id'] in ledger]
+        self.ladder = GridLadder.rebuild(self.symbol, self.price, self.interval,
+                                         brackets=self.client.get_bracket_levels(self.symbol), lots=lots)
+        logger.info(f"[{self.symbol}] Ladder anchored at ${self.ladder.anchor:.2f}: {self.ladder.get_stats()['levels']}")
+
+    def vacant_steps(self) -> list:
+        """Vacant levels just below the price, as many as keep at most num_levels working"""
+        num_levels = self.settings.num_levels
+        return self.ladder.vacant(self.price, num_levels)[:max(0, num_levels - self.ladder.count(WORKING))]
+
+    async def refill(self, steps) -> int:
+        """Place brackets on just these ladder levels; returns how many were placed"""
+        ladder, client, profit_pct = self.ladder, self.client, self.settings.profit_pct
+        levels = [(client.round_price(self.contract, ladder.price_for(step)), self.lot_size) for step in steps]
+        pairs = await client.place_grid_ladder(self.contract, levels, profit_pct=profit_pct)
+        for step, (buy_price, quantity), (parent, take_profit) in zip(steps, levels, pairs or []):
+            ladder.place(step, parent.order.orderId, take_profit.order.orderId, quantity)
+            logger.info(f"[{self.symbol}] [ORDER] Placed grid bracket order at level {step} ${buy_price:.2f} for {quantity} shares with {profit_pct*100:.1f}% profit target")
+        return len(pairs or [])
+
+    async def step(self):
+        """
+        One pass of the grid strategy.
+
+        Returns:
+            Seconds until this grid wants a timer wake-up, or None to wait for the next
+            price move, fill or session change
+        """
+        client, symbol, profit_pct = self.client, self.symbol, self.settings.profit_pct
+
+        # 1. Price, available cash, lot size and interval
+        await self.update_price()
+        available_cash = self.available_cash()
+        self.lot_size, self.interval = self.size(available_cash)
+        logger.info(f"[{symbol}] Lot size: {self.lot_size} shares, interval: ${self.interval:.2f}, "
+                    f"available cash: ${available_cash:.2f}")
+
+        # guardrail to prevent negative cash
+        if available_cash < self.settings.min_available_cash:
+            logger.warning(f"[{symbol}] Available cash (${available_cash:.2f}) is low. No new orders will be placed.")
+            return 120
+
+        # A price too low for the budget to cover two levels leaves nothing to space a grid with
+        if self.interval <= 0:
+            logger.warning(f"[{symbol}] Budget covers a single grid level at ${self.price:.2f}; no grid orders will be placed.")
+            return 120
+
+        # 2. Check current position and the ladder
+        current_position = client.get_position(symbol)
+        if self.ladder is None:
+            self.load_ladder()
+        else:
+            self.ladder.reconcile(client.ledger)
+        ladder = self.ladder
+        logger.info(f"[{symbol}] Current position: {current_position} shares, Working levels: {ladder.count(WORKING)}, "
+                    f"Holding levels: {ladder.count(HOLDING)}")
+
+        # 3. Entry condition: no position
+        if current_position == 0:
+            if client.get_trading_period() == 'closed':
+                logger.warning(f"[{symbol}] Market is closed. Skipping order placement until the session opens.")
+                return None
+            logger.info(f"[{symbol}] No position. Placing market bracket order...")
+            await client.place_market_bracket_order(self.contract, self.lot_size, profit_pct=profit_pct)
+            logger.info(f"[{symbol}] [ORDER] Placed market bracket order for {self.lot_size} shares with {profit_pct*100:.1f}% profit target")
+            return 30  # Wait for the market order to be processed
+
+        # 4. Re-center the grid in place when price has trended away from the working levels
+        working_levels = client.get_bracket_levels(symbol)
+        recenter_after = self.settings.recenter_after_intervals
+        if working_levels and self.price - working_levels[0]['parent'].price > recenter_after * self.interval:
+            logger.info(f"[{symbol}] Price ${self.price:.2f} is more than {recenter_after} intervals above the top grid level "
+                        f"${working_levels[0]['parent'].price:.2f}. Re-centering the grid...")
+            await client.reprice_ladder(self.contract, self.levels(len(working_levels)), profit_pct=profit_pct)
+            self.load_ladder()  # Re-anchor on the moved levels
+            client.update_position(symbol)
+            return None
+
+        # 5. Refill vacant levels near the price; levels waiting on their take-profit are left alone
+        if not ladder.count(WORKING) and not ladder.count(HOLDING) and ladder.anchor != self.price:
+            self.ladder = ladder = GridLadder(symbol, self.price, self.interval)  # Nothing working: start afresh at the price
+        steps = self.vacant_steps()
+        if steps:
+            if client.get_trading_period() == 'closed':
+                logger.warning(f"[{symbol}] Market is closed. Skipping grid order placement until the session opens.")
+                return None
+            logger.info(f"[{symbol}] Refilling {len(steps)} vacant grid level(s): {steps}")
+            await self.refill(steps)
+
+        client.update_position(symbol)
+        return None
+
+    async def reprice_take_profits(self):
+        """Move the take-profits of working brackets to the current profit_pct; their buys stay where they are"""
+        working = self.client.get_bracket_levels(self.symbol)
+        if working:
+            levels = [(level['parent'].price, level['parent'].quantity) for level in working]
+            await self.client.reprice_ladder(self.contract, levels, profit_pct=self.settings.profit_pct)
+
+    def handle_fill(self, fill: dict):
+        """Book a (partial) execution against this grid's lots and PnL"""
+        symbol = self.symbol
+        if self.ladder is not None:
+            self.ladder.on_fill(fill)
+        logger.info(f"[{symbol}] [TRADE] Order {'filled' if fill['final'] else 'partially filled'}: {fill['action']} {fill['quantity']} shares at ${fill['price']:.2f}")
+        if fill['action'] == 'BUY':
+            # The attached sell order is already in place via the bracket order
+            self.db.record_cost_basis(symbol, fill['price'], fill['quantity'], order_id=fill['order_id'])
+        elif fill['action'] == 'SELL':
+            # Close the bracket lot and record realized PnL
+            realized = self.db.record_realized_pnl(symbol, fill['price'], fill['quantity'], order_id=fill['order_id'])
+            logger.info(f"[{symbol}] Realized profit from sell order: ${fill['price']:.2f} x {fill['quantity']} shares = ${realized:.2f}")
+
+
+class GridEngine:
+    """
+    Runs many SymbolGrids concurrently on one asyncio loop and one IBKR connection.
+
+    Grids are woken by a StrategyScheduler rather than polled: a tick moving a grid's price
+    past its price_trigger_pct, a fill on one of its orders, a session transition or a timer
+    the grid asked for. Each batch of due grids is stepped concurrently after one shared
+    order sync; all requests share the client's pacer, and an error in one grid only delays
+    that grid. With nothing due the engine does no work.
+
+    With a ConfigWatcher, edits to config.yaml are applied between batches: changed grids get
+    their new settings (and re-priced take-profits when profit_pct changed), grids are added
+    or dropped, and the client retunes what it can without reconnecting.
+    """
+
+    MAINTENANCE = '__maintenance__'  # Scheduler key for the periodic order sync / market data rotation
+    CONFIG = '__config__'            # Scheduler key for a staged config reload
+
+    def __init__(self, client, db, grid_configs, debounce: float = 0.25, error_wait: float = 60.0,
+                 maintenance_interval: float = 30.0, watcher=None):
+        self.client = client
+        self.db = db
+        self.error_wait = error_wait
+        self.maintenance_interval = maintenance_interval
+        self.watcher = watcher
+        self.grids = {settings.symbol: SymbolGrid(client, db, settings) for settings in grid_configs}
+        self.scheduler = StrategyScheduler(debounce=debounce)
+        self._stopped = False
+
+    async def start(self):
+        """Qualify every contract at once and load open orders and positions for all grids"""
+        symbols = list(self.grids)
+        self.client.track_symbols(symbols)
+        contracts = await self.client.get_stock_contracts(symbols)
+        for symbol, grid in list(self.grids.items()):
+            grid.contract = contracts.get(symbol)
+            if grid.contract is None:
+                logger.error(f"[{symbol}] Could not qualify contract; grid disabled")
+                del self.grids[symbol]
+        await self.client.sync_open_orders_from_ibkr(full=True)
+        for symbol in self.grids:
+            self.client.update_position(symbol)
+        self.client.market_data.add_listener(self._on_tick)
+        logger.info(f"Grid engine started with {len(self.grids)} grid(s): {', '.join(self.grids)}")
+
+    def stop(self):
+        self._stopped = True
+
+    # --- Triggers ------------------------------------------------------------
+
+    def _on_tick(self, symbol, quote):
+        if symbol in self.grids:
+            self.scheduler.on_price(symbol, quote.price())
+
+    def route_fills(self, fills):
+        for fill in fills:
+            grid = self.grids.get(fill['symbol'])
+            if grid is None:
+                continue
+            try:
+                grid.handle_fill(fill)
+            except Exception as e:
+                logger.error(f"[{grid.symbol}] Failed to book fill {fill.get('exec_id')}: {e}")
+            self.scheduler.trigger(grid.symbol, 'fill')
+
+    async def _pump_fills(self):
+        """Book fills as the execution pipeline queues them and wake their grids"""
+        while True:
+            fill = await self.client.fill_queue.get()
+            self.route_fills([fill] + self.client.drain_fills())
+
+    # --- Stepping ------------------------------------------------------------
+
+    async def _step(self, grid, reasons):
+        logger.debug(f"[{grid.symbol}] Woken by {', '.join(sorted(reasons))}")
+        try:
+            delay = await grid.step()
+        except Exception as e:
+            grid.errors += 1
+            logger.error(f"[{grid.symbol}] Error in grid loop: {e}")
+            delay = self.error_wait if self.client.connected else 0
+        if delay is None:
+            self.scheduler.cancel_timer(grid.symbol)
+        else:
+            self.scheduler.after(grid.symbol, delay)
+        self.scheduler.anchor(grid.symbol, grid.price, grid.settings.price_trigger_pct)
+
+    async def apply_settings(self):
+        """Apply a staged config reload; runs between batches, so no grid is mid-step"""
+        settings, changes = self.watcher.take()
+        if settings is None:
+            return None
+        logger.info(f"Applying config reload: settings {sorted(changes['settings'])}, grids {changes['grids']}, "
+                    f"added {changes['added']}, removed {changes['removed']}")
+        self.client.apply_settings(settings, changes['settings'])
+        self.scheduler.debounce = settings.strategy_debounce_seconds
+
+        for symbol in changes['removed']:
+            del self.grids[symbol]
+            self.scheduler.cancel_timer(symbol)
+            logger.warning(f"[{symbol}] Grid removed from config; its working orders are left in place")
+        if changes['added']:
+            contracts = await self.client.get_stock_contracts(changes['added'])
+            for symbol in changes['added']:
+                if contracts.get(symbol) is None:
+                    logger.error(f"[{symbol}] Could not qualify contract; grid not added")
+                    continue
+                grid = self.grids[symbol] = SymbolGrid(self.client, self.db, settings.grid(symbol))
+                grid.contract = contracts[symbol]
+                self.scheduler.trigger(symbol, 'config')
+        self.client.track_symbols(list(self.grids))
+
+        for symbol, grid in self.grids.items():
+            grid.settings = settings.grid(symbol)
+            changed = changes['grids'].get(symbol)
+            if not changed:
+                continue
+            if 'profit_pct' in changed:
+                await grid.reprice_take_profits()
+            self.scheduler.trigger(symbol, 'config')
+        return changes
+
+    async def run_once(self, batch: dict):
+        """Apply any config reload, one shared order sync, then step every grid in the batch concurrently"""
+        if self.CONFIG in batch and self.watcher is not None:
+            await self.apply_settings()
+        await self.client.sync_open_orders_from_ibkr()
+        if self.MAINTENANCE in batch:
+            self.scheduler.after(self.MAINTENANCE, self.maintenance_interval)
+        due = [(self.grids[key], reasons) for key, reasons in batch.items() if key in self.grids]
+        if due:
+            await asyncio.gather(*(self._step(grid, reasons) for grid, reasons in due))
+
+    async def run(self):
+        await self.start()
+        logger.info("Entering main trading loop...")
+        self.scheduler.trigger_all(list(self.grids), 'start')
+        self.scheduler.after(self.MAINTENANCE, self.maintenance_interval)
+        self.scheduler.watch_sessions(lambda: list(self.grids))
+        tasks = [asyncio.ensure_future(self._pump_fills())]
+        if self.watcher is not None:
+            tasks.append(asyncio.ensure_future(self.watcher.watch(lambda: self.scheduler.trigger(self.CONFIG, 'config'))))
+        try:
+            while not self._stopped:
+                batch = await self.scheduler.next_batch()
+                # If the gateway dropped, the supervisor is reconnecting; resume once it is back
+                if not self.client.connected:
+                    logger.warning("Waiting for IBKR Gateway reconnect...")
+                    await self.client.wait_connected(300)
+                    self.scheduler.trigger_all(list(self.grids), 'reconnect')
+                    continue
+                try:
+                    await self.run_once(batch)
+                except Exception as e:
+                    logger.error(f"Error in main loop: {e}")
+                    for key in batch:
+                        self.scheduler.after(key, self.error_wait, 'retry')
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.scheduler.close()
+
+    def get_stats(self) -> dict:
+        return {
+            'grids': len(self.grids),
+            'errors': {symbol: grid.errors for symbol, grid in self.grids.items() if grid.errors},
+            'ladders': {symbol: grid.ladder.get_stats() for symbol, grid in self.grids.items() if grid.ladder},
+            'scheduler': self.scheduler.get_stats(),
+            'config': self.watcher.get_stats() if self.watcher is not None else None,
+        }
@@ -0,0 +1,92 @@
+# grid-trading/grid_solver.py
+
+import functools
+import logging
+
+import numpy as np
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+SPACINGS = ('arithmetic', 'geometric')
+
+# Inputs are quantized before solving so repeated calls with near-identical values share a cache entry
+CASH_QUANTUM = 1.0      # Whole dollars
+PRICE_QUANTUM = 0.01    # One cent tick
+
+
+def _quantize(values, quantum):
+    return tuple(np.rint(np.atleast_1d(np.asarray(values, dtype=float)).ravel() / quantum).astype(np.int64).tolist())
+
+
+def solve_grid(cash, prices, crash_pct: float = 0.87, range_fraction: float = 0.565,
+               num_levels: int = 5, spacing: str = 'arithmetic') -> dict:
+    """
+    Vectorized trading plan formula (see utils.calculate_lot_size_and_interval) returning whole ladders.
+
+    cash and prices may be scalars or arrays and are broadcast against each other, so one call
+    solves a single live grid or every bar of a price series. Results are memoized on the
+    quantized inputs; the returned arrays are read-only.
+
+    Args:
+        cash: Available cash, scalar or 1-D array
+        prices: Current price(s), scalar or 1-D array
+        num_levels: Buy levels to lay out below each price
+        spacing: 'arithmetic' (equal dollar steps) or 'geometric' (equal percentage steps);
+            both span the same range, from the price down to price * (1 - crash_pct)
+
+    Returns:
+        Dict of arrays with one row per input: lot_size, intervals (levels the cash covers),
+        interval (first step below the price), and levels, sizes and cash_at_risk (cumulative
+        cost of the ladder) with num_levels columns
+    """
+    if spacing not in SPACINGS:
+        raise ValueError(f"Unknown grid spacing '{spacing}', expected one of {SPACINGS}")
+    if crash_pct <= 0 or crash_pct >= 1:
+        raise ValueError("Crash percentage must be between 0 and 1")
+    if range_fraction <= 0 or range_fraction >= 1:
+        raise ValueError("Range fraction must be between 0 and 1")
+    return dict(_solve(_quantize(cash, CASH_QUANTUM), _quantize(prices, PRICE_QUANTUM),
+                       float(crash_pct), float(range_fraction), int(num_levels), spacing))
+
+
+@functools.lru_cache(maxsize=4096)
+def _solve(cash_key, price_key, crash_pct, range_fraction, num_levels, spacing):
+    cash, price = np.broadcast_arrays(np.array(cash_key) * CASH_QUANTUM, np.array(price_key) * PRICE_QUANTUM)
+    if np.any(price <= 0):
+        raise ValueError("Current price must be positive")
+    if np.any(cash <= 0):
+        raise ValueError("Available cash must be positive")
+
+    # LotSize = (Cash + crash * Price) / (crash * range * Price^2), at least one share
+    lot_size = np.maximum(np.ceil((cash + crash_pct * price) / (crash_pct * range_fraction * price ** 2)), 1)
+    # Intervals = INT(Cash / (LotSize * range * Price)); below two there is no grid to space
+    intervals = np.maximum(np.floor(cash / (lot_size * range_fraction * price)), 1)
+    gaps = np.where(intervals > 1, intervals - 1, np.inf)
+
+    steps = np.arange(1, num_levels + 1)
+    if spacing == 'arithmetic':
+        increment = crash_pct * price / gaps
+        levels = price[:, None] - increment[:, None] * steps
+        interval = increment
+    else:
+        ratio = (1 - crash_pct) ** (1 / gaps)
+        levels = price[:, None] * ratio[:, None] ** steps
+        interval = price * (1 - ratio)
+
+    sizes = np.broadcast_to(lot_size[:, None], levels.shape).copy()
+    result = {
+        'lot_size': lot_size.astype(np.int64),
+        'intervals': intervals.astype(np.int64),
+        'interval': interval,
+        'levels': levels,
+        'sizes': sizes.astype(np.int64),
+        'cash_at_risk': np.cumsum(levels * sizes, axis=1),
+    }
+    for array in result.values():
+        array.flags.writeable = False
+    return result
+
+
+def cache_info():
+    """lru_cache statistics of the solver"""
+    return _solve.cache_info()
@@ -1,46 +1,139 @@
+import asyncio
+import functools
+import inspect
 import logging
+import time
 from ib_async import *
-import yaml
 from datetime import datetime
 import pytz
 from typing import List, Dict, Optional
 import math
 from database import TradeDB
+from order_ledger import OrderLedger
+from market_data import MarketDataManager
+from contract_cache import ContractCache
+from pacing import Pacer, CANCEL, ORDER, DATA
+from reconciler import OrderReconciler, TERMINAL_STATUSES
+from position_book import PositionBook
+from supervisor import ConnectionSupervisor
+from retention import RetentionManager
+from settings import RESTART_KEYS, Settings, load_settings
+from utils import round_price, trading_period
 
 logger = logging.getLogger()  # Use the root logger for all logging in this module
 
-class IBKRClient:
-    def __init__(self, paper: bool = True, client_id: int = 1, port: int = 4002):
+class AsyncIBKRClient:
+    """
+    asyncio-native IBKR client built on ib_async's *Async requests.
+    
+    Every request method is a coroutine, so the trading loop never blocks the event loop that
+    delivers ib_async callbacks, and independent requests can run together with asyncio.gather.
+    IBKRClient wraps this class for synchronous callers.
+    """
+    
+    def __init__(self, paper: bool = True, client_id: int = 1, port: int = 4002, db: Optional[TradeDB] = None,
+                 settings: Optional[Settings] = None):
         self.ib = IB()
         self.paper = paper
         self.client_id = client_id
         self.port = port
         self.connected = False
-        self.open_orders = {}
-        self.db = TradeDB('trade_logs.db')
+        self.db = db if db is not None else TradeDB('trade_logs.db')  # share the caller's pooled connections
+        # In-memory order book; persisted to the DB by a write-behind thread
+        self.ledger = OrderLedger(self.db)
+        self.ledger.load(self.db.get_open_orders())
+        
+        # Shared, validated config (parsed once; replaced by apply_settings on reload)
+        self.config = settings if settings is not None else load_settings()
+        
+        self.symbol = self.config.symbol
+        
+        # Qualified contracts and ContractDetails persisted across runs and processes
+        self.contract_cache = ContractCache(self.config.contract_cache_path,
+                                            ttl=self.config.contract_cache_ttl_hours * 3600)
+        
+        # Every outbound request is paced here: cancels before orders before data requests
+        self.pacer = Pacer(max_rate=self.config.api_max_messages_per_second, sleep=self._pacer_sleep)
         
-        # Load config
-        with open("config.yaml", "r") as f:
-            self.config = yaml.safe_load(f)
+        # Streaming quote cache; get_market_price reads from it instead of re-requesting data
+        # Streams go to symbols with live orders near the touch; everything else rotates through snapshots
+        self.market_data = MarketDataManager(self.ib, stale_after=self.config.quote_stale_seconds,
+                                             pacer=self.pacer,
+                                             max_lines=self.config.market_data_lines,
+                                             near_touch=self.config.near_touch_pct,
+                                             snapshot_interval=self.config.snapshot_interval_seconds)
         
-        self.symbol = self.config["symbol"]
+        # Fill pipeline: executions are pushed here as they arrive from IBKR
+        self.fill_queue = asyncio.Queue()
+        self.ib.orderStatusEvent += self._on_order_status
+        self.ib.execDetailsEvent += self._on_exec_details
+        self.ib.commissionReportEvent += self._on_commission_report
         
-    def connect(self) -> bool:
+        # Order changes are reconciled from events; full snapshots only on reconnect or integrity checks
+        self.reconciler = OrderReconciler(self.ledger, symbols={self.symbol},
+                                          integrity_interval=self.config.order_integrity_check_seconds)
+        self.ib.openOrderEvent += self.reconciler.on_trade
+        self.ib.orderStatusEvent += self.reconciler.on_trade
+        
+        # Positions by (account, conId) from positionEvent/updatePortfolioEvent; persisted on change
+        self.positions = PositionBook(self.db)
+        
+        # Reconnects after gateway drops (e.g. the nightly restart) and resumes state
+        self.supervisor = ConnectionSupervisor(self, max_delay=self.config.reconnect_max_delay_seconds)
+        
+        # Drops finished Trades and persisted Fills from ib_async's caches so long sessions stay flat
+        self.retention = RetentionManager(self.ib, self.ledger, self.db,
+                                          keep_seconds=self.config.trade_retention_seconds)
+        
+    def apply_settings(self, settings: Settings, changed=()):
+        """Swap in reloaded settings and retune the components that can change without reconnecting"""
+        self.config = settings
+        self.contract_cache.ttl = settings.contract_cache_ttl_hours * 3600
+        self.market_data.stale_after = settings.quote_stale_seconds
+        self.market_data.max_lines = settings.market_data_lines
+        self.market_data.near_touch = settings.near_touch_pct
+        self.market_data.snapshot_interval = settings.snapshot_interval_seconds
+        self.reconciler.integrity_interval = settings.order_integrity_check_seconds
+        self.supervisor.max_delay = settings.reconnect_max_delay_seconds
+        self.retention.keep_seconds = settings.trade_retention_seconds
+        restart = sorted(RESTART_KEYS.intersection(changed))
+        if restart:
+            logger.warning(f"Config change to {', '.join(restart)} takes effect after a restart")
+    
+    def _pacer_sleep(self, seconds: float):
+        """Sleep used by synchronous pacer waits; these must never stall the running event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.ib.sleep(seconds)  # Keep ib_async events flowing
+        else:
+            raise RuntimeError("Synchronous pacer wait on the event loop thread; use Pacer.acquire()")
+    
+    async def connect(self) -> bool:
         """Connect to IB Gateway with timeout and retry"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 logger.debug(f"Attempting to connect to IBKR Gateway (attempt {attempt + 1}/{max_retries})")
-                self.ib.connect("127.0.0.1", self.port, clientId=self.client_id, timeout=20)
+                await self.ib.connectAsync("127.0.0.1", self.port, clientId=self.client_id, timeout=20)
                 self.connected = True
+                self.reconciler.mark_stale()  # Anything may have changed while we were away
+                self.positions.attach(self.ib)
+                self.supervisor.start()
                 logger.debug(f"Connected to IBKR Gateway (Paper: {self.paper})")
+                now = datetime.now(pytz.timezone("US/Eastern"))
+                logger.info(f"Current time (Eastern): {now.strftime('%Y-%m-%d %H:%M:%S %Z')}, "
+                            f"trading period: {trading_period(now)}")
+                try:
+                    await self.backfill_executions()  # Fills that happened while the bot was down
+                except Exception as e:
+                    logger.error(f"Execution backfill failed: {e}")
                 return True
             except Exception as e:
                 logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
                     logger.info("Waiting 5 seconds before retry...")
-                    import time
-                    time.sleep(5)
+                    await asyncio.sleep(5)
                 else:
                     logger.error(f"All connection attempts failed. Last error: {e}")
                     return False
@@ -48,68 +141,68 @@ class IBKRClient:
     def disconnect(self):
         """Disconnect from IB Gateway"""
         try:
+            self.supervisor.stop()  # An intentional disconnect must not trigger a reconnect
             if self.connected:
+                self.market_data.close()
                 self.ib.disconnect()
                 self.connected = False
                 logger.info("Disconnected from IBKR Gateway")
+            # Make sure every queued order change reaches the database
+            self.ledger.close()
         except Exception as e:
             logger.warning(f"Disconnection issue: {e}")
     
     def get_trading_period(self):
         """Return the current trading period: 'pre-market', 'regular', 'after-hours', or 'overnight' (ET)"""
-        from datetime import datetime, time as dtime
-        import pytz
         eastern = pytz.timezone("US/Eastern")
-        now = datetime.now(eastern)
-        
-        # Check if it's weekend (Saturday = 5, Sunday = 6)
-        if now.weekday() >= 5:  # Saturday or Sunday
-            return 'closed'
-        
-        now_time = now.time()
-        # Customizable session boundaries
-        pre_market_open = dtime(4, 5)
-        pre_market_close = dtime(7, 30)
-        regular_open = dtime(9, 31)
-        regular_close = dtime(15, 57)
-        after_hours_open = dtime(16, 10)
-        after_hours_close = dtime(19, 45)
-        overnight_open = dtime(20, 15)
-        overnight_close = dtime(3, 45)
-        if pre_market_open <= now_time < pre_market_close:
-            return 'pre-market'
-        elif regular_open <= now_time < regular_close:
-            return 'regular'
-        elif after_hours_open <= now_time < after_hours_close:
-            return 'after-hours'
-        elif (now_time >= overnight_open) or (now_time < overnight_close):
-            return 'overnight'
-        else:
-            return 'closed'
+        return trading_period(datetime.now(eastern))
 
     def is_market_open(self):
         """Return True if any trading period is open (pre-market, regular, after-hours, overnight)"""
         return self.get_trading_period() in ['pre-market', 'regular', 'after-hours', 'overnight']
     
-    def get_stock_contract(self, symbol: str):
-        """Create and qualify a stock contract, handling routing based on trading period"""
-        from datetime import datetime
-        import pytz
-        eastern = pytz.timezone("US/Eastern")
-        now = datetime.now(eastern)
-        period = self.get_trading_period()
-        logger.info(f"Current time (Eastern): {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-        logger.info(f"Trading period: {period}")
-        
-        # Try different exchange configurations if qualification fails
-        exchange_configs = [
-            ("SMART", "NASDAQ"),
-            ("NASDAQ", "NASDAQ"), 
-            ("ARCA", "ARCA"),
-            ("SMART", None),  # Let SMART choose
-        ]
+    # Exchange routings tried in order when qualifying a stock contract
+    EXCHANGE_CONFIGS = [
+        ("SMART", "NASDAQ"),
+        ("NASDAQ", "NASDAQ"), 
+        ("ARCA", "ARCA"),
+        ("SMART", None),  # Let SMART choose
+    ]
+    
+    async def get_stock_contract(self, symbol: str):
+        """Return a qualified stock contract, from the contract cache when possible; None if it cannot be qualified"""
+        return (await self.get_stock_contracts([symbol]))[symbol]
+    
+    async def get_stock_contracts(self, symbols: List[str]) -> Dict[str, Contract]:
+        """Return qualified contracts for several symbols, qualifying cache misses concurrently (None for failures)"""
+        contracts = {}
+        misses = []
+        for symbol in symbols:
+            entry = self.contract_cache.get(symbol)
+            if entry:
+                contracts[symbol] = self._contract_from_cache(entry)
+                logger.debug(f"Contract cache hit for {symbol} (conId={entry['conId']})")
+            else:
+                misses.append(symbol)
         
-        for exchange, primary_exchange in exchange_configs:
+        if misses:
+            logger.info(f"Qualifying {len(misses)} contract(s) not in cache: {', '.join(misses)}")
+            qualified = await asyncio.gather(*(self._qualify_stock(symbol) for symbol in misses))
+            contracts.update(zip(misses, qualified))
+        return contracts
+    
+    @staticmethod
+    def _contract_from_cache(entry: dict):
+        contract = Stock(entry['symbol'], exchange=entry['exchange'], currency=entry['currency'])
+        contract.conId = entry['conId']
+        contract.primaryExchange = entry.get('primaryExchange') or ''
+        contract.localSymbol = entry.get('localSymbol') or ''
+        contract.tradingClass = entry.get('tradingClass') or ''
+        return contract
+    
+    async def _qualify_stock(self, symbol: str):
+        """Qualify one symbol, trying each exchange routing, and cache the result with its details; None if none works"""
+        for exchange, primary_exchange in self.EXCHANGE_CONFIGS:
             try:
                 contract = Stock(symbol, exchange=exchange, currency="USD")
                 if primary_exchange:
@@ -118,12 +211,15 @@ class IBKRClient:
                 logger.info(f"Attempting to qualify {symbol} with exchange={exchange}, primaryExchange={primary_exchange}")
                 
                 # Try to qualify the contract
-                qualified_contracts = self.ib.qualifyContracts(contract)
+                qualified_contracts = [c for c in await self.pacer.call_async(DATA, self.ib.qualifyContractsAsync, contract) if c]
                 
-                if qualified_contracts and len(qualified_contracts) > 0:
+                if qualified_contracts:
                     qualified_contract = qualified_contracts[0]
-                    if hasattr(qualified_contract, 'conId') and qualified_contract.conId:
+                    if getattr(qualified_contract, 'conId', None):
                         logger.info(f"Successfully qualified {symbol} with conId={qualified_contract.conId}, exchange={qualified_contract.exchange}")
+                        details_list = await self.pacer.call_async(DATA, self.ib.reqContractDetailsAsync, qualified_contract)
+                        details = details_list[0] if details_list else None
+                        self.contract_cache.put(symbol, qualified_contract, details)
                         return qualified_contract
                     else:
                         logger.warning(f"Contract qualified but no conId found for {symbol}")
@@ -134,38 +230,35 @@ class IBKRClient:
                 logger.warning(f"Failed to qualify {symbol} with exchange={exchange}: {e}")
                 continue
         
-        # If all qualification attempts failed, create a basic contract and log warning
-        logger.error(f"All qualification attempts failed for {symbol}. Creating unqualified contract.")
-        contract = Stock(symbol, exchange="SMART", currency="USD")
-        contract.primaryExchange = "NASDAQ"
-        return contract
+        # An unqualified contract would only fail later at order time; let callers skip the symbol
+        logger.error(f"All qualification attempts failed for {symbol}.")
+        return None
     
-    def get_market_price(self, contract) -> float:
-        """Get current market price for a contract"""
-        ticker = self.ib.reqMktData(contract)
-        self.ib.sleep(3)  # Wait longer for market data
-        
-        # Try multiple price sources in order of preference
-        price = None
-        
-        # First try market price
-        if ticker.marketPrice() and ticker.marketPrice() > 0 and not math.isnan(ticker.marketPrice()):
-            price = ticker.marketPrice()
-        # Then try last price
-        elif ticker.last and ticker.last > 0 and not math.isnan(ticker.last):
-            price = ticker.last
-        # Then try close price
-        elif ticker.close and ticker.close > 0 and not math.isnan(ticker.close):
-            price = ticker.close
-        # Then try bid/ask midpoint
-        elif (ticker.bid and ticker.ask and ticker.bid > 0 and ticker.ask > 0 and 
-              not math.isnan(ticker.bid) and not math.isnan(ticker.ask)):
-            price = (ticker.bid + ticker.ask) / 2
-        # Finally try bid or ask alone
-        elif ticker.bid and ticker.bid > 0 and not math.isnan(ticker.bid):
-            price = ticker.bid
-        elif ticker.ask and ticker.ask > 0 and not math.isnan(ticker.ask):
-            price = ticker.ask
+    def get_min_tick(self, symbol: str) -> float:
+        """Minimum price increment for symbol from the cached ContractDetails (default 0.01)"""
+        entry = self.contract_cache.get(symbol)
+        return (entry or {}).get('minTick') or 0.01
+    
+    def round_price(self, contract, price: float) -> float:
+        """Round a price to the contract's minimum tick"""
+        return round_price(price, self.get_min_tick(contract.symbol))
+    
+    async def get_market_price(self, contract, wait: float = 3.0) -> float:
+        """Get current market price for a contract from the quote cache (streamed or snapshot)"""
+        symbol = contract.symbol
+        if symbol not in self.market_data.watched():
+            self.market_data.watch(contract, self._touch_distance(symbol, None))
+        
+        price = self.market_data.latest_price(symbol)
+        if price is None:
+            # No fresh quote (first call, quiet stream, or no line): ask for a snapshot and give it a moment
+            if not self.market_data.is_subscribed(symbol):
+                self.market_data.request_snapshot(symbol)  # Paced by the market data manager
+            try:
+                await self.market_data.next_tick(symbol, timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            price = self.market_data.latest_price(symbol)
         
         if price is None or price <= 0 or math.isnan(price):
             logger.warning(f"Could not get valid price for {contract.symbol}. Market may be closed.")
@@ -176,9 +269,11 @@ class IBKRClient:
                 import pytz
                 eastern = pytz.timezone("US/Eastern")
                 end_time = datetime.now(eastern).strftime('%Y%m%d %H:%M:%S US/Eastern')
-                bars = self.ib.reqHistoricalData(
+                bars = await self.pacer.call_async(
+                    DATA, self.ib.reqHistoricalDataAsync,
                     contract, endDateTime=end_time, durationStr='1 D',
-                    barSizeSetting='1 min', whatToShow='TRADES', useRTH=False
+                    barSizeSetting='1 min', whatToShow='TRADES', useRTH=False,
+                    historical=True
                 )
                 if bars and len(bars) > 0:
                     price = bars[-1].close
@@ -192,62 +287,132 @@ class IBKRClient:
         logger.debug(f"Market price for {contract.symbol}: ${price:.2f}")
         return price
     
-    def get_account_summary(self) -> List:
+    def _touch_distance(self, symbol: str, price: Optional[float]) -> float:
+        """Distance of the symbol's nearest live order from price, as a fraction of price (inf if none)"""
+        if not price:
+            return math.inf if not self.ledger.ids(symbol) else 0.0
+        distances = [abs(record.price - price) / price for record in map(self.ledger.get, self.ledger.ids(symbol))
+                     if record is not None and record.price]
+        return min(distances, default=math.inf)
+    
+    def refresh_market_data(self):
+        """Re-rank watched symbols by how close their live orders are to the touch, then rotate lines"""
+        for symbol in self.market_data.watched():
+            quote = self.market_data.quote(symbol)
+            self.market_data.set_priority(symbol, self._touch_distance(symbol, quote.price() if quote else None))
+        self.market_data.rebalance()
+        self.market_data.refresh_snapshots()
+    
+    def get_price_freshness(self) -> Dict[str, Dict]:
+        """Per-symbol quote age and source, so the strategy knows how old each price is"""
+        return self.market_data.freshness()
+    
+    async def get_market_prices(self, contracts) -> Dict[str, float]:
+        """Market prices for several contracts, fetched concurrently"""
+        prices = await asyncio.gather(*(self.get_market_price(contract) for contract in contracts))
+        return {contract.symbol: price for contract, price in zip(contracts, prices)}
+    
+    async def get_account_summary(self) -> List:
         """Get account summary"""
-        return self.ib.accountSummary()
+        return await self.ib.accountSummaryAsync()
     
     def has_position(self, symbol: str) -> bool:
         """Check if we have any position in the symbol"""
-        positions = self.ib.positions()
-        for position in positions:
-            if position.contract.symbol == symbol and position.position != 0:
-                return True
-        return False
+        return self.positions.has_position(symbol)
     
     def get_position(self, symbol: str) -> Optional[int]:
         """Get current position size for a symbol"""
-        positions = self.ib.positions()
-        for position in positions:
-            if position.contract.symbol == symbol:
-                return position.position
-        return 0
+        return self.positions.position(symbol)
+    
+    def get_avg_cost(self, symbol: str) -> float:
+        """Average cost of the current position, from the position book"""
+        return self.positions.avg_cost(symbol)
+    
+    def get_unrealized_pnl(self, symbol: str) -> Optional[float]:
+        """Unrealized PnL of the current position, from the position book"""
+        return self.positions.unrealized_pnl(symbol)
     
     def record_order(self, symbol, action, price, quantity, order_id=None):
-        # Deduplicate: check if order already exists
-        if not self.db.order_exists(symbol, action, price, quantity, order_id):
-            self.db.record_order(symbol, action, price, quantity, order_id)
+        # Idempotent upsert keyed on the broker order id
+        self.db.record_order(symbol, action, price, quantity, order_id)
     
     def record_trade(self, symbol, action, price, quantity, trade_id=None):
-        # Deduplicate: check if trade already exists
-        if not self.db.trade_exists(symbol, action, price, quantity, trade_id):
-            self.db.record_trade(symbol, action, price, quantity, trade_id)
+        # Idempotent upsert keyed on the broker order id the fill belongs to
+        self.db.record_trade(symbol, action, price, quantity, trade_id)
     
     def record_cancel(self, symbol, action, price, quantity, order_id=None):
-        # Deduplicate: check if cancel already exists
-        if not self.db.cancel_exists(symbol, action, price, quantity, order_id):
-            self.db.record_cancel(symbol, action, price, quantity, order_id)
+        # Status update is idempotent, no existence check needed
+        self.db.record_cancel(symbol, action, price, quantity, order_id)
     
     def update_position(self, symbol):
-        # Get current position and update in DB
-        position = self.get_position(symbol)
-        self.db.update_position(symbol, position)
+        # The position book writes on change; this only catches anything not yet persisted
+        self.positions.persist(symbol)
     
-    # IBKR API: https://www.interactivebrokers.com/campus/ibkr-api-page/order-types/#bracket-orders
-    def place_bracket_order(self, contract, quantity: int, buy_price: float, profit_pct: float = None):
+    # Order states that mean IBKR has accepted (or already finished) an order
+    ACK_STATUSES = ('PreSubmitted', 'Submitted', 'Filled', 'Cancelled', 'ApiCancelled', 'Inactive')
+    
+    async def _place_order(self, contract, order):
+        """Single funnel for outbound orders, paced in the order lane"""
+        await self.pacer.acquire(ORDER)
+        return self.ib.placeOrder(contract, order)
+    
+    def _build_bracket(self, parent_order, take_profit_order, period: str):
+        """Pre-assign order ids and link a parent/take-profit pair so both can be sent back to back"""
+        for order in (parent_order, take_profit_order):
+            order.orderId = self.ib.client.getReqId()
+            if period in ['pre-market', 'after-hours']:
+                order.outsideRth = True  # Allow order to execute outside regular hours
+            if period == 'overnight' and isinstance(order, LimitOrder):
+                order.exchange = 'OVERNIGHT'
+        # The parent is held at IBKR until the child arrives with transmit=True, which releases both
+        parent_order.transmit = False
+        take_profit_order.parentId = parent_order.orderId
+        take_profit_order.transmit = True
+        return parent_order, take_profit_order
+    
+    def _link_brackets(self, symbol: str, brackets):
         """
-        Place a bracket order with a buy order and attached profit-taking sell order.
+        Persist the lot link of each (parent, take-profit) pair before the orders are sent, so a
+        fill can never be booked against a lot the write-behind thread has not written yet
+        """
+        self.db.record_batch(lots=[(symbol, parent.orderId, take_profit.orderId) for parent, take_profit in brackets])
+    
+    async def _wait_for_update(self, timeout: float) -> bool:
+        """Wait for the next ib_async update (any incoming message); False on timeout"""
+        try:
+            await asyncio.wait_for(self.ib.updateEvent, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def wait_for_acks(self, trades, timeout: float = 5.0) -> int:
+        """Wait until IBKR acknowledges every trade or timeout elapses; returns acked count"""
+        deadline = time.monotonic() + timeout
+        while True:
+            acked = sum(1 for trade in trades if trade.orderStatus.status in self.ACK_STATUSES)
+            remaining = deadline - time.monotonic()
+            if acked == len(trades) or remaining <= 0:
+                return acked
+            await self._wait_for_update(remaining)
+    
+    async def place_grid_ladder(self, contract, levels, profit_pct: float = None, ack_timeout: float = 5.0):
+        """
+        Place a whole ladder of bracket orders in one burst.
+        
+        Order ids are pre-allocated so every parent/take-profit pair can be sent without waiting
+        for the previous one, then acknowledgements are awaited via order status events.
         
         Args:
             contract: IBKR contract object
-            quantity: Number of shares to buy
-            buy_price: Price for the buy order
-            profit_pct: Profit percentage for sell order (defaults to config value)
+            levels: Iterable of (buy_price, quantity) tuples, one per grid level
+            profit_pct: Profit percentage for sell orders (defaults to config value)
+            ack_timeout: Seconds to wait for IBKR to acknowledge the ladder (0 to skip)
         
         Returns:
-            List of trades (parent buy order and attached sell order)
+            List of [parent_trade, take_profit_trade] pairs
         """
         if profit_pct is None:
-            profit_pct = self.config.get('profit_pct', 0.015)  # Default 1.5%
+            profit_pct = self.config.profit_pct
         
         period = self.get_trading_period()
         if period == 'closed':
@@ -255,67 +420,61 @@ class IBKRClient:
             return None
         tif = 'GTC'  # Use GTC for all orders for consistency
         
-        # Calculate sell price based on profit percentage
-        sell_price = round(buy_price * (1 + profit_pct), 2)
+        brackets = []
+        for buy_price, quantity in levels:
+            # Calculate sell price based on profit percentage
+            sell_price = self.round_price(contract, buy_price * (1 + profit_pct))
+            logger.debug(f"Creating bracket order: BUY {quantity} @ ${buy_price:.2f}, SELL @ ${sell_price:.2f} ({profit_pct*100:.1f}% profit)")
+            parent_order, take_profit_order = self._build_bracket(
+                LimitOrder('BUY', quantity, buy_price, tif=tif),
+                LimitOrder('SELL', quantity, sell_price, tif=tif),
+                period
+            )
+            brackets.append((parent_order, take_profit_order, buy_price, sell_price, quantity))
+        self._link_brackets(contract.symbol, [(parent, take_profit) for parent, take_profit, *_ in brackets])
         
-        logger.debug(f"Creating bracket order: BUY {quantity} @ ${buy_price:.2f}, SELL @ ${sell_price:.2f} ({profit_pct*100:.1f}% profit)")
+        # Submit the whole ladder back to back, tracking both legs of each bracket as soon as they are sent
+        pairs = []
+        for parent_order, take_profit_order, buy_price, sell_price, quantity in brackets:
+            bracket = await self._place_order(contract, parent_order)
+            take_profit_trade = await self._place_order(contract, take_profit_order)
+            with self.ledger.batch():
+                self.ledger.add(parent_order.orderId, contract.symbol, 'BUY', buy_price, quantity,
+                                trade=bracket, order_type='bracket_parent')
+                self.ledger.add(take_profit_order.orderId, contract.symbol, 'SELL', sell_price, quantity,
+                                trade=take_profit_trade, order_type='bracket_child', parent_id=parent_order.orderId)
+            pairs.append([bracket, take_profit_trade])
+            logger.info(f"BRACKET: BUY {quantity} @ ${buy_price:.2f} (ID:{parent_order.orderId}), SELL @ ${sell_price:.2f} (ID:{take_profit_order.orderId})")
         
-        # Create the parent buy order
-        parent_order = LimitOrder('BUY', quantity, buy_price, tif=tif)
-        # not needed as outsideRth can be placed during regular hours too: if period in ['pre-market', 'after-hours']:
-        if period in ['pre-market', 'after-hours']:
-            order.outsideRth = True  # Allow order to execute outside regular hours
-        if period == 'overnight':
-            parent_order.exchange = 'OVERNIGHT'
-        parent_order.transmit = False
+        if ack_timeout > 0 and pairs:
+            trades = [trade for pair in pairs for trade in pair]
+            acked = await self.wait_for_acks(trades, ack_timeout)
+            if acked < len(trades):
+                logger.warning(f"Grid ladder: only {acked}/{len(trades)} orders acknowledged within {ack_timeout}s")
+            else:
+                logger.info(f"Grid ladder: {len(pairs)} bracket(s) acknowledged")
         
-        # Create the attached sell order (profit-taking)
-        take_profit_order = LimitOrder('SELL', quantity, sell_price, tif=tif)
-        # not needed as outsideRth can be placed during regular hours too: if period in ['pre-market', 'after-hours']:
-        if period in ['pre-market', 'after-hours']:
-            order.outsideRth = True  # Allow order to execute outside regular hours
-        if period == 'overnight':
-            take_profit_order.exchange = 'OVERNIGHT'
-        take_profit_order.transmit = True
+        return pairs
+    
+    # IBKR API: https://www.interactivebrokers.com/campus/ibkr-api-page/order-types/#bracket-orders
+    async def place_bracket_order(self, contract, quantity: int, buy_price: float, profit_pct: float = None):
+        """
+        Place a bracket order with a buy order and attached profit-taking sell order.
         
-        # Create bracket order
-        bracket = self.ib.placeOrder(contract, parent_order)
-        self.ib.sleep(1);
-        
-        # Attach the take profit order to the parent
-        take_profit_order.parentId = bracket.order.orderId
-        take_profit_trade = self.ib.placeOrder(contract, take_profit_order)
-        
-        # Track both orders
-        self.open_orders[bracket.order.orderId] = {
-            'symbol': contract.symbol,
-            'action': 'BUY',
-            'quantity': quantity,
-            'price': buy_price,
-            'trade': bracket,
-            'order_type': 'bracket_parent'
-        }
-        
-        self.open_orders[take_profit_trade.order.orderId] = {
-            'symbol': contract.symbol,
-            'action': 'SELL',
-            'quantity': quantity,
-            'price': sell_price,
-            'trade': take_profit_trade,
-            'order_type': 'bracket_child',
-            'parent_id': bracket.order.orderId
-        }
-        
-        # Record orders in database
-        self.record_order(contract.symbol, 'BUY', buy_price, quantity, bracket.order.orderId)
-        self.record_order(contract.symbol, 'SELL', sell_price, quantity, take_profit_trade.order.orderId)
-        
-        logger.info(f"BRACKET: BUY {quantity} @ ${buy_price:.2f} (ID:{bracket.order.orderId}), SELL @ ${sell_price:.2f} (ID:{take_profit_trade.order.orderId})")
-        
-        return [bracket, take_profit_trade]
+        Args:
+            contract: IBKR contract object
+            quantity: Number of shares to buy
+            buy_price: Price for the buy order
+            profit_pct: Profit percentage for sell order (defaults to config value)
+        
+        Returns:
+            List of trades (parent buy order and attached sell order)
+        """
+        pairs = await self.place_grid_ladder(contract, [(buy_price, quantity)], profit_pct, ack_timeout=0)
+        return pairs[0] if pairs else None
     
     # IBKR API: https://www.interactivebrokers.com/campus/ibkr-api-page/order-types/#bracket-orders
-    def place_market_bracket_order(self, contract, quantity: int, profit_pct: float = None):
+    async def place_market_bracket_order(self, contract, quantity: int, profit_pct: float = None):
         """
         Place a market bracket order with a market buy and attached limit sell order.
         
@@ -328,7 +487,7 @@ class IBKRClient:
             List of trades (parent market buy order and attached limit sell order)
         """
         if profit_pct is None:
-            profit_pct = self.config.get('profit_pct', 0.015)  # Default 1.5%
+            profit_pct = self.config.profit_pct
         
         period = self.get_trading_period()
         if period == 'closed':
@@ -338,51 +497,30 @@ class IBKRClient:
         # Check if we can use market orders (only during regular hours)
         if period == 'regular':
             # Get current market price for order calculation
-            current_price = self.get_market_price(contract)
-            sell_price = round(current_price * (1 + profit_pct), 2)
+            current_price = await self.get_market_price(contract)
+            sell_price = self.round_price(contract, current_price * (1 + profit_pct))
             
             logger.info(f"Creating market bracket order: BUY {quantity} shares at market, SELL at ${sell_price:.2f} ({profit_pct*100:.1f}% profit)")
             
-            # Create the parent market buy order
-            parent_order = MarketOrder('BUY', quantity)
-            parent_order.transmit = False
-            
-            # Create the attached sell order (profit-taking)
-            take_profit_order = LimitOrder('SELL', quantity, sell_price, tif='GTC')
+            # Create the parent market buy order and the attached sell order (profit-taking)
             # Note: During regular hours, no special exchange or outside RTH settings needed
-            take_profit_order.transmit = True
-
-            # Place market buy order
-            bracket = self.ib.placeOrder(contract, parent_order)
-            self.ib.sleep(1);
-            
-            # Attach the take profit order to the parent
-            take_profit_order.parentId = bracket.order.orderId
-            take_profit_trade = self.ib.placeOrder(contract, take_profit_order)
+            parent_order, take_profit_order = self._build_bracket(
+                MarketOrder('BUY', quantity),
+                LimitOrder('SELL', quantity, sell_price, tif='GTC'),
+                period
+            )
+            self._link_brackets(contract.symbol, [(parent_order, take_profit_order)])
             
-            # Track both orders
-            self.open_orders[bracket.order.orderId] = {
-                'symbol': contract.symbol,
-                'action': 'BUY',
-                'quantity': quantity,
-                'price': None,  # Market order
-                'trade': bracket,
-                'order_type': 'bracket_parent'
-            }
+            # Place both legs back to back; ids were pre-allocated so no wait is needed
+            bracket = await self._place_order(contract, parent_order)
+            take_profit_trade = await self._place_order(contract, take_profit_order)
             
-            self.open_orders[take_profit_trade.order.orderId] = {
-                'symbol': contract.symbol,
-                'action': 'SELL',
-                'quantity': quantity,
-                'price': sell_price,
-                'trade': take_profit_trade,
-                'order_type': 'bracket_child',
-                'parent_id': bracket.order.orderId
-            }
-            
-            # Record orders in database
-            self.record_order(contract.symbol, 'BUY', None, quantity, bracket.order.orderId)
-            self.record_order(contract.symbol, 'SELL', sell_price, quantity, take_profit_trade.order.orderId)
+            # Track both orders; the ledger persists both legs and their lot link in one transaction
+            with self.ledger.batch():
+                self.ledger.add(bracket.order.orderId, contract.symbol, 'BUY', None, quantity,  # Market order
+                                trade=bracket, order_type='bracket_parent')
+                self.ledger.add(take_profit_trade.order.orderId, contract.symbol, 'SELL', sell_price, quantity,
+                                trade=take_profit_trade, order_type='bracket_child', parent_id=bracket.order.orderId)
             
             logger.info(f"MARKET BRACKET: BUY {quantity} @ market (ID:{bracket.order.orderId}), SELL @ ${sell_price:.2f} (ID:{take_profit_trade.order.orderId})")
             
@@ -390,44 +528,37 @@ class IBKRClient:
         else:
             # Only limit orders allowed outside regular hours
             # Use aggressive price for quick fill
-            current_price = self.get_market_price(contract)
-            buy_price = round(current_price * 1.005, 2)  # 0.5% aggressive buy price
+            current_price = await self.get_market_price(contract)
+            buy_price = self.round_price(contract, current_price * 1.005)  # 0.5% aggressive buy price
             
             logger.debug(f"Outside regular hours. Using limit bracket order: BUY {quantity} @ ${buy_price:.2f} (aggressive)")
             
             # Use the regular bracket order method with aggressive pricing
-            return self.place_bracket_order(contract, quantity, buy_price, profit_pct)
+            return await self.place_bracket_order(contract, quantity, buy_price, profit_pct)
 
-    def place_market_order(self, contract, action: str, quantity: int):
+    async def place_market_order(self, contract, action: str, quantity: int):
         period = self.get_trading_period()
         if period == 'closed':
             logger.warning('Market is not open. Orders not placed.')
             return None
         if period == 'regular':
             order = MarketOrder(action, quantity)
-            trade = self.ib.placeOrder(contract, order)
+            trade = await self._place_order(contract, order)
             logger.info(f"MARKET: {action} {quantity} {contract.symbol}")
-            self.record_order(contract.symbol, action, None, quantity, getattr(trade.order, 'orderId', None))
-            # Track the market order in self.open_orders for fill detection
-            self.open_orders[trade.order.orderId] = {
-                'symbol': contract.symbol,
-                'action': action,
-                'quantity': quantity,
-                'price': None,  # Market order, no price
-                'trade': trade
-            }
+            # Track the market order in the ledger for fill detection (market order, no price)
+            self.ledger.add(trade.order.orderId, contract.symbol, action, None, quantity, trade=trade)
             return trade
         else:
             # Only limit orders allowed outside regular hours
-            limit_price = self.get_market_price(contract)
+            limit_price = await self.get_market_price(contract)
             # Use aggressive price for quick fill (1% above/below market)
             if action == 'BUY':
-                price = round(limit_price * 1.005, 2)  # 1% above market
+                price = self.round_price(contract, limit_price * 1.005)  # 1% above market
             else:
-                price = round(limit_price * 0.995, 2)  # 1% below market
-            return self.place_limit_order(contract, action, quantity, price)
+                price = self.round_price(contract, limit_price * 0.995)  # 1% below market
+            return await self.place_limit_order(contract, action, quantity, price)
 
-    def place_limit_order(self, contract, action: str, quantity: int, price: float, gtc: bool = True):
+    async def place_limit_order(self, contract, action: str, quantity: int, price: float, gtc: bool = True):
         period = self.get_trading_period()
         if period == 'closed':
             logger.warning('Market is not open. Orders not placed.')
@@ -442,301 +573,434 @@ class IBKRClient:
             order.exchange = exchange
         if period in ['pre-market', 'after-hours']:
             order.outsideRth = True  # Allow order to execute outside regular hours
-        trade = self.ib.placeOrder(contract, order)
-        self.open_orders[trade.order.orderId] = {
-            'symbol': contract.symbol,
-            'action': action,
-            'quantity': quantity,
-            'price': price,
-            'trade': trade
-        }
+        trade = await self._place_order(contract, order)
+        self.ledger.add(trade.order.orderId, contract.symbol, action, price, quantity, trade=trade)
         logger.info(f"LIMIT: {action} {quantity} {contract.symbol} @ ${price}")
-        self.record_order(contract.symbol, action, price, quantity, getattr(trade.order, 'orderId', None))
         return trade
     
-    def cancel_order(self, order_id: int):
-        """Cancel a specific order"""
-        if order_id in self.open_orders:
-            order_info = self.open_orders[order_id]
-            self.ib.cancelOrder(order_info['trade'].order)
-            self.db.update_order_status(order_id, 'Cancelled')
-            del self.open_orders[order_id]
-            logger.info(f"CANCEL: Order {order_id}")
-    
-    def cancel_all_orders(self, contract):
-        """Cancel all open orders for a contract using reqGlobalCancel"""
-        logger.info(f"CANCEL ALL: {contract.symbol}")
-        self.ib.reqGlobalCancel()
+    async def cancel_order(self, order_id: int):
+        """
+        Send a cancel for a tracked order. The order stays open in the ledger until IBKR reports
+        its final status (_on_order_status, or the reconciler for orders not seen live yet).
+        """
+        record = self.ledger.get(order_id)
+        if record is not None:
+            await self.pacer.acquire(CANCEL)
+            # Loaded from the DB and not seen live yet: cancel by id
+            self.ib.cancelOrder(record.trade.order if record.trade is not None else Order(orderId=order_id))
+            logger.info(f"CANCEL: Order {order_id} sent")
+    
+    async def wait_for_done(self, trades, timeout: float = 5.0) -> int:
+        """Wait until every trade reaches a terminal status or timeout elapses; returns the done count"""
+        deadline = time.monotonic() + timeout
+        while True:
+            done = sum(1 for trade in trades if trade.orderStatus.status in TERMINAL_STATUSES)
+            remaining = deadline - time.monotonic()
+            if done == len(trades) or remaining <= 0:
+                return done
+            await self._wait_for_update(remaining)
+    
+    async def cancel_orders(self, symbol: str, action: str = None, min_price: float = None,
+                            max_price: float = None, timeout: float = 5.0) -> Dict[str, int]:
+        """
+        Cancel one symbol's open orders, optionally only one side and/or a price band.
         
-        # Update database status for tracked orders
-        cancelled_count = 0
-        for order_id, order_info in list(self.open_orders.items()):
-            if order_info['symbol'] == contract.symbol:
-                self.db.update_order_status(order_id, 'Cancelled')
-                cancelled_count += 1
+        Cancels fan out through the pacer's CANCEL lane, IBKR's confirmations are awaited together,
+        and the resulting status changes are committed in one ledger batch. Orders for other symbols (and
+        other strategies on the account) are never touched.
         
-        # Clear in-memory tracking for this symbol
-        self.open_orders = {k: v for k, v in self.open_orders.items() if v['symbol'] != contract.symbol}
+        Returns:
+            Dict with requested, confirmed, filled (raced the cancel) and pending counts
+        """
+        records = [self.ledger.get(order_id) for order_id in self.ledger.ids(symbol, action)]
+        records = [record for record in records if record is not None and
+                   (min_price is None or (record.price is not None and record.price >= min_price)) and
+                   (max_price is None or (record.price is not None and record.price <= max_price))]
+        result = {'requested': len(records), 'confirmed': 0, 'filled': 0, 'pending': 0}
+        if not records:
+            return result
         
-        logger.info(f"CANCELLED: {cancelled_count} orders for {contract.symbol}")
+        trades = []
+        for record in records:
+            await self.pacer.acquire(CANCEL)
+            if record.trade is not None:
+                self.ib.cancelOrder(record.trade.order)
+                trades.append(record.trade)
+            else:
+                # Loaded from the DB and not seen live yet: cancel by id. There is no trade to
+                # confirm it on, so it stays open until the reconciler sees its final status
+                self.ib.cancelOrder(Order(orderId=record.order_id))
+                result['pending'] += 1
+        
+        await self.wait_for_done(trades, timeout)
+        # Commit the outcomes together; nothing is awaited while the batch is open
+        with self.ledger.batch():
+            for trade in trades:
+                status = TERMINAL_STATUSES.get(trade.orderStatus.status)
+                if status is None:
+                    result['pending'] += 1  # Left open; the reconciler picks up the late confirmation
+                    continue
+                result['filled' if status == 'Filled' else 'confirmed'] += 1
+                if trade.order.orderId in self.ledger:
+                    self.ledger.set_status(trade.order.orderId, status)
+        
+        logger.info(f"CANCELLED: {result['confirmed']}/{result['requested']} {action or 'all'} orders for {symbol}"
+                    + (f", {result['filled']} filled first" if result['filled'] else '')
+                    + (f", {result['pending']} unconfirmed" if result['pending'] else ''))
+        return result
+    
+    async def cancel_all_orders(self, contract):
+        """Cancel all open orders for a contract (this symbol only, not reqGlobalCancel)"""
+        logger.info(f"CANCEL ALL: {contract.symbol}")
+        return await self.cancel_orders(contract.symbol)
     
-    def cancel_all_buy_orders(self, contract):
+    async def cancel_all_buy_orders(self, contract):
         """Cancel all open buy orders for a contract"""
-        cancelled = 0
-        for order_id, order_info in list(self.open_orders.items()):
-            if order_info['symbol'] == contract.symbol and order_info['action'] == 'BUY':
-                self.cancel_order(order_id)
-                cancelled += 1
-        logger.info(f"CANCELLED: {cancelled} BUY orders for {contract.symbol}")
-    
-    def cancel_all_sell_orders(self, contract):
+        return await self.cancel_orders(contract.symbol, 'BUY')
+    
+    async def cancel_all_sell_orders(self, contract):
         """Cancel all open sell orders for a contract"""
-        cancelled = 0
-        for order_id, order_info in list(self.open_orders.items()):
-            if order_info['symbol'] == contract.symbol and order_info['action'] == 'SELL':
-                self.cancel_order(order_id)
-                cancelled += 1
-        logger.info(f"CANCELLED: {cancelled} SELL orders for {contract.symbol}")
+        return await self.cancel_orders(contract.symbol, 'SELL')
     
     def count_open_buy_orders(self, contract) -> int:
-        """Count open buy orders for a contract using database records."""
-        return self.db.count_open_orders(contract.symbol, 'BUY')
+        """Count open buy orders for a contract from the in-memory ledger."""
+        return self.ledger.count_open(contract.symbol, 'BUY')
     
     def count_open_sell_orders(self, contract) -> int:
-        """Count open sell orders for a contract using database records."""
-        return self.db.count_open_orders(contract.symbol, 'SELL')
+        """Count open sell orders for a contract from the in-memory ledger."""
+        return self.ledger.count_open(contract.symbol, 'SELL')
     
-    def check_filled_orders(self) -> List[Dict]:
-        """Check for filled orders by checking order status from IBKR"""
-        fills = []
-        cancelled_count = 0
-        inactive_count = 0
-        
-        # Check orders in our in-memory tracking
-        for order_id, order_info in list(self.open_orders.items()):
-            try:
-                trade = order_info['trade']
-                if hasattr(trade, 'orderStatus') and trade.orderStatus:
-                    status = trade.orderStatus.status
-                    if status == 'Filled':
-                        fill = {
-                            'order_id': order_id,
-                            'action': order_info['action'],
-                            'price': trade.orderStatus.avgFillPrice,
-                            'quantity': trade.orderStatus.filled,
-                            'symbol': order_info['symbol']
-                        }
-                        fills.append(fill)
-                        self.record_trade(order_info['symbol'], order_info['action'], trade.orderStatus.avgFillPrice, trade.orderStatus.filled, order_id)
-                        self.db.update_order_status(order_id, 'Filled')
-                        # Update position in DB after fill
-                        self.update_position(order_info['symbol'])
-                        del self.open_orders[order_id]
-                        logger.info(f"FILL: Order {order_id} {order_info['action']} {trade.orderStatus.filled} {order_info['symbol']} @ ${trade.orderStatus.avgFillPrice}")
-                    elif status == 'Cancelled':
-                        self.db.update_order_status(order_id, 'Cancelled')
-                        del self.open_orders[order_id]
-                        cancelled_count += 1
-                    elif status == 'Inactive':
-                        self.db.update_order_status(order_id, 'Inactive')
-                        del self.open_orders[order_id]
-                        inactive_count += 1
-                else:
-                    logger.warning(f"Order {order_id} has no orderStatus")
-            except Exception as e:
-                logger.warning(f"Error checking order {order_id} status: {e}")
+    def get_committed_cash(self, symbol: str) -> float:
+        """Cash committed to open buy orders, from the in-memory ledger."""
+        return self.ledger.committed_cash(symbol)
+
+    def get_bracket_levels(self, symbol: str) -> List[Dict]:
+        """Working, unfilled bracket parents for a symbol with their take-profit child, highest buy price first"""
+        records = [record for record in self.ledger if record.symbol == symbol]
+        children = {record.parent_id: record for record in records if record.parent_id}
+        levels = [
+            {'parent': record, 'child': children.get(record.order_id)}
+            for record in records
+            if record.action == 'BUY' and record.order_id in children and not record.filled and record.price
+        ]
+        return sorted(levels, key=lambda level: level['parent'].price, reverse=True)
+
+    async def modify_order(self, order_id: int, price: float = None, quantity: int = None):
+        """
+        Change the limit price and/or size of a working order in place.
+
+        The same orderId is re-submitted, so IBKR keeps bracket links (parentId) and treats it
+        as a modification rather than a cancel and a new order. Returns the trade, or None if
+        the order is not tracked.
+        """
+        record = self.ledger.get(order_id)
+        if record is None or record.trade is None:
+            logger.warning(f"MODIFY: Order {order_id} is not a tracked working order")
+            return None
+        price = record.price if price is None else price
+        quantity = record.quantity if quantity is None else quantity
+        if price == record.price and quantity == record.quantity:
+            return record.trade
+
+        order = record.trade.order
+        if price is not None:
+            order.lmtPrice = price
+        order.totalQuantity = quantity
+        order.transmit = True  # Bracket parents were first sent with transmit=False
+        await self.pacer.acquire(ORDER)
+        trade = self.ib.placeOrder(record.trade.contract, order)
+        old_price, old_quantity = record.price, record.quantity
+        self.ledger.update(order_id, price=price, quantity=quantity, trade=trade)
+        logger.info(f"MODIFY: Order {order_id} {record.action} {old_quantity}@{old_price} -> {quantity}@{price}")
+        return trade
+
+    async def reprice_ladder(self, contract, levels, profit_pct: float = None) -> Dict[str, int]:
+        """
+        Move the working grid to new (buy_price, quantity) levels with as few messages as possible.
+
+        Existing unfilled brackets are matched to the new levels from the top down and modified in
+        place (parent and take-profit); levels whose price and size are unchanged are not touched.
+        Surplus brackets are cancelled and missing levels are placed as new brackets.
+
+        Returns:
+            Dict with modified/unchanged/placed/cancelled counts
+        """
+        if profit_pct is None:
+            profit_pct = self.config.profit_pct
+        targets = sorted(levels, key=lambda level: level[0], reverse=True)
+        existing = self.get_bracket_levels(contract.symbol)
+        counts = {'modified': 0, 'unchanged': 0, 'placed': 0, 'cancelled': 0}
+
+        modifications = []
+        for level, (buy_price, quantity) in zip(existing, targets):
+            parent, child = level['parent'], level['child']
+            sell_price = self.round_price(contract, buy_price * (1 + profit_pct))
+            if (parent.price, parent.quantity, child.price, child.quantity) == (buy_price, quantity, sell_price, quantity):
+                counts['unchanged'] += 1
                 continue
+            counts['modified'] += 1
+            modifications.append(self.modify_order(parent.order_id, buy_price, quantity))
+            modifications.append(self.modify_order(child.order_id, sell_price, quantity))
+
+        surplus = [level['parent'].order_id for level in existing[len(targets):]]
+        # modify_order and cancel_order enqueue their own ledger rows; no batch is held across the sends
+        await asyncio.gather(*modifications, *(self.cancel_order(order_id) for order_id in surplus))
+        counts['cancelled'] = len(surplus)
+
+        missing = targets[len(existing):]
+        if missing:
+            placed = await self.place_grid_ladder(contract, missing, profit_pct)
+            counts['placed'] = len(placed or [])
+
+        logger.info(f"Reprice ladder {contract.symbol}: {counts}")
+        return counts
+
+    def _on_exec_details(self, trade, fill):
+        """Record each execution (full or partial) the moment IBKR reports it"""
+        self._process_fills([(trade, fill)])
+    
+    def _process_fills(self, pairs) -> int:
+        """Record (trade, fill) pairs in bulk, update their orders and queue fill events; returns how many were new"""
+        try:
+            parsed = []
+            for trade, fill in pairs:
+                execution = fill.execution
+                order_id = (trade.order.orderId if trade is not None else 0) or execution.orderId
+                action = 'BUY' if execution.side == 'BOT' else 'SELL'
+                exec_time = execution.time.isoformat() if execution.time else None
+                parsed.append((trade, execution, order_id, fill.contract.symbol, action, exec_time))
+            
+            # executions is keyed on execId, so replays (reconnects, reqExecutions) are ignored
+            new_ids = self.db.record_executions([
+                (execution.execId, order_id, symbol, action, execution.price, execution.shares, exec_time, execution.permId)
+                for trade, execution, order_id, symbol, action, exec_time in parsed
+            ])
+            
+            with self.ledger.batch():
+                for trade, execution, order_id, symbol, action, exec_time in parsed:
+                    if execution.execId not in new_ids:
+                        continue
+                    # trades keeps one row per order with the cumulative fill
+                    self.ledger.enqueue(trades=[(symbol, action, execution.avgPrice, execution.cumQty, order_id)])
+                    self.ledger.apply_fill(order_id, execution.shares)
+                    
+                    if trade is not None:
+                        total_quantity = trade.order.totalQuantity
+                    else:
+                        # Backfilled execution whose order ib_async no longer tracks
+                        record = self.ledger.get(order_id)
+                        total_quantity = record.quantity if record is not None else execution.cumQty
+                    final = execution.cumQty >= total_quantity
+                    if final and order_id in self.ledger:
+                        self.ledger.set_status(order_id, 'Filled')
+                    
+                    self.fill_queue.put_nowait({
+                        'order_id': order_id,
+                        'action': action,
+                        'price': execution.price,
+                        'quantity': execution.shares,
+                        'symbol': symbol,
+                        'exec_id': execution.execId,
+                        'time': exec_time,
+                        'final': final
+                    })
+                    logger.info(f"FILL: Order {order_id} {action} {execution.shares} {symbol} @ ${execution.price} "
+                                f"({execution.cumQty}/{total_quantity}{'' if final else ' partial'})")
+            return len(new_ids)
+        except Exception as e:
+            logger.error(f"Error processing execution: {e}")
+            return 0
+    
+    def _on_commission_report(self, trade, fill, report):
+        """Attach commissions to their execution"""
+        try:
+            self.db.record_commission(fill.execution.execId, report.commission)
+        except Exception as e:
+            logger.warning(f"Error recording commission for {fill.execution.execId}: {e}")
+    
+    def _on_order_status(self, trade):
+        """Move tracked orders to their terminal status as soon as IBKR reports it"""
+        order_id = trade.order.orderId
+        if order_id not in self.ledger:
+            return
+        status = trade.orderStatus.status
+        if status == 'Filled':
+            self.ledger.set_status(order_id, 'Filled')
+        elif status in ('Cancelled', 'ApiCancelled'):
+            self.ledger.set_status(order_id, 'Cancelled')
+            logger.info(f"Order {order_id} cancelled")
+        elif status == 'Inactive':
+            self.ledger.set_status(order_id, 'Inactive')
+            logger.info(f"Order {order_id} inactive")
+    
+    async def backfill_executions(self) -> int:
+        """
+        Pull executions newer than the persisted cursor and run them through the fill pipeline.
         
-        # Summary logging
-        if fills or cancelled_count > 0 or inactive_count > 0:
-            summary = []
-            if fills:
-                summary.append(f"{len(fills)} filled")
-            if cancelled_count > 0:
-                summary.append(f"{cancelled_count} cancelled")
-            if inactive_count > 0:
-                summary.append(f"{inactive_count} inactive")
-            logger.info(f"Order status check: {', '.join(summary)}")
+        Used on startup and after reconnects so fills that happened while the bot was away are
+        recorded against their orders (and PnL) instead of those orders being taken for cancelled.
+        Returns how many executions were new.
+        """
+        exec_filter = ExecutionFilter()
+        cursor = self.db.get_exec_cursor()
+        if cursor:
+            since = datetime.fromisoformat(cursor[0])
+            if since.tzinfo is not None:
+                since = since.astimezone(pytz.utc)
+            exec_filter.time = since.strftime('%Y%m%d-%H:%M:%S')  # UTC
         
+        fills = await self.pacer.call_async(DATA, self.ib.reqExecutionsAsync, exec_filter)
+        # Oldest first, so each order's cumulative fill ends at its latest value
+        fills = sorted(fills or [], key=lambda fill: (fill.execution.time, fill.execution.execId))
+        backfilled = self._process_fills([(self._trade_for(fill), fill) for fill in fills])
+        if backfilled:
+            logger.info(f"Backfilled {backfilled} execution(s) since {cursor[0] if cursor else 'start of day'}")
+        else:
+            logger.debug(f"Execution backfill: nothing new since {cursor[0] if cursor else 'start of day'}")
+        return backfilled
+    
+    def _trade_for(self, fill):
+        """ib_async's Trade for a fill, if it still tracks the order"""
+        record = self.ledger.get(fill.execution.orderId)
+        if record is not None and record.trade is not None:
+            return record.trade
+        return self.ib.wrapper.permId2Trade.get(fill.execution.permId)
+    
+    async def resume(self):
+        """
+        Restore working state after a reconnect instead of cold-starting: re-open market data
+        streams, then reconcile orders, executions and positions in one pass.
+        """
+        self.connected = True
+        self.market_data.resubscribe()
+        self.positions.attach(self.ib)
+        self.reconciler.mark_stale()
+        # Executions first, so orders that filled while we were away are not taken for cancelled
+        await self.backfill_executions()
+        await self.sync_open_orders_from_ibkr()
+    
+    async def wait_connected(self, timeout: float = None) -> bool:
+        """Wait for the supervisor to restore a dropped connection; True once connected"""
+        return await self.supervisor.wait_connected(timeout)
+    
+    def drain_fills(self) -> List[Dict]:
+        """Return every fill event received since the last call without blocking"""
+        fills = []
+        while not self.fill_queue.empty():
+            fills.append(self.fill_queue.get_nowait())
         return fills
     
-
+    async def wait_for_fills(self, timeout: float) -> bool:
+        """Wait until a fill is queued or timeout elapses; True if fills are waiting"""
+        deadline = time.monotonic() + timeout
+        while self.fill_queue.empty():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await self._wait_for_update(remaining)
+        return not self.fill_queue.empty()
+    
+    def check_filled_orders(self) -> List[Dict]:
+        """Return fill events delivered by the execution event pipeline since the last call"""
+        return self.drain_fills()
     
     def get_open_orders(self) -> List[Dict]:
         """Get all open orders from in-memory tracking"""
-        return list(self.open_orders.values())
+        return [record.to_dict() for record in self.ledger]
     
-    def sync_open_orders_from_ibkr(self):
-        """Fetch all open orders from IBKR, repopulate self.open_orders, and mark missing DB orders as cancelled."""
+    def track_symbols(self, symbols):
+        """Reconcile orders for these symbols (the grids this connection runs) instead of config['symbol']"""
+        self.reconciler.symbols = set(symbols)
+        self.reconciler.mark_stale()
+    
+    async def sync_open_orders_from_ibkr(self, full: bool = False):
+        """
+        Bring the order ledger up to date with IBKR.
+        
+        Only orders touched by openOrderEvent/orderStatusEvent since the last call are diffed;
+        a full reqAllOpenOrders snapshot is taken after a reconnect, when the periodic integrity
+        check is due, or when full=True.
+        """
         if not self.connected:
             logger.error("Cannot sync orders: not connected to IBKR")
             return False
-            
+        
         try:
-            ibkr_open_orders = self.ib.reqAllOpenOrders()
+            if full:
+                self.reconciler.mark_stale()
+            snapshot = None
+            if self.reconciler.snapshot_due():
+                trades = await self.pacer.call_async(DATA, self.ib.reqAllOpenOrdersAsync)
+                snapshot = lambda: trades
+            result = self.reconciler.reconcile(snapshot=snapshot)
+            self.refresh_market_data()
+            self.retention.maybe_prune()
             
-            if ibkr_open_orders is None:
-                logger.error("IBKR returned None for open orders")
-                return False
-                
-            # Validate and extract IBKR orders safely
-            ibkr_open_order_ids = set()
-            valid_ibkr_orders = []
-            symbol_orders_count = 0
-            
-            for trade in ibkr_open_orders:
-                try:
-                    # Validate trade object structure
-                    if not self._is_valid_trade_object(trade):
-                        continue
-                    
-                    # Extract order information safely
-                    order_info = self._extract_order_info(trade)
-                    if order_info is None:
-                        continue
-                    
-                    order_id = order_info['order_id']
-                    symbol = order_info['symbol']
-                    action = order_info['action']
-                    quantity = order_info['quantity']
-                    
-                    # Only process orders for our configured symbol
-                    if symbol != self.symbol:
-                        continue
-                    
-                    symbol_orders_count += 1
-                    ibkr_open_order_ids.add(order_id)
-                    valid_ibkr_orders.append((order_id, order_info, trade))
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing IBKR order: {e}")
-                    continue
-            
-            # Repopulate in-memory open_orders safely
-            old_open_orders_count = len(self.open_orders)
-            self.open_orders.clear()
-            
-            for order_id, order_info, trade in valid_ibkr_orders:
-                try:
-                    self.open_orders[order_id] = {
-                        'symbol': order_info['symbol'],
-                        'action': order_info['action'],
-                        'quantity': order_info['quantity'],
-                        'price': order_info['price'],
-                        'trade': trade
-                    }
-                except Exception as e:
-                    logger.warning(f"Error adding order {order_id} to memory: {e}")
-                    continue
-            
-            # Safely handle database order synchronization
-            cancelled_count = self._sync_database_orders(ibkr_open_order_ids)
-            
-            # Summary logging
-            if symbol_orders_count > 0 or cancelled_count > 0:
-                logger.info(f"Order sync: {symbol_orders_count} {self.symbol} orders from IBKR, {cancelled_count} cancelled in DB, memory: {old_open_orders_count}->{len(self.open_orders)}")
+            summary = (f"Order sync{' (full)' if result['full'] else ''} v{result['version']}: "
+                       f"+{result['added']} ~{result['changed']} -{result['removed']}, open: {len(self.ledger)}")
+            if result['added'] or result['changed'] or result['removed']:
+                logger.info(summary)
             else:
-                logger.debug(f"Order sync: {symbol_orders_count} {self.symbol} orders from IBKR, memory: {old_open_orders_count}->{len(self.open_orders)}")
-            
+                logger.debug(summary)
             return True
             
         except Exception as e:
             logger.error(f"Critical error during order sync: {e}")
             return False
+
+    async def sleep(self, seconds: float):
+        """Sleep for specified seconds without blocking ib_async callbacks"""
+        await asyncio.sleep(seconds)
+
+
+class IBKRClient:
+    """
+    Synchronous facade over AsyncIBKRClient for scripts and the blocking trading loop.
     
-    def _is_valid_trade_object(self, trade):
-        """Validate that a trade object has the required structure."""
-        try:
-            return (hasattr(trade, 'order') and 
-                   hasattr(trade, 'contract') and 
-                   trade.order is not None and 
-                   trade.contract is not None)
-        except Exception:
-            return False
+    Coroutine methods of the async client are exposed as blocking calls that run ib_async's
+    event loop until they complete; everything else (ledger, db, config, ...) is passed through.
+    """
     
-    def _extract_order_info(self, trade):
-        """Safely extract order information from a trade object."""
-        try:
-            # Validate required attributes exist
-            if not (hasattr(trade.order, 'orderId') and 
-                   hasattr(trade.order, 'action') and 
-                   hasattr(trade.order, 'totalQuantity')):
-                return None
-            
-            if not hasattr(trade.contract, 'symbol'):
-                return None
-            
-            # Extract values with validation
-            order_id = trade.order.orderId
-            if not isinstance(order_id, int) or order_id <= 0:
-                return None
-            
-            symbol = trade.contract.symbol
-            if not symbol or not isinstance(symbol, str):
-                return None
-            
-            action = trade.order.action
-            if action not in ['BUY', 'SELL']:
-                return None
-            
-            quantity = trade.order.totalQuantity
-            if not isinstance(quantity, (int, float)) or quantity <= 0:
-                return None
-            
-            # Extract price safely
-            price = None
-            if hasattr(trade.order, 'lmtPrice'):
-                price = trade.order.lmtPrice
-                if price is not None and (not isinstance(price, (int, float)) or price < 0):
-                    price = None
-            
-            return {
-                'order_id': order_id,
-                'symbol': symbol,
-                'action': action,
-                'quantity': quantity,
-                'price': price
-            }
-            
-        except Exception:
-            return None
+    def __init__(self, paper: bool = True, client_id: int = 1, port: int = 4002, db: Optional[TradeDB] = None,
+                 settings: Optional[Settings] = None):
+        self.aio = AsyncIBKRClient(paper=paper, client_id=client_id, port=port, db=db, settings=settings)
+    
+    def __getattr__(self, name):
+        if name == 'aio':
+            raise AttributeError(name)
+        attr = getattr(self.aio, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        
+        @functools.wraps(attr)
+        def run(*args, **kwargs):
+            return self.run(attr(*args, **kwargs))
+        return run
+    
+    @staticmethod
+    def _use_loop():
+        """
+        Make ib_async's event loop current for this thread.
+        
+        ib.run() schedules on the current loop, which asyncio.run() elsewhere in the process
+        unsets (and may close, if ib_async picked it up while it ran).
+        """
+        loop = util.getLoop()
+        if loop.is_closed():
+            util.getLoop.cache_clear()
+            loop = util.getLoop()
+        asyncio.set_event_loop(loop)
+        return loop
+    
+    def run(self, coro):
+        """Run a coroutine to completion on ib_async's event loop"""
+        self._use_loop()
+        return self.aio.ib.run(coro)
     
-    def _sync_database_orders(self, ibkr_open_order_ids):
-        """Safely synchronize database orders with IBKR orders."""
-        try:
-            db_open_orders = self.db.get_open_orders()
-            if not db_open_orders:
-                return 0
-            
-            cancelled_count = 0
-            
-            for db_order in db_open_orders:
-                try:
-                    db_order_id = db_order.get('order_id')
-                    if not db_order_id:
-                        continue
-                    
-                    if db_order_id not in ibkr_open_order_ids:
-                        # Mark as cancelled in DB
-                        try:
-                            self.db.update_order_status(db_order_id, 'Cancelled')
-                            cancelled_count += 1
-                        except Exception as e:
-                            logger.error(f"Failed to update order {db_order_id} status: {e}")
-                        
-                except Exception as e:
-                    logger.warning(f"Error processing database order: {e}")
-                    continue
-            
-            return cancelled_count
-                
-        except Exception as e:
-            logger.error(f"Error during database sync: {e}")
-            return 0
-
     def sleep(self, seconds: float):
-        """Sleep for specified seconds"""
-        self.ib.sleep(seconds)
+        """Sleep for specified seconds while processing ib_async events"""
+        self._use_loop()
+        self.aio.ib.sleep(seconds)
 
 # Legacy functions for backward compatibility
 def connect_ib():
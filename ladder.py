@@ -0,0 +1,193 @@
+# grid-trading/ladder.py
+
+import logging
+import math
+from collections import Counter
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# Level states
+EMPTY = 'empty'        # Nothing working at this level
+WORKING = 'working'    # Bracket parent BUY is working
+HOLDING = 'holding'    # BUY filled, take-profit SELL working
+DONE = 'done'          # Take-profit filled; the level can be bought again
+
+VACANT_STATES = (EMPTY, DONE)
+
+
+class Level:
+    """One rung of the ladder"""
+    __slots__ = ('step', 'state', 'parent_id', 'child_id', 'quantity', 'round_trips')
+
+    def __init__(self, step, state=EMPTY, parent_id=None, child_id=None, quantity=0):
+        self.step = step
+        self.state = state
+        self.parent_id = parent_id
+        self.child_id = child_id
+        self.quantity = quantity
+        self.round_trips = 0
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class GridLadder:
+    """
+    Per-level state of one symbol's grid.
+
+    Levels are indexed by their integer price step below an anchor (step n sits at
+    anchor - n * interval), so the levels around any price are found by arithmetic and dict
+    lookups instead of scanning orders. Each level moves EMPTY -> WORKING -> HOLDING -> DONE
+    as its bracket is placed, bought and sold; only vacant levels (EMPTY or DONE) are refilled.
+    """
+
+    def __init__(self, symbol: str, anchor: float, interval: float):
+        if interval <= 0:
+            raise ValueError(f"Grid interval must be positive, got {interval}")
+        self.symbol = symbol
+        self.anchor = anchor
+        self.interval = interval
+        self.levels = {}       # step -> Level
+        self._by_order = {}    # parent/child order id -> step
+        self._counts = Counter()
+
+    # --- Geometry ------------------------------------------------------------
+
+    def price_for(self, step: int) -> float:
+        return self.anchor - step * self.interval
+
+    def step_for(self, price: float) -> int:
+        """Nearest step to a price"""
+        return round((self.anchor - price) / self.interval)
+
+    def state(self, step: int) -> str:
+        level = self.levels.get(step)
+        return level.state if level is not None else EMPTY
+
+    def count(self, state: str) -> int:
+        return self._counts[state]
+
+    def vacant(self, price: float, count: int) -> list:
+        """Vacant steps among the `count` levels just below price, nearest first"""
+        first = math.floor((self.anchor - price) / self.interval) + 1
+        return [step for step in range(first, first + count) if self.state(step) in VACANT_STATES]
+
+    # --- Transitions ---------------------------------------------------------
+
+    def _set(self, level, state):
+        self._counts[level.state] -= 1
+        self._counts[state] += 1
+        level.state = state
+
+    def _level(self, step):
+        level = self.levels.get(step)
+        if level is None:
+            level = self.levels[step] = Level(step)
+            self._counts[EMPTY] += 1
+        return level
+
+    def place(self, step: int, parent_id: int, child_id: int, quantity) -> bool:
+        """Record a bracket working at step; False if the level is already taken"""
+        level = self._level(step)
+        if level.state not in VACANT_STATES:
+            logger.warning(f"[{self.symbol}] Ladder level {step} is already {level.state}; "
+                           f"order {parent_id} not tracked on the ladder")
+            return False
+        for order_id in (level.parent_id, level.child_id):
+            self._by_order.pop(order_id, None)
+        level.parent_id, level.child_id, level.quantity = parent_id, child_id, quantity
+        self._by_order[parent_id] = step
+        if child_id is not None:
+            self._by_order[child_id] = step
+        self._set(level, WORKING)
+        return True
+
+    def hold(self, step: int, parent_id: int, child_id: int, quantity) -> bool:
+        """Record a level whose BUY already filled and whose take-profit is working"""
+        if not self.place(step, parent_id, child_id, quantity):
+            return False
+        self._set(self.levels[step], HOLDING)
+        return True
+
+    def on_fill(self, fill: dict):
+        """Advance the level an execution belongs to; returns its step or None"""
+        step = self._by_order.get(fill['order_id'])
+        if step is None:
+            return None
+        level = self.levels[step]
+        if not fill['final']:
+            return step
+        if fill['order_id'] == level.parent_id and level.state == WORKING:
+            self._set(level, HOLDING)
+        elif fill['order_id'] == level.child_id and level.state in (WORKING, HOLDING):
+            level.round_trips += 1
+            self._set(level, DONE)
+        return step
+
+    def reconcile(self, ledger):
+        """
+        Catch up with orders that finished without a fill event reaching the ladder
+        (cancellations, fills while disconnected). A working level whose parent left the
+        ledger holds if its take-profit is still working, otherwise it is vacant again.
+        """
+        for level in list(self.levels.values()):
+            if level.state == WORKING and level.parent_id not in ledger:
+                if level.child_id in ledger:
+                    self._set(level, HOLDING)
+                else:
+                    self._set(level, EMPTY)
+            elif level.state == HOLDING and level.child_id not in ledger:
+                self._set(level, DONE)
+
+    # --- Startup -------------------------------------------------------------
+
+    @staticmethod
+    def infer_interval(prices, default: float) -> float:
+        """Spacing of existing levels: the smallest gap between distinct prices, or default if there is none"""
+        distinct = sorted(set(prices))
+        gaps = [high - low for low, high in zip(distinct, distinct[1:])]
+        return min(gaps) if gaps else default
+
+    def _free_step(self, step: int) -> int:
+        """step if it is vacant, otherwise the nearest vacant step"""
+        offset = 0
+        while True:
+            for candidate in (step + offset, step - offset):
+                if self.state(candidate) in VACANT_STATES:
+                    return candidate
+            offset += 1
+
+    @classmethod
+    def rebuild(cls, symbol: str, price: float, interval: float, brackets=(), lots=()):
+        """
+        Rebuild a ladder from broker and DB state.
+
+        Args:
+            interval: Spacing for a ladder with fewer than two working brackets; otherwise the
+                spacing the brackets were placed with is inferred from their prices
+            brackets: Working, unfilled brackets as from get_bracket_levels
+            lots: Bought lots whose take-profit is still working, as from get_holding_lots
+
+        The anchor is placed one interval above the highest working or held level so existing
+        orders keep their steps; a grid with nothing working is anchored at the current price.
+        Every order gets a level (the nearest free one if its own is taken), so none goes uncounted.
+        """
+        interval = cls.infer_interval([bracket['parent'].price for bracket in brackets], interval)
+        prices = [bracket['parent'].price for bracket in brackets] + [lot['buy_price'] for lot in lots]
+        ladder = cls(symbol, max(prices) + interval if prices else price, interval)
+        for bracket in brackets:
+            parent, child = bracket['parent'], bracket['child']
+            ladder.place(ladder._free_step(ladder.step_for(parent.price)), parent.order_id,
+                         child.order_id if child is not None else None, parent.quantity)
+        for lot in lots:
+            ladder.hold(ladder._free_step(ladder.step_for(lot['buy_price'])), lot['parent_order_id'],
+                        lot['child_order_id'], lot['quantity'])
+        return ladder
+
+    def get_stats(self) -> dict:
+        return {
+            'anchor': self.anchor,
+            'interval': self.interval,
+            'levels': {state: self._counts[state] for state in (EMPTY, WORKING, HOLDING, DONE)},
+            'round_trips': sum(level.round_trips for level in self.levels.values()),
+        }
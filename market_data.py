@@ -0,0 +1,362 @@
+# grid-trading/market_data.py
+
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+from pacing import CANCEL, DATA
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+def _valid(value) -> bool:
+    return value is not None and not math.isnan(value) and value > 0
+
+
+class Quote:
+    """Latest top-of-book snapshot for one symbol"""
+    __slots__ = ('symbol', 'bid', 'ask', 'last', 'close', 'updated', 'source')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bid = math.nan
+        self.ask = math.nan
+        self.last = math.nan
+        self.close = math.nan
+        self.updated = 0.0  # time.monotonic() of the last update
+        self.source = None  # 'stream' or 'snapshot'
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.updated
+
+    def price(self) -> Optional[float]:
+        """Best available price, in the same order of preference as the old reqMktData path"""
+        # Market price: last if it is inside the spread, otherwise the midpoint (as Ticker.marketPrice)
+        market = math.nan
+        if _valid(self.bid) and _valid(self.ask):
+            if _valid(self.last) and self.bid <= self.last <= self.ask:
+                market = self.last
+            else:
+                market = (self.bid + self.ask) / 2
+        elif _valid(self.last):
+            market = self.last
+        for candidate in (market, self.last, self.close, self.bid, self.ask):
+            if _valid(candidate):
+                return candidate
+        return None
+
+
+class MarketDataManager:
+    """
+    Streaming and snapshot market data under IB's concurrent market data line budget.
+
+    Streams opened with subscribe() are shared by reference count. Symbols registered with
+    watch() compete for the remaining lines: rebalance() streams the ones whose live orders
+    are nearest the touch and recycles lines from the rest, which refresh_snapshots() keeps
+    priced with rotating snapshot requests, most overdue first. Ticks update a quote cache,
+    so price reads are non-blocking dictionary lookups; freshness() reports each quote's age.
+
+    Requests are paced without ever blocking the event loop: one that cannot be sent at once
+    is queued in order and sent by a task awaiting the pacer.
+    """
+
+    def __init__(self, ib, stale_after: float = 60.0, pacer=None, max_lines: int = 100,
+                 snapshot_lines: int = 10, near_touch: float = 0.02, snapshot_interval: float = 30.0,
+                 idle_snapshot_interval: float = 120.0, snapshot_timeout: float = 11.0):
+        self.ib = ib
+        self.stale_after = stale_after
+        self.pacer = pacer
+        self.max_lines = max_lines
+        self.snapshot_lines = snapshot_lines  # Lines kept free for snapshot rotation
+        self.near_touch = near_touch
+        self.snapshot_interval = snapshot_interval
+        self.idle_snapshot_interval = idle_snapshot_interval
+        self.snapshot_timeout = snapshot_timeout
+        self._contracts = {}       # symbol -> contract, for open streams
+        self._tickers = {}         # symbol -> streaming Ticker
+        self._refcounts = defaultdict(int)
+        self._watched = {}         # symbol -> contract, priced by stream or snapshot
+        self._priority = {}        # symbol -> distance of the nearest live order from the touch
+        self._assigned = set()     # watched symbols holding a line given by rebalance()
+        self._snapshots = {}       # symbol -> time.monotonic() a snapshot was requested
+        self._quotes = {}
+        self._waiters = defaultdict(list)
+        self._listeners = []
+        self._outbox = deque()     # (lane, fn, args, on_sent) waiting for the pacer
+        self._sender = None
+        self.snapshot_requests = 0
+        self.recycled_lines = 0
+        self.ib.pendingTickersEvent += self._on_pending_tickers
+
+    # --- Streams -------------------------------------------------------------
+
+    def subscribe(self, contract):
+        """
+        Add a reference to the contract's stream, opening it on first use.
+
+        Returns the Ticker, or None while the request is still queued behind the pacer.
+        """
+        symbol = contract.symbol
+        self._refcounts[symbol] += 1
+        if symbol not in self._tickers:
+            self._open(contract)
+        return self._tickers[symbol]
+
+    def unsubscribe(self, symbol: str):
+        """Drop a reference; the stream is cancelled when nobody needs it any more"""
+        if self._refcounts.get(symbol, 0) <= 0:
+            return
+        self._refcounts[symbol] -= 1
+        if self._refcounts[symbol] == 0:
+            del self._refcounts[symbol]
+            if symbol not in self._assigned:
+                self._close(symbol)
+
+    def _open(self, contract):
+        symbol = contract.symbol
+        self._contracts[symbol] = contract
+        self._tickers[symbol] = self._send(DATA, self.ib.reqMktData, contract, on_sent=self._stream_opened)
+        self._quotes.setdefault(symbol, Quote(symbol))
+        self._snapshots.pop(symbol, None)
+        logger.info(f"Market data: streaming {symbol}")
+
+    def _close(self, symbol):
+        self._tickers.pop(symbol, None)
+        contract = self._contracts.pop(symbol, None)
+        if contract is not None:
+            self._send(CANCEL, self.ib.cancelMktData, contract)
+            logger.info(f"Market data: stopped streaming {symbol}")
+
+    def _stream_opened(self, ticker):
+        symbol = ticker.contract.symbol
+        if symbol in self._tickers:
+            self._tickers[symbol] = ticker
+
+    def _send(self, lane, fn, *args, on_sent=None):
+        """
+        Send a request now if the pacer has a token free, otherwise queue it; returns fn's result,
+        or None if it was queued (on_sent then gets the result once it goes out). Callers without
+        a running event loop wait for the pacer instead.
+        """
+        if self.pacer is None:
+            return fn(*args)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.pacer.call(lane, fn, *args)
+        if not self._outbox and self.pacer.try_acquire(lane):
+            return fn(*args)
+        self._outbox.append((lane, fn, args, on_sent))
+        if self._sender is None:
+            self._sender = loop.create_task(self._drain())
+        return None
+
+    async def _drain(self):
+        """Send queued requests in order as the pacer allows"""
+        try:
+            while self._outbox:
+                lane, fn, args, on_sent = self._outbox[0]
+                await self.pacer.acquire(lane)
+                self._outbox.popleft()
+                try:
+                    result = fn(*args)
+                    if on_sent is not None:
+                        on_sent(result)
+                except Exception as e:
+                    logger.error(f"Market data request failed: {e}")
+        finally:
+            self._sender = None
+
+    def resubscribe(self):
+        """Re-open every stream after a reconnect (the gateway forgets subscriptions on disconnect)"""
+        self._snapshots.clear()
+        for symbol, contract in list(self._contracts.items()):
+            self._tickers[symbol] = self._send(DATA, self.ib.reqMktData, contract, on_sent=self._stream_opened)
+        if self._contracts:
+            logger.info(f"Market data: resubscribed {len(self._contracts)} stream(s)")
+
+    def is_subscribed(self, symbol: str) -> bool:
+        return symbol in self._tickers
+
+    def close(self):
+        """Cancel every stream"""
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        self._outbox.clear()
+        for symbol, contract in list(self._contracts.items()):
+            try:
+                self._send(CANCEL, self.ib.cancelMktData, contract)
+            except Exception as e:
+                logger.warning(f"Failed to cancel market data for {symbol}: {e}")
+        self._contracts.clear()
+        self._tickers.clear()
+        self._refcounts.clear()
+        self._assigned.clear()
+        self._snapshots.clear()
+
+    # --- Line budget ---------------------------------------------------------
+
+    def watch(self, contract, priority: float = math.inf):
+        """Keep a symbol priced without pinning a line; lower priority values are more urgent"""
+        self._watched[contract.symbol] = contract
+        self._priority.setdefault(contract.symbol, priority)
+        self._quotes.setdefault(contract.symbol, Quote(contract.symbol))
+
+    def unwatch(self, symbol: str):
+        self._watched.pop(symbol, None)
+        self._priority.pop(symbol, None)
+        if symbol in self._assigned:
+            self._assigned.discard(symbol)
+            if symbol not in self._refcounts:
+                self._close(symbol)
+
+    def watched(self):
+        return list(self._watched)
+
+    def set_priority(self, symbol: str, priority: float):
+        """Distance (fraction of price) of the symbol's nearest live order from the touch; inf if none"""
+        if symbol in self._watched:
+            self._priority[symbol] = priority
+
+    def lines_in_use(self) -> int:
+        return len(self._tickers) + len(self._snapshots)
+
+    def rebalance(self):
+        """Give streaming lines to the watched symbols nearest the touch and recycle the rest"""
+        budget = max(0, self.max_lines - self.snapshot_lines - len(self._refcounts))
+        ranked = sorted((priority, symbol) for symbol, priority in self._priority.items()
+                        if symbol not in self._refcounts and priority <= self.near_touch)
+        wanted = [symbol for _, symbol in ranked[:budget]]
+        for symbol in self._assigned - set(wanted):
+            self._assigned.discard(symbol)
+            self.recycled_lines += 1
+            if symbol not in self._refcounts:
+                self._close(symbol)
+        for symbol in wanted:
+            if symbol not in self._assigned:
+                self._assigned.add(symbol)
+                if symbol not in self._tickers:
+                    self._open(self._watched[symbol])
+        return set(wanted)
+
+    def _snapshot_target(self, symbol) -> float:
+        return self.snapshot_interval if self._priority.get(symbol, math.inf) < math.inf else self.idle_snapshot_interval
+
+    def request_snapshot(self, symbol: str) -> bool:
+        """One-off snapshot for a watched symbol without a stream; False if it is not needed or possible"""
+        if symbol in self._tickers or symbol in self._snapshots or symbol not in self._watched:
+            return False
+        if self.lines_in_use() >= self.max_lines:
+            return False
+        self._snapshots[symbol] = time.monotonic()
+        self.snapshot_requests += 1
+        self._send(DATA, self.ib.reqMktData, self._watched[symbol], '', True, False)
+        return True
+
+    def refresh_snapshots(self) -> int:
+        """Request snapshots for the most overdue watched symbols that have no stream"""
+        now = time.monotonic()
+        for symbol, requested in list(self._snapshots.items()):
+            if now - requested >= self.snapshot_timeout:
+                del self._snapshots[symbol]  # IB never completed it; free the line
+        overdue = []
+        for symbol in self._watched:
+            if symbol in self._tickers or symbol in self._snapshots:
+                continue
+            age = self.age(symbol)
+            ratio = math.inf if age is None else age / self._snapshot_target(symbol)
+            if ratio >= 1:
+                overdue.append((-ratio, self._priority.get(symbol, math.inf), symbol))
+        requested = 0
+        for _, _, symbol in sorted(overdue):
+            if not self.request_snapshot(symbol):
+                break
+            requested += 1
+        return requested
+
+    def freshness(self) -> dict:
+        """Age in seconds (None if never priced) and source of every watched or streamed symbol"""
+        result = {}
+        for symbol in set(self._watched) | set(self._tickers):
+            quote = self.quote(symbol)
+            result[symbol] = {
+                'age': quote.age if quote is not None else None,
+                'source': quote.source if quote is not None else None,
+                'streaming': symbol in self._tickers,
+            }
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            'max_lines': self.max_lines,
+            'streams': len(self._tickers),
+            'snapshots_in_flight': len(self._snapshots),
+            'watched': len(self._watched),
+            'snapshot_requests': self.snapshot_requests,
+            'recycled_lines': self.recycled_lines,
+        }
+
+    # --- Ticks ---------------------------------------------------------------
+
+    def add_listener(self, callback):
+        """Call callback(symbol, quote) after every quote update"""
+        self._listeners.append(callback)
+
+    def _on_pending_tickers(self, tickers):
+        now = time.monotonic()
+        for ticker in tickers:
+            symbol = ticker.contract.symbol
+            streaming = symbol in self._tickers
+            if not streaming and symbol not in self._watched:
+                continue
+            quote = self._quotes.setdefault(symbol, Quote(symbol))
+            quote.bid = ticker.bid
+            quote.ask = ticker.ask
+            quote.last = ticker.last
+            quote.close = ticker.close
+            quote.updated = now
+            quote.source = 'stream' if streaming else 'snapshot'
+            if not streaming and _valid(quote.bid) and _valid(quote.ask):
+                self._snapshots.pop(symbol, None)  # Snapshot complete; its line is free again
+            for future in self._waiters.pop(symbol, ()):
+                if not future.done():
+                    future.set_result(quote)
+            for callback in self._listeners:
+                try:
+                    callback(symbol, quote)
+                except Exception as e:
+                    logger.error(f"Market data listener failed for {symbol}: {e}")
+
+    def quote(self, symbol: str) -> Optional[Quote]:
+        quote = self._quotes.get(symbol)
+        return quote if quote is not None and quote.updated else None
+
+    def age(self, symbol: str) -> Optional[float]:
+        """Seconds since the last tick for symbol, or None if none has arrived"""
+        quote = self.quote(symbol)
+        return quote.age if quote is not None else None
+
+    def is_stale(self, symbol: str, max_age: Optional[float] = None) -> bool:
+        age = self.age(symbol)
+        return age is None or age > (self.stale_after if max_age is None else max_age)
+
+    def latest_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """Cached price for symbol, or None if there is no fresh quote. Never blocks."""
+        if self.is_stale(symbol, max_age):
+            return None
+        return self._quotes[symbol].price()
+
+    async def next_tick(self, symbol: str, timeout: Optional[float] = None) -> Quote:
+        """Wait for the next update of symbol's quote"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[symbol].append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if future in self._waiters.get(symbol, ()):
+                self._waiters[symbol].remove(future)
@@ -0,0 +1,296 @@
+# grid-trading/order_ledger.py
+
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+OPEN_STATUS = 'Open'
+
+
+class OrderRecord:
+    """One tracked order. Slots keep thousands of grid orders cheap to hold in memory."""
+    __slots__ = ('order_id', 'symbol', 'action', 'price', 'quantity', 'status',
+                 'order_type', 'parent_id', 'trade', 'filled')
+
+    def __init__(self, order_id, symbol, action, price, quantity, status=OPEN_STATUS,
+                 order_type=None, parent_id=None, trade=None, filled=0):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.action = action
+        self.price = price
+        self.quantity = quantity
+        self.status = status
+        self.order_type = order_type
+        self.parent_id = parent_id
+        self.trade = trade
+        self.filled = filled
+
+    @property
+    def remaining(self):
+        return (self.quantity or 0) - (self.filled or 0)
+
+    @property
+    def notional(self):
+        """Cash still committed by the unfilled part of the order"""
+        return (self.price or 0.0) * self.remaining
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class OrderLedger:
+    """
+    Authoritative in-memory view of open orders with O(1) counts and committed cash.
+
+    Records are indexed by (symbol, action, status) and running aggregates are kept per
+    (symbol, action), so the trading loop never has to query SQLite. Changes are persisted
+    to TradeDB by a background write-behind thread: everything queued while it sleeps is
+    written in one transaction, and the WAL is checkpointed periodically.
+    """
+
+    def __init__(self, db=None, flush_interval: float = 0.5, checkpoint_interval: float = 60.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self._records = {}
+        self._index = defaultdict(set)          # (symbol, action, status) -> order ids
+        self._open_count = defaultdict(int)     # (symbol, action) -> open orders
+        self._open_notional = defaultdict(float)  # (symbol, action) -> sum(price * quantity) of open orders
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._pending = None
+        self._writer = None
+        self._stop = threading.Event()
+
+    # --- Lookups -------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, order_id):
+        return order_id in self._records
+
+    def __iter__(self):
+        return iter(list(self._records.values()))
+
+    def get(self, order_id):
+        return self._records.get(order_id)
+
+    def ids(self, symbol, action=None, status=OPEN_STATUS):
+        """Order ids for a symbol, optionally filtered by action, in the given status"""
+        with self._lock:
+            if action is not None:
+                return set(self._index.get((symbol, action, status), ()))
+            return (set(self._index.get((symbol, 'BUY', status), ())) |
+                    set(self._index.get((symbol, 'SELL', status), ())))
+
+    def count_open(self, symbol, action):
+        return self._open_count.get((symbol, action), 0)
+
+    def committed_cash(self, symbol):
+        """Cash committed to open BUY orders for a symbol"""
+        return self._open_notional.get((symbol, 'BUY'), 0.0)
+
+    # --- Mutations -----------------------------------------------------------
+
+    def add(self, order_id, symbol, action, price, quantity, trade=None, order_type=None,
+            parent_id=None, status=OPEN_STATUS, persist=True):
+        """Track an order, replacing any previous record with the same id"""
+        record = OrderRecord(order_id, symbol, action, price, quantity, status, order_type, parent_id, trade)
+        with self._lock:
+            self._discard(order_id)
+            self._records[order_id] = record
+            self._index_add(record)
+        if persist:
+            lots = [(symbol, parent_id, order_id)] if parent_id else []
+            self.enqueue(orders=[(symbol, action, price, quantity, order_id)], lots=lots)
+        return record
+
+    def set_status(self, order_id, status, persist=True):
+        """Move an order to a new status; finished orders leave the in-memory view"""
+        with self._lock:
+            record = self._records.get(order_id)
+            if record is not None:
+                self._index_remove(record)
+                record.status = status
+                if status == OPEN_STATUS:
+                    self._index_add(record)
+                else:
+                    del self._records[order_id]
+        if persist:
+            self.enqueue(statuses=[(order_id, status)])
+        return record
+
+    def update(self, order_id, price=None, quantity=None, trade=None, persist=True):
+        """Change an order's price and/or size in place, keeping its fill and bracket link"""
+        with self._lock:
+            record = self._records.get(order_id)
+            if record is None:
+                return None
+            self._index_remove(record)
+            if price is not None:
+                record.price = price
+            if quantity is not None:
+                record.quantity = quantity
+            if trade is not None:
+                record.trade = trade
+            self._index_add(record)
+        if persist:
+            self.enqueue(orders=[(record.symbol, record.action, record.price, record.quantity, order_id)])
+        return record
+
+    def apply_fill(self, order_id, quantity):
+        """Record a (partial) execution so committed cash only counts the unfilled remainder"""
+        with self._lock:
+            record = self._records.get(order_id)
+            if record is None:
+                return None
+            self._index_remove(record)
+            record.filled = min(record.quantity or 0, (record.filled or 0) + quantity)
+            self._index_add(record)
+        return record
+
+    def load(self, rows):
+        """Seed the ledger from TradeDB.get_open_orders() rows without re-persisting them"""
+        for row in rows:
+            if row.get('order_id'):
+                self.add(row['order_id'], row['symbol'], row['action'], row['price'], row['quantity'], persist=False)
+
+    def clear(self, symbol=None):
+        """Forget tracked orders (all, or one symbol's) without touching the database"""
+        with self._lock:
+            for order_id in [oid for oid, rec in self._records.items() if symbol is None or rec.symbol == symbol]:
+                self._discard(order_id)
+
+    def _discard(self, order_id):
+        record = self._records.pop(order_id, None)
+        if record is not None:
+            self._index_remove(record)
+
+    def _index_add(self, record):
+        self._index[(record.symbol, record.action, record.status)].add(record.order_id)
+        if record.status == OPEN_STATUS:
+            key = (record.symbol, record.action)
+            self._open_count[key] += 1
+            self._open_notional[key] += record.notional
+
+    def _index_remove(self, record):
+        bucket = self._index.get((record.symbol, record.action, record.status))
+        if bucket is not None:
+            bucket.discard(record.order_id)
+        if record.status == OPEN_STATUS:
+            key = (record.symbol, record.action)
+            self._open_count[key] -= 1
+            self._open_notional[key] -= record.notional
+            if self._open_count[key] <= 0:
+                # Reset to avoid float drift once nothing is open
+                self._open_count[key] = 0
+                self._open_notional[key] = 0.0
+
+    # --- Write-behind persistence --------------------------------------------
+
+    @contextmanager
+    def batch(self):
+        """
+        Group everything enqueued inside the block into a single database transaction.
+
+        The buffer is shared by the whole ledger, so the block must not span an await: other
+        tasks on the loop (fills, order status events, other grids) would join it and have their
+        writes held back until it closes.
+        """
+        with self._lock:
+            outer = self._pending is not None
+            if not outer:
+                self._pending = {'orders': [], 'trades': [], 'statuses': [], 'lots': []}
+        try:
+            yield self
+        finally:
+            if not outer:
+                with self._lock:
+                    pending, self._pending = self._pending, None
+                self._put(pending)
+
+    def enqueue(self, orders=(), trades=(), statuses=(), lots=()):
+        """Queue rows for TradeDB.record_batch on the writer thread"""
+        item = {'orders': list(orders), 'trades': list(trades), 'statuses': list(statuses), 'lots': list(lots)}
+        with self._lock:
+            if self._pending is not None:
+                for key, rows in item.items():
+                    self._pending[key].extend(rows)
+                return
+        self._put(item)
+
+    def _put(self, item):
+        if self.db is None or not any(item.values()):
+            return
+        self._ensure_writer()
+        self._queue.put(item)
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._writer_loop, name='order-ledger-writer', daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        last_checkpoint = time.monotonic()
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if items:
+                self._write(items)
+            if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                self._checkpoint()
+                last_checkpoint = time.monotonic()
+
+    def _write(self, items):
+        merged = {'orders': [], 'trades': [], 'statuses': [], 'lots': []}
+        for item in items:
+            for key, rows in item.items():
+                merged[key].extend(rows)
+        try:
+            self.db.record_batch(**merged)
+        except Exception as e:
+            logger.error(f"Order ledger write-behind failed, retrying next flush: {e}")
+            self._queue.put(merged)
+            time.sleep(self.flush_interval)
+        finally:
+            for _ in items:
+                self._queue.task_done()
+
+    def _checkpoint(self):
+        try:
+            self.db.checkpoint()
+        except Exception as e:
+            logger.warning(f"Order ledger checkpoint failed: {e}")
+
+    def pending_writes(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Block until every queued change has been written to the database"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Flush outstanding writes, checkpoint and stop the writer thread"""
+        if self._writer is None:
+            return
+        self.flush()
+        self._stop.set()
+        self._writer.join()
+        self._writer = None
+        if self.db is not None:
+            self._checkpoint()
@@ -0,0 +1,245 @@
+# grid-trading/pacing.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# Priority lanes: lower value is served first
+CANCEL = 0
+ORDER = 1
+DATA = 2
+LANE_NAMES = {CANCEL: 'cancel', ORDER: 'order', DATA: 'data'}
+
+# IB Gateway disconnects clients sending more than 50 messages per second; keep some headroom
+DEFAULT_MAX_RATE = 45.0
+# Historical data pacing: no more than 60 requests in any 10 minute window
+HISTORICAL_REQUESTS = 60
+HISTORICAL_WINDOW = 600.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        # Small tolerance so float rounding after a refill cannot leave us a hair short forever
+        return 0.0 if self.tokens >= 1 - 1e-9 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class SlidingWindow:
+    """At most `limit` events in any `window` seconds"""
+
+    def __init__(self, limit: int, window: float, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.events = deque()
+
+    def delay(self) -> float:
+        now = self.clock()
+        while self.events and now - self.events[0] >= self.window:
+            self.events.popleft()
+        return 0.0 if len(self.events) < self.limit else self.events[0] + self.window - now
+
+    def consume(self):
+        self.events.append(self.clock())
+
+
+class LaneStats:
+    __slots__ = ('requests', 'waiting', 'max_depth', 'throttled', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.requests = 0
+        self.waiting = 0
+        self.max_depth = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class Pacer:
+    """
+    Central outbound request scheduler for the IB API.
+
+    Every request takes a token from one message-rate bucket; when requests have to queue,
+    they are released strictly by lane priority (cancels, then orders, then data) and in
+    FIFO order within a lane. Historical data requests additionally respect IB's
+    60-per-10-minutes rule before joining the queue, so a throttled history request never
+    holds up orders or cancels.
+
+    Works from synchronous code (wait/call, sleeping through `sleep`, e.g. ib.sleep so
+    events keep flowing) and from coroutines (acquire/call_async).
+    """
+
+    def __init__(self, max_rate: float = DEFAULT_MAX_RATE, burst: float = None,
+                 historical_requests: int = HISTORICAL_REQUESTS, historical_window: float = HISTORICAL_WINDOW,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(max_rate, burst, clock)
+        self.historical = SlidingWindow(historical_requests, historical_window, clock)
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self._stats = {lane: LaneStats() for lane in LANE_NAMES}
+        self._historical_waits = 0
+
+    # --- Admission -----------------------------------------------------------
+
+    def _enter(self, lane):
+        ticket = (lane, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._heap, ticket)
+            stats = self._stats[lane]
+            stats.requests += 1
+            stats.waiting += 1
+            stats.max_depth = max(stats.max_depth, stats.waiting)
+        return ticket
+
+    def _try_take(self, ticket):
+        """Take a token for ticket if it is first in line; returns 0 on success, else seconds to wait"""
+        with self._lock:
+            delay = self.bucket.delay()
+            if self._heap[0] != ticket:
+                # Someone with higher priority (or earlier in our lane) goes first
+                return max(delay, 1.0 / self.bucket.rate)
+            if delay > 0:
+                return delay
+            heapq.heappop(self._heap)
+            self.bucket.consume()
+            return 0.0
+
+    def _leave(self, ticket, started, throttled):
+        waited = self.clock() - started
+        with self._lock:
+            stats = self._stats[ticket[0]]
+            stats.waiting -= 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            if throttled:
+                stats.throttled += 1
+
+    def _cancel(self, ticket):
+        with self._lock:
+            if ticket in self._heap:
+                self._heap.remove(ticket)
+                heapq.heapify(self._heap)
+
+    def _historical_delay(self):
+        with self._lock:
+            delay = self.historical.delay()
+            if delay <= 0:
+                self.historical.consume()
+            else:
+                self._historical_waits += 1
+            return delay
+
+    def wait(self, lane: int, historical: bool = False):
+        """Block until a request in `lane` may be sent"""
+        started = self.clock()
+        throttled = False
+        if historical:
+            while (delay := self._historical_delay()) > 0:
+                logger.warning(f"Historical data pacing: waiting {delay:.1f}s")
+                throttled = True
+                self.sleep(delay)
+        ticket = self._enter(lane)
+        try:
+            while (delay := self._try_take(ticket)) > 0:
+                throttled = True
+                self.sleep(delay)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        finally:
+            self._leave(ticket, started, throttled)
+
+    async def acquire(self, lane: int, historical: bool = False):
+        """Coroutine version of wait()"""
+        started = self.clock()
+        throttled = False
+        if historical:
+            while (delay := self._historical_delay()) > 0:
+                logger.warning(f"Historical data pacing: waiting {delay:.1f}s")
+                throttled = True
+                await asyncio.sleep(delay)
+        ticket = self._enter(lane)
+        try:
+            while (delay := self._try_take(ticket)) > 0:
+                throttled = True
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        finally:
+            self._leave(ticket, started, throttled)
+
+    def try_acquire(self, lane: int) -> bool:
+        """Take a token for `lane` only if one is free now and nothing is queued; never waits"""
+        with self._lock:
+            if self._heap or self.bucket.delay() > 0:
+                return False
+            self.bucket.consume()
+            self._stats[lane].requests += 1
+            return True
+
+    def call(self, lane: int, fn, *args, historical: bool = False, **kwargs):
+        """Send fn(*args, **kwargs) once the pacer allows it"""
+        self.wait(lane, historical)
+        return fn(*args, **kwargs)
+
+    async def call_async(self, lane: int, fn, *args, historical: bool = False, **kwargs):
+        """Await fn(*args, **kwargs) once the pacer allows it"""
+        await self.acquire(lane, historical)
+        return await fn(*args, **kwargs)
+
+    # --- Metrics -------------------------------------------------------------
+
+    def queue_depth(self, lane: int = None) -> int:
+        with self._lock:
+            if lane is None:
+                return len(self._heap)
+            return sum(1 for ticket in self._heap if ticket[0] == lane)
+
+    def get_stats(self) -> dict:
+        """Per-lane request counts, queue depth and wait times (seconds)"""
+        with self._lock:
+            lanes = {}
+            for lane, stats in self._stats.items():
+                lanes[LANE_NAMES[lane]] = {
+                    'requests': stats.requests,
+                    'queue_depth': stats.waiting,
+                    'max_queue_depth': stats.max_depth,
+                    'throttled': stats.throttled,
+                    'avg_wait': stats.total_wait / stats.requests if stats.requests else 0.0,
+                    'max_wait': stats.max_wait,
+                }
+            return {
+                'lanes': lanes,
+                'tokens': self.bucket.tokens,
+                'historical_in_window': len(self.historical.events),
+                'historical_waits': self._historical_waits,
+            }
@@ -0,0 +1,154 @@
+# grid-trading/position_book.py
+
+import logging
+import math
+import threading
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+def _number(value, default=0.0):
+    return default if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+class PositionEntry:
+    """Position in one contract for one account"""
+    __slots__ = ('account', 'con_id', 'symbol', 'position', 'avg_cost', 'market_price',
+                 'market_value', 'unrealized_pnl', 'realized_pnl')
+
+    def __init__(self, account, con_id, symbol):
+        self.account = account
+        self.con_id = con_id
+        self.symbol = symbol
+        self.position = 0
+        self.avg_cost = 0.0
+        self.market_price = None
+        self.market_value = None
+        self.unrealized_pnl = None
+        self.realized_pnl = None
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class PositionBook:
+    """
+    Positions keyed by (account, conId), kept current from ib_async's positionEvent and
+    updatePortfolioEvent.
+
+    A per-symbol summary (position, average cost, unrealized PnL summed over accounts) is
+    recomputed on each event, so lookups are dictionary reads. The positions table is only
+    written when a symbol's summary actually changes.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._entries = {}        # (account, conId) -> PositionEntry
+        self._by_symbol = {}      # symbol -> set of (account, conId)
+        self._summary = {}        # symbol -> (position, avg_cost, unrealized_pnl, market_value)
+        self._persisted = {}      # symbol -> summary last written to the DB
+        self._lock = threading.Lock()
+        self._ib = None
+
+    def attach(self, ib):
+        """Subscribe to position events (once) and seed from what ib_async already knows"""
+        if self._ib is not ib:
+            ib.positionEvent += self.on_position
+            ib.updatePortfolioEvent += self.on_portfolio
+            self._ib = ib
+        self.load(ib)
+
+    def load(self, ib):
+        for position in ib.positions():
+            self.on_position(position)
+        for item in ib.portfolio():
+            self.on_portfolio(item)
+
+    # --- Event handlers ------------------------------------------------------
+
+    def _entry(self, account, contract):
+        key = (account, contract.conId)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = PositionEntry(account, contract.conId, contract.symbol)
+            self._by_symbol.setdefault(contract.symbol, set()).add(key)
+        return entry
+
+    def on_position(self, position):
+        """Handler for positionEvent (Position: account, contract, position, avgCost)"""
+        with self._lock:
+            entry = self._entry(position.account, position.contract)
+            entry.position = position.position
+            entry.avg_cost = _number(position.avgCost)
+            symbol = entry.symbol
+            self._summarize(symbol)
+        self._persist(symbol)
+
+    def on_portfolio(self, item):
+        """Handler for updatePortfolioEvent (PortfolioItem with market value and PnL)"""
+        with self._lock:
+            entry = self._entry(item.account, item.contract)
+            entry.position = item.position
+            entry.avg_cost = _number(item.averageCost)
+            entry.market_price = _number(item.marketPrice, None)
+            entry.market_value = _number(item.marketValue, None)
+            entry.unrealized_pnl = _number(item.unrealizedPNL, None)
+            entry.realized_pnl = _number(item.realizedPNL, None)
+            symbol = entry.symbol
+            self._summarize(symbol)
+        self._persist(symbol)
+
+    def _summarize(self, symbol):
+        entries = [self._entries[key] for key in self._by_symbol.get(symbol, ())]
+        position = sum(entry.position for entry in entries)
+        cost = sum(entry.position * entry.avg_cost for entry in entries)
+        avg_cost = cost / position if position else 0.0
+        unrealized = [entry.unrealized_pnl for entry in entries if entry.unrealized_pnl is not None]
+        market_value = [entry.market_value for entry in entries if entry.market_value is not None]
+        self._summary[symbol] = (
+            position,
+            round(avg_cost, 4),
+            round(sum(unrealized), 2) if unrealized else None,
+            round(sum(market_value), 2) if market_value else None,
+        )
+
+    def _persist(self, symbol):
+        summary = self._summary.get(symbol)
+        if self.db is None or summary is None or self._persisted.get(symbol) == summary:
+            return
+        position, avg_cost, unrealized_pnl, market_value = summary
+        try:
+            self.db.update_position(symbol, position, avg_cost, unrealized_pnl, market_value)
+            self._persisted[symbol] = summary
+        except Exception as e:
+            logger.error(f"Failed to persist position for {symbol}: {e}")
+
+    # --- Lookups -------------------------------------------------------------
+
+    def position(self, symbol: str):
+        summary = self._summary.get(symbol)
+        return summary[0] if summary else 0
+
+    def has_position(self, symbol: str) -> bool:
+        return self.position(symbol) != 0
+
+    def avg_cost(self, symbol: str) -> float:
+        summary = self._summary.get(symbol)
+        return summary[1] if summary else 0.0
+
+    def unrealized_pnl(self, symbol: str):
+        summary = self._summary.get(symbol)
+        return summary[2] if summary else None
+
+    def get(self, symbol: str, account: str = None):
+        """Per-account entries for a symbol (all accounts unless one is given)"""
+        with self._lock:
+            return [self._entries[key].to_dict() for key in self._by_symbol.get(symbol, ())
+                    if account is None or key[0] == account]
+
+    def symbols(self):
+        return [symbol for symbol, summary in self._summary.items() if summary[0] != 0]
+
+    def persist(self, symbol: str):
+        """Write the symbol's summary if it changed since the last write"""
+        self._persist(symbol)
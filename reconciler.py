@@ -0,0 +1,159 @@
+# grid-trading/reconciler.py
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# IBKR statuses after which an order is no longer working
+TERMINAL_STATUSES = {'Filled': 'Filled', 'Cancelled': 'Cancelled', 'ApiCancelled': 'Cancelled',
+                     'Inactive': 'Inactive'}
+
+
+def order_info(trade):
+    """Fields the ledger tracks for an IBKR trade, or None if the trade is not a usable order"""
+    order = getattr(trade, 'order', None)
+    contract = getattr(trade, 'contract', None)
+    if order is None or contract is None:
+        return None
+    order_id = getattr(order, 'orderId', 0)
+    symbol = getattr(contract, 'symbol', None)
+    action = getattr(order, 'action', None)
+    quantity = getattr(order, 'totalQuantity', 0)
+    if not isinstance(order_id, int) or order_id <= 0 or not symbol or action not in ('BUY', 'SELL'):
+        return None
+    if not isinstance(quantity, (int, float)) or quantity <= 0:
+        return None
+    price = getattr(order, 'lmtPrice', None)
+    if not isinstance(price, (int, float)) or price < 0 or price >= 1e300:
+        price = None  # Market orders carry UNSET_DOUBLE
+    return {
+        'order_id': order_id,
+        'symbol': symbol,
+        'action': action,
+        'quantity': quantity,
+        'price': price,
+        'parent_id': getattr(order, 'parentId', 0) or None,
+    }
+
+
+class OrderReconciler:
+    """
+    Keeps the OrderLedger in step with IBKR from order events instead of full re-syncs.
+
+    openOrderEvent/orderStatusEvent mark order ids dirty and bump a version counter;
+    reconcile() diffs only the dirty orders against the ledger and applies the added,
+    changed and removed sets in one ledger batch. A full reqAllOpenOrders snapshot is only
+    diffed after a reconnect (mark_stale) or when the periodic integrity check is due.
+    """
+
+    def __init__(self, ledger, symbols=None, integrity_interval: float = 300.0, clock=time.monotonic):
+        self.ledger = ledger
+        self.symbols = set(symbols) if symbols is not None else None
+        self.integrity_interval = integrity_interval
+        self.clock = clock
+        self.version = 0
+        self.applied_version = 0
+        self._dirty = {}  # order_id -> latest Trade seen for it
+        self._lock = threading.Lock()
+        self._last_snapshot = None  # None forces a snapshot on first reconcile
+
+    def _tracked(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+    # --- Event feed ----------------------------------------------------------
+
+    def on_trade(self, trade):
+        """Handler for openOrderEvent and orderStatusEvent"""
+        info = order_info(trade)
+        if info is None or not self._tracked(info['symbol']):
+            return
+        with self._lock:
+            self._dirty[info['order_id']] = trade
+            self.version += 1
+
+    def mark_stale(self):
+        """Force the next reconcile to diff a full snapshot (e.g. after a reconnect)"""
+        self._last_snapshot = None
+
+    def snapshot_due(self) -> bool:
+        return self._last_snapshot is None or self.clock() - self._last_snapshot >= self.integrity_interval
+
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    # --- Diffing -------------------------------------------------------------
+
+    def _diff_one(self, info, trade, status, diff):
+        order_id = info['order_id']
+        record = self.ledger.get(order_id)
+        terminal = TERMINAL_STATUSES.get(status)
+        if terminal is not None:
+            if record is not None:
+                diff['removed'].append((order_id, terminal))
+        elif record is None:
+            diff['added'].append((info, trade))
+        elif (record.price, record.quantity, record.action, record.parent_id) != \
+                (info['price'], info['quantity'], info['action'], info['parent_id'] or record.parent_id):
+            diff['changed'].append((info, trade))
+        elif record.trade is None:
+            record.trade = trade  # Loaded from the DB; attach the live trade without a write
+
+    def _apply(self, diff):
+        with self.ledger.batch():
+            for info, trade in diff['added'] + diff['changed']:
+                previous = self.ledger.get(info['order_id'])
+                parent_id = info['parent_id'] or (previous.parent_id if previous else None)
+                order_type = previous.order_type if previous else ('bracket_child' if parent_id else None)
+                self.ledger.add(info['order_id'], info['symbol'], info['action'], info['price'], info['quantity'],
+                                trade=trade, order_type=order_type, parent_id=parent_id)
+            for order_id, status in diff['removed']:
+                self.ledger.set_status(order_id, status)
+
+    def reconcile(self, snapshot=None) -> dict:
+        """
+        Apply pending order changes to the ledger.
+
+        Args:
+            snapshot: Optional callable returning every open IBKR trade (reqAllOpenOrders);
+                      only called when a full integrity check is due
+
+        Returns:
+            Dict with added/changed/removed counts, whether a full snapshot was used, and the version applied
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            version = self.version
+        diff = {'added': [], 'changed': [], 'removed': []}
+        full = snapshot is not None and self.snapshot_due()
+
+        if full:
+            trades = snapshot()
+            seen = set()
+            for trade in trades:
+                info = order_info(trade)
+                if info is None or not self._tracked(info['symbol']):
+                    continue
+                seen.add(info['order_id'])
+                status = getattr(getattr(trade, 'orderStatus', None), 'status', '')
+                self._diff_one(info, trade, status, diff)
+            # Tracked orders IBKR no longer reports as open went away while we were not listening
+            for record in self.ledger:
+                if record.order_id not in seen and record.order_id not in dirty and self._tracked(record.symbol):
+                    # Fully filled per backfilled executions; otherwise it was cancelled
+                    diff['removed'].append((record.order_id, 'Filled' if record.remaining <= 0 else 'Cancelled'))
+            self._last_snapshot = self.clock()
+
+        for order_id, trade in dirty.items():
+            info = order_info(trade)
+            if full and order_id in seen:
+                continue
+            self._diff_one(info, trade, trade.orderStatus.status, diff)
+
+        if any(diff.values()):
+            self._apply(diff)
+        self.applied_version = version
+        result = {key: len(rows) for key, rows in diff.items()}
+        result.update(full=full, version=version)
+        return result
@@ -0,0 +1,129 @@
+# grid-trading/retention.py
+
+import logging
+import os
+import time
+from datetime import datetime
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+# ib_async's DoneStates: the order can no longer change
+DONE_STATUSES = ('Filled', 'Cancelled', 'ApiCancelled')
+
+
+def _timestamp(value):
+    """Epoch seconds for a datetime or ISO string, None if unknown"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value.timestamp()
+
+
+def resident_memory():
+    """Resident set size in bytes from /proc/self/statm, or None where it is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RetentionManager:
+    """
+    Bounds what a multi-week session keeps in memory.
+
+    ib_async holds every Trade (with an ever-growing log) and every Fill for the life of the
+    connection. Once an order is done, no longer in our ledger and older than the retention
+    window, its Trade is dropped from ib_async's wrapper; fills are dropped once the
+    execution cursor shows they were persisted. Live trades keep only their latest log entries.
+    """
+
+    def __init__(self, ib, ledger, db=None, keep_seconds: float = 3600.0, max_log_entries: int = 20,
+                 interval: float = 300.0, clock=time.time):
+        self.ib = ib
+        self.ledger = ledger
+        self.db = db
+        self.keep_seconds = keep_seconds
+        self.max_log_entries = max_log_entries
+        self.interval = interval
+        self.clock = clock
+        self._last_prune = None
+        self.pruned_trades = 0
+        self.pruned_fills = 0
+        self.trimmed_log_entries = 0
+
+    def _finished_at(self, trade):
+        return _timestamp(trade.log[-1].time) if trade.log else None
+
+    def _prune_trades(self, cutoff) -> int:
+        wrapper = self.ib.wrapper
+        pruned = 0
+        for key, trade in list(wrapper.trades.items()):
+            if trade.orderStatus.status not in DONE_STATUSES or trade.order.orderId in self.ledger:
+                if len(trade.log) > self.max_log_entries:
+                    self.trimmed_log_entries += len(trade.log) - self.max_log_entries
+                    del trade.log[:-self.max_log_entries]
+                continue
+            finished_at = self._finished_at(trade)
+            if finished_at is None or finished_at > cutoff:
+                continue
+            del wrapper.trades[key]
+            perm_id = trade.order.permId
+            if wrapper.permId2Trade.get(perm_id) is trade:
+                del wrapper.permId2Trade[perm_id]
+            pruned += 1
+        return pruned
+
+    def _prune_fills(self, cutoff) -> int:
+        cursor = self.db.get_exec_cursor() if self.db is not None else None
+        persisted_until = _timestamp(cursor[0]) if cursor else None
+        if persisted_until is None:
+            return 0  # Nothing known to be persisted yet
+        cutoff = min(cutoff, persisted_until)
+        fills = self.ib.wrapper.fills
+        stale = []
+        for exec_id, fill in fills.items():
+            filled_at = _timestamp(fill.time)
+            if filled_at is not None and filled_at <= cutoff:
+                stale.append(exec_id)
+        for exec_id in stale:
+            del fills[exec_id]
+        return len(stale)
+
+    def prune(self) -> dict:
+        """Drop finished trades and persisted fills older than the retention window"""
+        cutoff = self.clock() - self.keep_seconds
+        trades = self._prune_trades(cutoff)
+        fills = self._prune_fills(cutoff)
+        self.pruned_trades += trades
+        self.pruned_fills += fills
+        self._last_prune = self.clock()
+        if trades or fills:
+            logger.info(f"Retention: pruned {trades} finished trades and {fills} fills")
+        return {'trades': trades, 'fills': fills}
+
+    def maybe_prune(self):
+        """prune() at most once per interval; cheap to call from the trading loop"""
+        if self._last_prune is None or self.clock() - self._last_prune >= self.interval:
+            return self.prune()
+        return None
+
+    def get_stats(self) -> dict:
+        wrapper = self.ib.wrapper
+        trades = list(wrapper.trades.values())
+        return {
+            'rss_bytes': resident_memory(),
+            'trades': len(trades),
+            'done_trades': sum(1 for trade in trades if trade.orderStatus.status in DONE_STATUSES),
+            'trade_log_entries': sum(len(trade.log) for trade in trades),
+            'fills': len(wrapper.fills),
+            'perm_ids': len(wrapper.permId2Trade),
+            'ledger_orders': len(self.ledger),
+            'pruned_trades': self.pruned_trades,
+            'pruned_fills': self.pruned_fills,
+            'trimmed_log_entries': self.trimmed_log_entries,
+        }
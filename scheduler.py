@@ -0,0 +1,123 @@
+# grid-trading/scheduler.py
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+
+from utils import next_session_change
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+def eastern_now():
+    import pytz
+    return datetime.now(pytz.timezone("US/Eastern"))
+
+
+class StrategyScheduler:
+    """
+    Wakes strategy handlers on events instead of fixed sleeps.
+
+    Triggers mark a key (a grid's symbol) due with a reason: a price tick moving past the
+    key's threshold, a fill, a session transition or a timer. Everything triggered within
+    the debounce window is coalesced into one batch. next_batch() just waits on an event,
+    so nothing runs while nothing happens.
+    """
+
+    def __init__(self, debounce: float = 0.25, now=eastern_now):
+        self.debounce = debounce
+        self.now = now
+        self._due = {}          # key -> set of reasons
+        self._ready = asyncio.Event()
+        self._flush = None      # Pending debounce handle
+        self._timers = {}       # key -> TimerHandle
+        self._anchors = {}      # key -> (reference price, relative threshold)
+        self._session_timer = None
+        self.batches = 0
+        self.triggers = Counter()
+
+    # --- Triggers ------------------------------------------------------------
+
+    def trigger(self, key, reason: str):
+        """Mark key due; the batch is released once the debounce window has passed"""
+        self._due.setdefault(key, set()).add(reason)
+        self.triggers[reason] += 1
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().call_later(self.debounce, self._release)
+
+    def trigger_all(self, keys, reason: str):
+        for key in keys:
+            self.trigger(key, reason)
+
+    def _release(self):
+        self._flush = None
+        self._ready.set()
+
+    def after(self, key, delay: float, reason: str = 'timer'):
+        """(Re)arm key's timer; an earlier timer for the same key is replaced"""
+        self.cancel_timer(key)
+        self._timers[key] = asyncio.get_running_loop().call_later(max(0.0, delay), self._on_timer, key, reason)
+
+    def cancel_timer(self, key):
+        handle = self._timers.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+
+    def _on_timer(self, key, reason):
+        self._timers.pop(key, None)
+        self.trigger(key, reason)
+
+    def anchor(self, key, price, threshold: float):
+        """Trigger key once price moves more than threshold (a fraction) away from this price"""
+        if price and threshold:
+            self._anchors[key] = (price, threshold)
+
+    def on_price(self, key, price):
+        """Feed a tick; fires the key's price trigger (once per anchor) when it crosses the threshold"""
+        anchor = self._anchors.get(key)
+        if anchor is None or not price:
+            return
+        reference, threshold = anchor
+        if abs(price - reference) / reference >= threshold:
+            del self._anchors[key]
+            self.trigger(key, 'price')
+
+    def watch_sessions(self, keys):
+        """Trigger every key returned by keys() at each trading-session transition"""
+        change = next_session_change(self.now())
+        if change is None:
+            return
+        delay = (change - self.now()).total_seconds()
+
+        def on_change():
+            logger.info(f"Trading session changed at {change:%H:%M} ET")
+            self.trigger_all(keys(), 'session')
+            self.watch_sessions(keys)
+        self._session_timer = asyncio.get_running_loop().call_later(max(0.0, delay) + 1.0, on_change)  # Land just past the boundary
+
+    # --- Consumer ------------------------------------------------------------
+
+    async def next_batch(self) -> dict:
+        """Wait until something is due; returns {key: reasons} for everything coalesced since the last batch"""
+        await self._ready.wait()
+        self._ready.clear()
+        batch, self._due = self._due, {}
+        self.batches += 1
+        return batch
+
+    def close(self):
+        for handle in [self._flush, self._session_timer, *self._timers.values()]:
+            if handle is not None:
+                handle.cancel()
+        self._flush = None
+        self._session_timer = None
+        self._timers.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'triggers': dict(self.triggers),
+            'timers': len(self._timers),
+            'anchors': len(self._anchors),
+        }
@@ -0,0 +1,260 @@
+# grid-trading/settings.py
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field, fields
+from typing import Optional
+
+import yaml
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+CONFIG_FILE = 'config.yaml'
+DEFAULT_SOCKET_PATH = 'grid_broker.sock'  # Unix socket of the broker service
+
+# Changes to these only take effect when the process (and its IBKR connection) is restarted
+RESTART_KEYS = frozenset({'tws_port', 'client_id', 'paper_trading', 'broker_socket',
+                          'api_max_messages_per_second', 'contract_cache_path'})
+
+_MISSING = object()
+
+# YAML parses unquoted yes/no as booleans; quoted or env-substituted values arrive as strings
+_BOOL_STRINGS = {'true': True, 'yes': True, 'on': True, '1': True,
+                 'false': False, 'no': False, 'off': False, '0': False}
+
+
+def _check(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+@dataclass(frozen=True)
+class GridSettings:
+    """Settings of one grid; anything not set on a `grids:` entry comes from the top-level config"""
+    symbol: str
+    strategy_budget: float = 50000.0
+    base_lot: int = 30
+    crash_pct: float = 0.87
+    range_fraction: float = 0.565
+    profit_pct: float = 0.015
+    fallback_price: float = 83.00
+    num_levels: int = 5
+    min_available_cash: float = 2000.0
+    recenter_after_intervals: float = 2.0
+    price_trigger_pct: float = 0.0025
+
+    def __post_init__(self):
+        # YAML gives ints for round numbers and strings for quoted ones; store the declared types
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if f.type is bool and not isinstance(value, bool):
+                coerced = _BOOL_STRINGS.get(str(value).strip().lower())
+                _check(coerced is not None, f"{f.name} must be true or false, got {value!r}")
+                object.__setattr__(self, f.name, coerced)
+            elif f.type in (int, float) and not isinstance(value, bool):
+                try:
+                    coerced = f.type(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{f.name} must be a number, got {value!r}") from None
+                _check(f.type is float or coerced == float(value), f"{f.name} must be a whole number, got {value!r}")
+                object.__setattr__(self, f.name, coerced)
+        self.validate()
+
+    def validate(self):
+        _check(self.symbol, "symbol is required")
+        _check(self.strategy_budget > 0, f"strategy_budget must be positive, got {self.strategy_budget}")
+        _check(self.base_lot >= 1, f"base_lot must be at least 1, got {self.base_lot}")
+        _check(0 < self.crash_pct < 1, f"crash_pct must be between 0 and 1, got {self.crash_pct}")
+        _check(0 < self.range_fraction < 1, f"range_fraction must be between 0 and 1, got {self.range_fraction}")
+        _check(0 < self.profit_pct < 1, f"profit_pct must be between 0 and 1, got {self.profit_pct}")
+        _check(self.fallback_price > 0, f"fallback_price must be positive, got {self.fallback_price}")
+        _check(self.num_levels >= 1, f"num_levels must be at least 1, got {self.num_levels}")
+        _check(self.min_available_cash >= 0, f"min_available_cash must not be negative, got {self.min_available_cash}")
+        _check(self.recenter_after_intervals > 0, f"recenter_after_intervals must be positive, got {self.recenter_after_intervals}")
+        _check(self.price_trigger_pct >= 0, f"price_trigger_pct must not be negative, got {self.price_trigger_pct}")
+
+
+GRID_FIELDS = tuple(f.name for f in fields(GridSettings) if f.name != 'symbol')
+
+
+@dataclass(frozen=True)
+class Settings(GridSettings):
+    """
+    Typed, validated view of config.yaml, shared by reference by every component.
+
+    The top-level grid settings double as the defaults of each entry in `grids`, which are
+    resolved into GridSettings once at load time. Keys this class does not declare are kept
+    in `extra`. get() and [] keep dict-style callers working.
+    """
+    tws_port: int = 4002
+    client_id: int = 1
+    paper_trading: bool = True
+    grids: tuple = ()
+    quote_stale_seconds: float = 60.0
+    api_max_messages_per_second: float = 45.0
+    order_integrity_check_seconds: float = 300.0
+    reconnect_max_delay_seconds: float = 60.0
+    broker_socket: str = DEFAULT_SOCKET_PATH
+    trade_retention_seconds: float = 3600.0
+    market_data_lines: int = 100
+    near_touch_pct: float = 0.02
+    snapshot_interval_seconds: float = 30.0
+    strategy_debounce_seconds: float = 0.25
+    contract_cache_path: str = 'contract_cache.json'
+    contract_cache_ttl_hours: float = 24.0
+    config_poll_seconds: float = 5.0
+    extra: dict = field(default_factory=dict, compare=False)
+
+    def validate(self):
+        super().validate()
+        _check(self.api_max_messages_per_second > 0, "api_max_messages_per_second must be positive")
+        _check(self.market_data_lines >= 1, f"market_data_lines must be at least 1, got {self.market_data_lines}")
+        _check(self.strategy_debounce_seconds >= 0, "strategy_debounce_seconds must not be negative")
+        _check(self.config_poll_seconds > 0, "config_poll_seconds must be positive")
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> 'Settings':
+        """Validate a parsed config.yaml; raises ValueError describing the first problem found"""
+        _check(isinstance(raw, dict), "config must be a mapping")
+        _check(raw.get('symbol'), "symbol is required")
+        names = {f.name for f in fields(cls)} - {'grids', 'extra'}
+        known = {key: value for key, value in raw.items() if key in names}
+        extra = {key: value for key, value in raw.items() if key not in names and key != 'grids'}
+        for key in extra:
+            logger.warning(f"Unknown config key '{key}' (kept, but not used by the grid settings)")
+
+        defaults = {key: known[key] for key in GRID_FIELDS if key in known}
+        grids = []
+        for entry in raw.get('grids') or [{'symbol': raw['symbol']}]:
+            _check(isinstance(entry, dict) and entry.get('symbol'), f"Every grid needs a symbol, got {entry!r}")
+            unknown = set(entry) - set(GRID_FIELDS) - {'symbol'}
+            _check(not unknown, f"Unknown setting(s) for grid {entry['symbol']}: {', '.join(sorted(unknown))}")
+            _check(entry['symbol'] not in {grid.symbol for grid in grids}, f"Duplicate grid for {entry['symbol']}")
+            grids.append(GridSettings(**{**defaults, **entry}))
+        return cls(**known, grids=tuple(grids), extra=extra)
+
+    def grid(self, symbol: str) -> Optional[GridSettings]:
+        return next((grid for grid in self.grids if grid.symbol == symbol), None)
+
+    def get(self, key, default=None):
+        if key in self.__dataclass_fields__ and key != 'extra':
+            return getattr(self, key)
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+
+def load_grid_configs(config) -> tuple:
+    """GridSettings for every grid in a Settings object or a raw config dict"""
+    if isinstance(config, Settings):
+        return config.grids
+    return Settings.from_dict(config).grids
+
+
+# path -> (mtime_ns, Settings); the file is parsed once per change and the result shared
+_loaded = {}
+
+
+def load_settings(path: str = CONFIG_FILE) -> Settings:
+    """Settings for a config file, re-parsed only when the file changed since the last call"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _loaded.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r') as f:
+        raw = yaml.safe_load(f)
+    settings = Settings.from_dict(raw or {})
+    _loaded[path] = (mtime, settings)
+    return settings
+
+
+def diff_settings(old: Settings, new: Settings) -> dict:
+    """
+    What changed between two Settings.
+
+    Returns:
+        Dict with 'settings' (changed top-level keys), 'grids' ({symbol: changed keys} for grids
+        in both), 'added' and 'removed' (grid symbols)
+    """
+    changed = {f.name for f in fields(Settings)
+               if f.name not in ('grids', 'extra') and getattr(old, f.name) != getattr(new, f.name)}
+    old_grids = {grid.symbol: grid for grid in old.grids}
+    new_grids = {grid.symbol: grid for grid in new.grids}
+    grids = {}
+    for symbol in old_grids.keys() & new_grids.keys():
+        keys = {key for key in GRID_FIELDS if getattr(old_grids[symbol], key) != getattr(new_grids[symbol], key)}
+        if keys:
+            grids[symbol] = keys
+    return {
+        'settings': changed,
+        'grids': grids,
+        'added': [symbol for symbol in new_grids if symbol not in old_grids],
+        'removed': [symbol for symbol in old_grids if symbol not in new_grids],
+    }
+
+
+class ConfigWatcher:
+    """
+    Polls config.yaml's mtime and stages validated changes.
+
+    A change is parsed and validated as soon as it is seen, but only handed over by take(),
+    which the strategy loop calls between batches so a reload never lands mid-step. Edits
+    that fail validation are logged and ignored; the running settings stay in force.
+    """
+
+    def __init__(self, path: str = CONFIG_FILE, settings: Optional[Settings] = None, interval: float = None):
+        self.path = path
+        self.settings = settings if settings is not None else load_settings(path)
+        self.interval = interval if interval is not None else self.settings.config_poll_seconds
+        self.pending = None
+        self.reloads = 0
+        self.rejected = 0
+        self._rejected_mtime = None
+
+    def check(self) -> bool:
+        """Stage the file's settings if it changed; True if a reload is pending"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.path}, keeping the running settings: {e}")
+            return self.pending is not None
+        if mtime == self._rejected_mtime:
+            return self.pending is not None  # Already reported; wait for the next edit
+        try:
+            settings = load_settings(self.path)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            self.rejected += 1
+            self._rejected_mtime = mtime
+            logger.error(f"Config reload rejected, keeping the running settings: {e}")
+            return self.pending is not None
+        if settings is not self.settings and settings is not self.pending:
+            self.pending = settings
+            logger.info(f"Config change detected in {self.path}; applying at the next safe point")
+        return self.pending is not None
+
+    def take(self):
+        """(settings, diff) for a staged change, making it current; (None, None) if nothing is pending"""
+        settings, self.pending = self.pending, None
+        if settings is None:
+            return None, None
+        changes = diff_settings(self.settings, settings)
+        self.settings = settings
+        if 'config_poll_seconds' in changes['settings']:
+            self.interval = settings.config_poll_seconds
+        self.reloads += 1
+        return settings, changes
+
+    async def watch(self, on_change):
+        """Poll forever, calling on_change() whenever a reload becomes pending"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.check():
+                on_change()
+
+    def get_stats(self) -> dict:
+        return {'reloads': self.reloads, 'rejected': self.rejected, 'pending': self.pending is not None}
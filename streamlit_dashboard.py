@@ -4,8 +4,8 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import os
-import yaml
-from ibkr import IBKRClient
+from broker_client import BrokerClient, BrokerError
+from settings import load_settings
 from utils import calculate_lot_size_and_interval
 from database import TradeDB
 
@@ -14,10 +14,9 @@ DB_PATH = 'trade_logs.db'
 st.set_page_config(layout="wide")
 st.title("📈 Grid Trading Dashboard")
 
-# Load config to get symbol
-with open('config.yaml', 'r') as f:
-    config = yaml.safe_load(f)
-symbol = config['symbol']
+# Load config to get symbol (re-parsed only when config.yaml changes between reruns)
+config = load_settings()
+symbol = config.symbol
 
 db = TradeDB('trade_logs.db')
 
@@ -45,56 +44,42 @@ for pos in all_positions:
 st.dataframe(all_positions)
 
 def load_config():
-    """Load configuration from YAML file"""
+    """Shared, validated settings from config.yaml"""
     try:
-        with open('config.yaml', 'r') as f:
-            return yaml.safe_load(f)
+        return load_settings()
     except Exception as e:
         st.error(f"Failed to load config: {e}")
         return None
 
+@st.cache_resource
+def get_broker(path):
+    """One broker service connection per dashboard process, shared by all sessions (no IBKR session of its own)"""
+    return BrokerClient(path)
+
 def get_account_info():
-    """Get account information from IBKR"""
+    """Get account information from the broker service"""
     config = load_config()
     if not config:
         return None, None, None, None
     
+    broker = get_broker(config.broker_socket)
     try:
-        # Use a different client ID for the dashboard to avoid conflicts
-        dashboard_client_id = config['client_id'] + 1  # Use next available client ID
-        
-        ibkr = IBKRClient(
-            paper=config.get('paper_trading', True),
-            client_id=dashboard_client_id,  # Use different client ID
-            port=config['tws_port']
-        )
-        
-        if ibkr.connect():
-            ibkr.sleep(5)
-            # Get account summary
-            summary = ibkr.get_account_summary()
-            
-            # Extract cash information
-            total_cash = 0
-            available_funds = 0
-            
-            for item in summary:
-                if item.tag == 'CashBalance' and item.currency == 'USD':
-                    total_cash = float(item.value)
-                elif item.tag == 'AvailableFunds' and item.currency == 'USD':
-                    available_funds = float(item.value)
-                elif item.tag == 'CashBalance' and item.currency == 'BASE':
-                    total_cash_base = float(item.value)
-                elif item.tag == 'AvailableFunds' and item.currency == 'BASE':
-                    available_funds_base = float(item.value)
-            
-            ibkr.disconnect()
-            return total_cash, available_funds, config, ibkr
-        else:
-            return None, None, config, None
-    except Exception as e:
-        st.error(f"Failed to connect to IBKR: {e}")
+        summary = broker.account_summary()
+    except BrokerError as e:
+        st.warning(f"Broker service unavailable ({e}). Start the trading bot for live account data.")
         return None, None, config, None
+    
+    # Extract cash information
+    total_cash = 0
+    available_funds = 0
+    
+    for item in summary:
+        if item['tag'] == 'CashBalance' and item['currency'] == 'USD':
+            total_cash = float(item['value'])
+        elif item['tag'] == 'AvailableFunds' and item['currency'] == 'USD':
+            available_funds = float(item['value'])
+    
+    return total_cash, available_funds, config, broker
 
 def create_tables_if_not_exist(conn):
     """Create database tables if they don't exist"""
@@ -162,7 +147,7 @@ def load_data():
 trades, orders, pnl = load_data()
 
 # Get account information
-total_cash, available_funds, config, ibkr = get_account_info()
+total_cash, available_funds, config, broker = get_account_info()
 
 # Display account information
 st.markdown("---")
@@ -184,7 +169,7 @@ with col2:
 
 with col3:
     if config:
-        strategy_budget = config.get('strategy_budget', 0)
+        strategy_budget = config.strategy_budget
         st.metric("Strategy Budget", f"${strategy_budget:,.2f}")
     else:
         st.metric("Strategy Budget", "N/A")
@@ -203,11 +188,10 @@ with col4:
         st.metric("Available for Strategy", "N/A")
 
 # Display current market information if available
-if config and ibkr:
+if config and broker:
     try:
-        symbol = config['symbol']
-        contract = ibkr.get_stock_contract(symbol)
-        current_price = ibkr.get_market_price(contract)
+        symbol = config.symbol
+        current_price = broker.quote(symbol)
         
         st.markdown("---")
         st.subheader("📊 Market Information")
@@ -229,8 +213,8 @@ if config and ibkr:
                 lot_size, interval = calculate_lot_size_and_interval(
                     available_cash, 
                     current_price,
-                    crash_pct=config['crash_pct'],
-                    range_fraction=config['range_fraction']
+                    crash_pct=config.crash_pct,
+                    range_fraction=config.range_fraction
                 )
                 st.metric("Calculated Lot Size", f"{lot_size} shares")
         
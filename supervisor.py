@@ -0,0 +1,125 @@
+# grid-trading/supervisor.py
+
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger()  # Use the root logger for all logging in this module
+
+
+class ConnectionSupervisor:
+    """
+    Watches an AsyncIBKRClient's connection and brings it back after a gateway drop.
+
+    On disconnectedEvent it reconnects with jittered exponential backoff, then calls
+    client.resume() so market data, orders, executions and positions are reconciled once
+    instead of the bot cold-starting. Downtime and time-to-recover are kept for reporting.
+    """
+
+    def __init__(self, client, base_delay: float = 1.0, max_delay: float = 60.0, jitter: float = 0.5,
+                 host: str = '127.0.0.1', timeout: float = 20.0):
+        self.client = client
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.host = host
+        self.timeout = timeout
+        self._task = None
+        self._started = False
+        self._stopped = False
+        self._down_since = None
+        self._connected = asyncio.Event()
+        self._connected.set()
+        # Metrics
+        self.disconnects = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.total_downtime = 0.0
+        self.last_downtime = None
+        self.last_time_to_recover = None
+
+    def start(self):
+        if not self._started:
+            self.client.ib.disconnectedEvent += self._on_disconnected
+            self._started = True
+        self._stopped = False
+
+    def stop(self):
+        """Stop supervising (call before an intentional disconnect)"""
+        self._stopped = True
+        if self._started:
+            self.client.ib.disconnectedEvent -= self._on_disconnected
+            self._started = False
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    @property
+    def is_down(self) -> bool:
+        return self._down_since is not None
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff capped at max_delay, with +/- jitter to avoid reconnect stampedes"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _on_disconnected(self):
+        if self._stopped or self.is_down:
+            return
+        self.disconnects += 1
+        self._down_since = time.monotonic()
+        self._connected.clear()
+        self.client.connected = False
+        logger.warning("Lost connection to IBKR Gateway; reconnecting")
+        self._task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        attempt = 0
+        while not self._stopped:
+            delay = self.backoff(attempt)
+            logger.info(f"Reconnect attempt {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            try:
+                await self.client.ib.connectAsync(self.host, self.client.port, clientId=self.client.client_id,
+                                                  timeout=self.timeout)
+            except Exception as e:
+                self.failed_attempts += 1
+                attempt += 1
+                logger.warning(f"Reconnect attempt {attempt} failed: {e}")
+                continue
+            reconnected_at = time.monotonic()
+            try:
+                await self.client.resume()
+            except Exception as e:
+                logger.error(f"State resume after reconnect failed: {e}")
+            recovered_at = time.monotonic()
+            self.reconnects += 1
+            self.last_downtime = reconnected_at - self._down_since
+            self.last_time_to_recover = recovered_at - self._down_since
+            self.total_downtime += self.last_downtime
+            self._down_since = None
+            self._connected.set()
+            logger.info(f"Reconnected to IBKR Gateway after {self.last_downtime:.1f}s down, "
+                        f"recovered in {self.last_time_to_recover:.1f}s")
+            return
+
+    async def wait_connected(self, timeout: float = None) -> bool:
+        """Wait until the connection is up again; True if it is"""
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def get_stats(self) -> dict:
+        current = time.monotonic() - self._down_since if self.is_down else 0.0
+        return {
+            'connected': not self.is_down,
+            'disconnects': self.disconnects,
+            'reconnects': self.reconnects,
+            'failed_attempts': self.failed_attempts,
+            'current_downtime': current,
+            'total_downtime': self.total_downtime + current,
+            'last_downtime': self.last_downtime,
+            'last_time_to_recover': self.last_time_to_recover,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from broker_client import BrokerClient, BrokerError, BrokerUnavailable
+from broker_service import BrokerService
+from order_ledger import OrderLedger
+
+
+class FakeMarketData:
+    def __init__(self, prices):
+        self.prices = prices
+
+    def latest_price(self, symbol):
+        return self.prices.get(symbol)
+
+    def age(self, symbol):
+        return 0.5
+
+
+class FakePositions:
+    def symbols(self):
+        return ['TQQQ']
+
+    def get(self, symbol):
+        return [{'account': 'DU1', 'symbol': symbol, 'position': 30, 'avg_cost': 80.0}]
+
+
+class FakeClient:
+    connected = True
+
+    def __init__(self):
+        self.ledger = OrderLedger()
+        self.market_data = FakeMarketData({'TQQQ': 84.5})
+        self.positions = FakePositions()
+        self.summary_calls = 0
+        self.cancelled = []
+
+    async def get_stock_contract(self, symbol):
+        return SimpleNamespace(symbol=symbol) if symbol != 'BOGUS' else None
+
+    async def get_market_price(self, contract):
+        return 12.0
+
+    async def get_account_summary(self):
+        self.summary_calls += 1
+        return [SimpleNamespace(account='DU1', tag='AvailableFunds', value='1000', currency='USD')]
+
+    async def cancel_order(self, order_id):
+        self.cancelled.append(order_id)
+        self.ledger.set_status(order_id, 'Cancelled')
+
+
+def serve(service, calls):
+    """Run the service on a temp socket and make blocking client calls from a worker thread"""
+    async def run():
+        await service.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, calls)
+        finally:
+            service.close()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'broker.sock')
+
+
+def test_reads_are_served_from_memory_and_cached(socket_path):
+    """Quotes, positions and orders come from in-memory state; the account summary is fetched once per TTL"""
+    client = FakeClient()
+    client.ledger.add(1, 'TQQQ', 'BUY', 80.0, 30, trade=object())
+    service = BrokerService(client, path=socket_path)
+
+    def calls():
+        with BrokerClient(socket_path) as broker:
+            return (broker.quote('TQQQ'), broker.quote('SQQQ'), broker.position('TQQQ'),
+                    broker.orders('TQQQ', 'BUY'), broker.account_summary(), broker.account_summary())
+
+    quote, fallback, position, orders, summary, _ = serve(service, calls)
+    assert quote == 84.5
+    assert fallback == 12.0
+    assert position == 30
+    assert [order['order_id'] for order in orders] == [1]
+    assert 'trade' not in orders[0]
+    assert summary[0]['tag'] == 'AvailableFunds'
+    assert client.summary_calls == 1
+
+
+def test_cancel_and_errors(socket_path):
+    """Cancels reach the client; bad requests come back as BrokerError without dropping the connection"""
+    client = FakeClient()
+    client.ledger.add(7, 'TQQQ', 'SELL', 90.0, 30)
+    service = BrokerService(client, path=socket_path)
+
+    def calls():
+        with BrokerClient(socket_path) as broker:
+            with pytest.raises(BrokerError):
+                broker.call('no_such_method')
+            with pytest.raises(BrokerError, match='Cannot qualify'):
+                broker.quote('BOGUS')
+            return broker.cancel_order(7), broker.ping()
+
+    cancelled, ping = serve(service, calls)
+    assert cancelled == 1
+    assert client.cancelled == [7]
+    assert ping['connected'] is True
+
+
+def test_shared_client_serializes_threads(socket_path):
+    """One client shared by several threads (as by the dashboard's sessions) gets each its own answer"""
+    client = FakeClient()
+    client.market_data.prices.update({f'S{i}': float(i) for i in range(8)})
+    service = BrokerService(client, path=socket_path)
+
+    def calls():
+        with BrokerClient(socket_path) as broker:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                return list(pool.map(lambda i: [broker.quote(f'S{i}') for _ in range(20)], range(8)))
+
+    assert serve(service, calls) == [[float(i)] * 20 for i in range(8)]
+
+
+def test_unavailable_when_no_service(socket_path):
+    with pytest.raises(BrokerUnavailable):
+        BrokerClient(socket_path).ping()
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from contract_cache import ContractCache
+from utils import round_price
+
+
+def make_contract(symbol='TQQQ', con_id=72539702):
+    return SimpleNamespace(conId=con_id, symbol=symbol, secType='STK', exchange='SMART',
+                           primaryExchange='NASDAQ', currency='USD', localSymbol=symbol, tradingClass='NMS')
+
+
+def test_entry_survives_reload(tmp_path):
+    """Qualified contracts and details are persisted and shared through the file"""
+    path = str(tmp_path / 'contract_cache.json')
+    details = SimpleNamespace(minTick=0.01, longName='PROSHARES ULTRAPRO QQQ', timeZoneId='US/Eastern',
+                              tradingHours='20250102:0400-20250102:2000', liquidHours='20250102:0930-20250102:1600')
+    ContractCache(path).put('TQQQ', make_contract(), details)
+
+    entry = ContractCache(path).get('TQQQ')
+    assert entry['conId'] == 72539702
+    assert entry['minTick'] == 0.01
+    assert entry['liquidHours'].endswith('1600')
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    """Entries older than the TTL are ignored"""
+    cache = ContractCache(str(tmp_path / 'contract_cache.json'), ttl=60)
+    cache.put('TQQQ', make_contract())
+    cache._entries['TQQQ']['cached_at'] -= 61
+    assert cache.get('TQQQ') is None
+
+
+def test_writers_do_not_clobber_each_other(tmp_path):
+    """Two processes caching different symbols both end up in the file"""
+    path = str(tmp_path / 'contract_cache.json')
+    first, second = ContractCache(path), ContractCache(path)
+    first.put('TQQQ', make_contract())
+    second.put('SOXL', make_contract('SOXL', 1))
+    reloaded = ContractCache(path)
+    assert reloaded.get('TQQQ') and reloaded.get('SOXL')
+
+
+def test_round_price_uses_min_tick():
+    """Prices snap to the contract's tick size"""
+    assert round_price(80.1234) == 80.12
+    assert round_price(80.1234, 0.05) == 80.1
+    assert round_price(0.123456, 0.0001) == 0.1235
@@ -0,0 +1,240 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import TradeDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    trade_db = TradeDB(str(tmp_path / 'trade_logs.db'))
+    yield trade_db
+    trade_db.close()
+
+
+def test_connection_is_reused(db):
+    """Repeated calls on one thread share a single pooled connection"""
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    db.count_open_orders('TQQQ', 'BUY')
+    db.get_committed_cash('TQQQ')
+    stats = db.get_stats()
+    assert stats['connections_opened'] == 1
+    assert stats['connection_reuses'] >= 3
+
+
+def test_wal_mode_enabled(db):
+    """Pooled connections run in WAL mode with synchronous=NORMAL"""
+    conn = db._get_conn()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+
+def test_connection_per_thread(db):
+    """Each thread gets its own connection"""
+    db.get_open_orders()
+    thread = threading.Thread(target=db.get_open_orders)
+    thread.start()
+    thread.join()
+    assert db.get_stats()['connections_opened'] == 2
+
+
+def test_reader_not_blocked_by_writer(db):
+    """An external reader (e.g. the dashboard) can read while the bot holds a write transaction"""
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    conn = db._get_conn()
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute("UPDATE orders SET status = 'Filled' WHERE order_id = 1")
+    reader = sqlite3.connect(db.db_path, timeout=0.1)
+    try:
+        assert reader.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 1
+    finally:
+        reader.close()
+        conn.commit()
+
+
+def test_lock_wait_counted(db):
+    """Writes blocked by another writer are retried and counted"""
+    db.busy_timeout = 0.2
+    blocker = sqlite3.connect(db.db_path)
+    blocker.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert db.get_stats()['lock_waits'] == 1
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    assert db.count_open_orders('TQQQ', 'BUY') == 1
+
+
+def test_close_reopens_on_next_use(db):
+    """close() drops pooled connections and the next call reconnects"""
+    db.get_open_orders()
+    db.close()
+    assert db.get_open_orders() == []
+    assert db.get_stats()['connections_opened'] == 2
+
+
+def test_migrations_recorded(db):
+    """A fresh database is migrated to the latest schema version"""
+    from database import MIGRATIONS
+    assert db.get_schema_version() == MIGRATIONS[-1][0]
+    # Re-opening is a no-op
+    TradeDB(db.db_path).close()
+    with db._get_conn() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == len(MIGRATIONS)
+
+
+def test_legacy_database_upgraded_in_place(tmp_path):
+    """An unindexed database from before migrations keeps its rows and gains indexes"""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, action TEXT,
+                    price REAL, quantity INTEGER, timestamp TEXT, order_id INTEGER, status TEXT DEFAULT 'Open')''')
+    conn.execute("INSERT INTO orders (symbol, action, price, quantity, order_id) VALUES ('TQQQ', 'BUY', 80.0, 10, 7)")
+    conn.commit()
+    conn.close()
+
+    db = TradeDB(path)
+    try:
+        assert db.count_open_orders('TQQQ', 'BUY') == 1
+        plan = db._get_conn().execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM orders WHERE symbol = ? AND action = ? AND status = 'Open'",
+            ('TQQQ', 'BUY')).fetchall()
+        assert any('idx_orders_symbol_action_status' in row[-1] for row in plan)
+    finally:
+        db.close()
+
+
+def test_record_order_is_idempotent(db):
+    """Recording the same broker order twice keeps one row and does not reopen it"""
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    db.update_order_status(1, 'Filled')
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    with db._get_conn() as conn:
+        rows = conn.execute('SELECT status FROM orders WHERE order_id = 1').fetchall()
+    assert rows == [('Filled',)]
+
+
+def test_reused_price_level_is_not_a_duplicate(db):
+    """A new grid order at a previously used price gets its own row"""
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 1)
+    db.update_order_status(1, 'Filled')
+    db.record_order('TQQQ', 'BUY', 80.0, 10, 2)
+    assert db.count_open_orders('TQQQ', 'BUY') == 1
+    assert db.order_exists('TQQQ', 'BUY', 80.0, 10, 2)
+
+
+def test_record_trade_updates_cumulative_fill(db):
+    """A trade re-recorded with a larger cumulative fill is updated in place"""
+    db.record_trade('TQQQ', 'BUY', 80.0, 4, 1)
+    db.record_trade('TQQQ', 'BUY', 80.05, 10, 1)
+    assert db.get_trade_by_order_id(1)['quantity'] == 10
+    assert db.get_trade_by_order_id(1)['price'] == 80.05
+
+
+def test_record_batch(db):
+    """Orders, trades and status changes from one cycle are persisted together"""
+    db.record_orders([('TQQQ', 'BUY', 80.0, 10, 1), ('TQQQ', 'SELL', 81.2, 10, 2)])
+    db.record_batch(trades=[('TQQQ', 'BUY', 80.0, 10, 1)], statuses=[(1, 'Filled')])
+    assert db.count_open_orders('TQQQ', 'BUY') == 0
+    assert db.count_open_orders('TQQQ', 'SELL') == 1
+    assert db.order_has_fill(1)
+
+
+def test_migration_removes_legacy_duplicates(tmp_path):
+    """Duplicate broker ids from the old check-then-insert path collapse to the newest row"""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, action TEXT,
+                    price REAL, quantity INTEGER, timestamp TEXT, order_id INTEGER, status TEXT DEFAULT 'Open')''')
+    conn.execute("INSERT INTO orders (symbol, action, price, quantity, order_id, status) VALUES ('TQQQ', 'BUY', 80.0, 10, 7, 'Open')")
+    conn.execute("INSERT INTO orders (symbol, action, price, quantity, order_id, status) VALUES ('TQQQ', 'BUY', 80.0, 10, 7, 'Filled')")
+    conn.commit()
+    conn.close()
+
+    db = TradeDB(path)
+    try:
+        with db._get_conn() as conn:
+            assert conn.execute('SELECT status FROM orders WHERE order_id = 7').fetchall() == [('Filled',)]
+    finally:
+        db.close()
+
+
+def test_take_profit_closes_its_own_lot(db):
+    """Each take-profit realizes PnL against its own bracket parent, not the history average"""
+    db.record_batch(lots=[('TQQQ', 1, 2), ('TQQQ', 3, 4)])
+    db.record_cost_basis('TQQQ', 80.0, 10, order_id=1)
+    db.record_cost_basis('TQQQ', 70.0, 10, order_id=3)
+
+    realized = db.record_realized_pnl('TQQQ', 71.05, 10, order_id=4)
+    assert realized == pytest.approx(10.5)
+    assert db.get_realized_pnl('TQQQ') == pytest.approx(10.5)
+    assert db.get_lot(3)['status'] == 'Closed'
+    assert db.get_lot(1)['status'] == 'Holding'
+
+
+def test_relinking_a_bought_lot_keeps_its_fill(db):
+    """The ledger's later write of an already persisted bracket link must not reset the lot"""
+    db.record_batch(lots=[('TQQQ', 1, 2)])  # Written when the ladder is placed
+    db.record_cost_basis('TQQQ', 80.0, 10, order_id=1)
+    db.record_batch(lots=[('TQQQ', 1, 2)])  # Write-behind flush of the same link
+    lot = db.get_lot(1)
+    assert lot['status'] == 'Holding' and lot['buy_quantity'] == 10
+
+
+def test_partial_take_profit_accumulates(db):
+    """Partial sells accumulate on the lot until it is fully closed"""
+    db.record_batch(lots=[('TQQQ', 1, 2)])
+    db.record_cost_basis('TQQQ', 80.0, 10, order_id=1)
+    db.record_realized_pnl('TQQQ', 81.0, 4, order_id=2)
+    assert db.get_lot(1)['status'] == 'Holding'
+    db.record_realized_pnl('TQQQ', 81.0, 6, order_id=2)
+    lot = db.get_lot(1)
+    assert lot['status'] == 'Closed'
+    assert lot['realized'] == pytest.approx(10.0)
+
+
+def test_holding_lots_are_bought_and_not_yet_sold(db):
+    db.record_batch(lots=[('TQQQ', 1, 2), ('TQQQ', 3, 4), ('TQQQ', 5, 6), ('SOXL', 7, 8)])
+    db.record_cost_basis('TQQQ', 80.0, 10, order_id=1)
+    db.record_cost_basis('TQQQ', 70.0, 10, order_id=3)
+    db.record_cost_basis('SOXL', 30.0, 10, order_id=7)
+    db.record_realized_pnl('TQQQ', 71.05, 10, order_id=4)
+    assert db.get_holding_lots('TQQQ') == [
+        {'parent_order_id': 1, 'child_order_id': 2, 'quantity': 10, 'buy_price': 80.0}
+    ]
+
+
+def test_unlinked_sell_uses_running_cost_basis(db):
+    """A sell without a lot falls back to the symbol's running average cost"""
+    db.record_cost_basis('TQQQ', 80.0, 10)
+    db.record_cost_basis('TQQQ', 70.0, 30)
+    realized = db.record_realized_pnl('TQQQ', 75.0, 10)
+    assert realized == pytest.approx((75.0 - 72.5) * 10)
+
+
+def test_execution_replay_is_ignored(db):
+    """The same execId is recorded once; commissions attach to it"""
+    assert db.record_execution('0001.01', 1, 'TQQQ', 'BUY', 80.0, 4, '2025-01-02T15:00:00')
+    assert not db.record_execution('0001.01', 1, 'TQQQ', 'BUY', 80.0, 4, '2025-01-02T15:00:00')
+    db.record_commission('0001.01', 1.0)
+    executions = db.get_executions(1)
+    assert len(executions) == 1
+    assert executions[0]['commission'] == 1.0
+
+
+def test_execution_cursor_advances(db):
+    """Bulk-recorded executions move the cursor to the newest one and never back"""
+    assert db.get_exec_cursor() is None
+    new_ids = db.record_executions([
+        ('0001.02', 1, 'TQQQ', 'BUY', 80.0, 6, '2025-01-02T15:00:05+00:00', 11),
+        ('0001.01', 1, 'TQQQ', 'BUY', 80.0, 4, '2025-01-02T15:00:00+00:00', 11),
+    ])
+    assert new_ids == {'0001.01', '0001.02'}
+    assert db.get_exec_cursor() == ('2025-01-02T15:00:05+00:00', '0001.02')
+    # Replaying an older execution is ignored and leaves the cursor alone
+    assert db.record_executions([('0001.01', 1, 'TQQQ', 'BUY', 80.0, 4, '2025-01-02T15:00:00+00:00', 11)]) == set()
+    assert db.get_exec_cursor() == ('2025-01-02T15:00:05+00:00', '0001.02')
@@ -0,0 +1,262 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from grid_engine import GridEngine, SymbolGrid
+from ladder import DONE, HOLDING, WORKING
+from order_ledger import OrderLedger
+from settings import ConfigWatcher, load_grid_configs, load_settings
+
+
+class FakeDB:
+    def __init__(self):
+        self.cost_basis = []
+        self.realized = []
+        self.prices = {}
+
+    def get_realized_pnl(self, symbol):
+        return 0.0
+
+    def set_latest_price(self, symbol, price):
+        self.prices[symbol] = price
+
+    def get_latest_price(self, symbol):
+        return self.prices.get(symbol)
+
+    def get_holding_lots(self, symbol):
+        return []
+
+    def record_cost_basis(self, symbol, price, quantity, order_id=None):
+        self.cost_basis.append((symbol, price, quantity))
+
+    def record_realized_pnl(self, symbol, price, quantity, order_id=None):
+        self.realized.append((symbol, price, quantity))
+        return 1.0
+
+
+class FakeClient:
+    """Just enough of AsyncIBKRClient for the grid engine"""
+
+    def __init__(self, prices, positions=None, broken=()):
+        self.prices = prices
+        self.positions = positions or {}
+        self.broken = set(broken)
+        self.connected = True
+        self.tracked = None
+        self.ladders = {}
+        self.ledger = OrderLedger()
+        self.next_id = 1
+        self.fills = []
+        self.syncs = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.market_data = SimpleNamespace(add_listener=lambda callback: None)
+
+    def track_symbols(self, symbols):
+        self.tracked = set(symbols)
+
+    async def get_stock_contracts(self, symbols):
+        return {symbol: SimpleNamespace(symbol=symbol) for symbol in symbols}
+
+    async def sync_open_orders_from_ibkr(self, full=False):
+        self.syncs += 1
+
+    def drain_fills(self):
+        fills, self.fills = self.fills, []
+        return fills
+
+    async def get_market_price(self, contract):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        if contract.symbol in self.broken:
+            raise RuntimeError('no market data permissions')
+        return self.prices[contract.symbol]
+
+    def get_committed_cash(self, symbol):
+        return 0.0
+
+    def get_position(self, symbol):
+        return self.positions.get(symbol, 0)
+
+    def count_open_buy_orders(self, contract):
+        return len(self.ladders.get(contract.symbol, ()))
+
+    def count_open_sell_orders(self, contract):
+        return 0
+
+    def round_price(self, contract, price):
+        return round(price, 2)
+
+    async def place_grid_ladder(self, contract, levels, profit_pct=None):
+        self.ladders[contract.symbol] = levels
+        pairs = []
+        for buy_price, quantity in levels:
+            parent_id, child_id = self.next_id, self.next_id + 1
+            self.next_id += 2
+            self.ledger.add(parent_id, contract.symbol, 'BUY', buy_price, quantity, persist=False)
+            self.ledger.add(child_id, contract.symbol, 'SELL', buy_price * 1.015, quantity, parent_id=parent_id, persist=False)
+            pairs.append([SimpleNamespace(order=SimpleNamespace(orderId=order_id)) for order_id in (parent_id, child_id)])
+        return pairs
+
+    def get_bracket_levels(self, symbol):
+        return []
+
+    async def reprice_ladder(self, contract, levels, profit_pct=None):
+        self.repriced = (contract.symbol, levels, profit_pct)
+
+    def apply_settings(self, settings, changed=()):
+        self.settings = settings
+
+    def update_position(self, symbol):
+        pass
+
+    def get_trading_period(self):
+        return 'regular'
+
+
+def test_grid_configs_inherit_top_level_settings():
+    config = {'symbol': 'TQQQ', 'profit_pct': 0.015, 'strategy_budget': 50000,
+              'grids': [{'symbol': 'TQQQ'}, {'symbol': 'SOXL', 'strategy_budget': 20000}]}
+    grids = load_grid_configs(config)
+    assert [grid.symbol for grid in grids] == ['TQQQ', 'SOXL']
+    assert grids[1].strategy_budget == 20000 and grids[1].profit_pct == 0.015
+    assert load_grid_configs({'symbol': 'TQQQ'})[0].symbol == 'TQQQ'
+    with pytest.raises(ValueError):
+        load_grid_configs({'symbol': 'X', 'grids': [{'symbol': 'A'}, {'symbol': 'A'}]})
+
+
+def test_grids_step_concurrently_with_isolated_state():
+    """Every grid places its own ladder in one cycle; a failing grid does not stop the others"""
+    prices = {'TQQQ': 80.0, 'SOXL': 30.0, 'BAD': 10.0}
+    client = FakeClient(prices, positions={'TQQQ': 30, 'SOXL': 100, 'BAD': 10})
+    client.broken = {'BAD'}
+    db = FakeDB()
+    configs = load_grid_configs({'symbol': 'TQQQ', 'grids': [{'symbol': s} for s in prices]})
+    engine = GridEngine(client, db, configs)
+
+    async def run():
+        await engine.start()
+        await engine.run_once({symbol: {'start'} for symbol in prices})
+        engine.scheduler.close()
+
+    asyncio.run(run())
+    assert client.tracked == set(prices)
+    assert client.syncs == 2  # Full sync at start, incremental sync in the cycle
+    assert client.max_in_flight == 3
+    assert client.ladders['TQQQ'][0][0] < 80.0 and client.ladders['SOXL'][0][0] < 30.0
+    assert len(client.ladders['TQQQ']) == 5
+    # The failing grid used the config fallback price but kept its own state
+    assert engine.grids['BAD'].price == 83.00
+    assert engine.grids['TQQQ'].interval != engine.grids['SOXL'].interval
+
+
+def test_fills_are_routed_to_their_grid_and_wake_it():
+    db = FakeDB()
+    client = FakeClient({'TQQQ': 80.0, 'SOXL': 30.0})
+    engine = GridEngine(client, db, load_grid_configs({'symbol': 'TQQQ', 'grids': [{'symbol': 'TQQQ'}, {'symbol': 'SOXL'}]}),
+                        debounce=0.001)
+
+    async def run():
+        engine.route_fills([
+            {'symbol': 'SOXL', 'action': 'BUY', 'price': 29.5, 'quantity': 10, 'order_id': 1, 'final': True},
+            {'symbol': 'OTHER', 'action': 'SELL', 'price': 5.0, 'quantity': 1, 'order_id': 2, 'final': True},
+        ])
+        return await asyncio.wait_for(engine.scheduler.next_batch(), 1)
+
+    assert asyncio.run(run()) == {'SOXL': {'fill'}}
+    assert db.cost_basis == [('SOXL', 29.5, 10)]
+
+
+def test_step_arms_timer_and_price_trigger():
+    """A grid asking for a delay gets a timer; every grid is re-armed on price moves from its last price"""
+    client = FakeClient({'TQQQ': 80.0}, positions={'TQQQ': 30})
+    engine = GridEngine(client, FakeDB(), load_grid_configs({'symbol': 'TQQQ', 'strategy_budget': 1000}),
+                        debounce=0.001)
+    grid = engine.grids['TQQQ']
+    grid.contract = SimpleNamespace(symbol='TQQQ')
+
+    async def run():
+        await engine._step(grid, {'start'})
+        timers = dict(engine.scheduler._timers)
+        engine.scheduler.on_price('TQQQ', 80.1)   # Inside the threshold: nothing
+        engine.scheduler.on_price('TQQQ', 81.0)   # Past it
+        batch = await asyncio.wait_for(engine.scheduler.next_batch(), 1)
+        engine.scheduler.close()
+        return timers, batch
+
+    timers, batch = asyncio.run(run())
+    assert 'TQQQ' in timers  # Low cash asked for a 120s re-check
+    assert batch == {'TQQQ': {'price'}}
+
+
+def test_low_cash_grid_backs_off():
+    client = FakeClient({'TQQQ': 80.0}, positions={'TQQQ': 30})
+    grid = SymbolGrid(client, FakeDB(), load_grid_configs({'symbol': 'TQQQ', 'strategy_budget': 1000})[0])
+    grid.contract = SimpleNamespace(symbol='TQQQ')
+    assert asyncio.run(grid.step()) == 120
+    assert 'TQQQ' not in client.ladders
+
+
+def test_single_level_budget_places_no_grid():
+    """At a price where the budget covers one level the solver has no interval; the grid waits instead of failing"""
+    client = FakeClient({'PENNY': 1.0}, positions={'PENNY': 30})
+    grid = SymbolGrid(client, FakeDB(), load_grid_configs({'symbol': 'PENNY'})[0])
+    grid.contract = SimpleNamespace(symbol='PENNY')
+    assert asyncio.run(grid.step()) == 120
+    assert grid.interval == 0.0
+    assert 'PENNY' not in client.ladders
+
+
+def test_only_vacant_levels_are_refilled():
+    """A level whose take-profit filled is bought again; a level still holding is not"""
+    client = FakeClient({'TQQQ': 80.0}, positions={'TQQQ': 30})
+    db = FakeDB()
+    grid = SymbolGrid(client, db, load_grid_configs({'symbol': 'TQQQ'})[0])
+    grid.contract = SimpleNamespace(symbol='TQQQ')
+    asyncio.run(grid.step())
+    first = client.ladders['TQQQ']
+    assert len(first) == 5 and grid.ladder.count(WORKING) == 5
+
+    # Levels 1 and 2 buy; level 1's take-profit then fills
+    for parent_id in (1, 3):
+        client.ledger.set_status(parent_id, 'Filled', persist=False)
+        grid.handle_fill({'symbol': 'TQQQ', 'action': 'BUY', 'price': 79.0, 'quantity': 30, 'order_id': parent_id, 'final': True})
+    client.ledger.set_status(2, 'Filled', persist=False)
+    grid.handle_fill({'symbol': 'TQQQ', 'action': 'SELL', 'price': 80.2, 'quantity': 30, 'order_id': 2, 'final': True})
+    assert [grid.ladder.state(step) for step in (1, 2)] == [DONE, HOLDING]
+
+    asyncio.run(grid.step())
+    assert client.ladders['TQQQ'] == [first[0]]
+    assert grid.ladder.count(WORKING) == 4 and grid.ladder.count(HOLDING) == 1
+
+
+def test_config_reload_applies_at_safe_point(tmp_path):
+    """A profit_pct edit re-prices working take-profits; new grids are added and dropped ones removed"""
+    path = tmp_path / 'config.yaml'
+    path.write_text("symbol: TQQQ\ngrids:\n  - symbol: TQQQ\n  - symbol: SOXL\n")
+    settings = load_settings(str(path))
+    client = FakeClient({'TQQQ': 80.0, 'SOXL': 30.0, 'TSLA': 200.0})
+    client.get_bracket_levels = lambda symbol: [{'parent': SimpleNamespace(price=78.0, quantity=30)}]
+    watcher = ConfigWatcher(str(path), settings)
+    engine = GridEngine(client, FakeDB(), settings.grids, debounce=0.001, watcher=watcher)
+    engine.grids['TQQQ'].contract = SimpleNamespace(symbol='TQQQ')
+
+    path.write_text("symbol: TQQQ\nprofit_pct: 0.02\ngrids:\n  - symbol: TQQQ\n  - symbol: TSLA\n")
+    os.utime(path, ns=(1, 10**18))  # Make sure the mtime moved on coarse filesystems
+    assert watcher.check()
+    assert engine.grids['TQQQ'].settings.profit_pct == 0.015  # Nothing applied until the engine says so
+
+    async def run():
+        await engine.run_once({engine.CONFIG: {'config'}})
+        return await asyncio.wait_for(engine.scheduler.next_batch(), 1)
+
+    batch = asyncio.run(run())
+    assert sorted(engine.grids) == ['TQQQ', 'TSLA']
+    assert engine.grids['TQQQ'].settings.profit_pct == 0.02
+    assert client.repriced == ('TQQQ', [(78.0, 30)], 0.02)
+    assert client.settings is watcher.settings and client.tracked == {'TQQQ', 'TSLA'}
+    assert batch == {'TQQQ': {'config'}, 'TSLA': {'config'}}
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from grid_solver import cache_info, solve_grid
+from utils import calculate_lot_size_and_interval
+
+
+def test_matches_scalar_formula():
+    """One vectorized call agrees with the scalar formula for every (cash, price) pair"""
+    cash = np.array([50000.0, 20000.0, 5000.0, 1000.0, 300.0])
+    prices = np.array([80.0, 30.55, 120.0, 84.2, 150.0])
+    solution = solve_grid(cash, prices)
+    for i, (c, p) in enumerate(zip(cash, prices)):
+        lot_size, interval = calculate_lot_size_and_interval(c, p)
+        assert solution['lot_size'][i] == lot_size
+        assert solution['interval'][i] == pytest.approx(interval)
+    assert solution['levels'].shape == (5, 5)
+
+
+def test_ladders_and_cash_at_risk():
+    solution = solve_grid(50000, [80.0, 40.0], num_levels=3)
+    levels, sizes = solution['levels'], solution['sizes']
+    assert np.allclose(levels[:, 0], [80.0, 40.0] - solution['interval'])
+    assert np.allclose(np.diff(levels, axis=1), -solution['interval'][:, None])
+    assert np.allclose(solution['cash_at_risk'][:, -1], (levels * sizes).sum(axis=1))
+
+
+def test_geometric_spacing_spans_the_same_range():
+    arithmetic = solve_grid(50000, 80.0, num_levels=500)
+    geometric = solve_grid(50000, 80.0, num_levels=500, spacing='geometric')
+    gaps = arithmetic['intervals'][0] - 1
+    assert arithmetic['levels'][0, gaps - 1] == pytest.approx(80.0 * 0.13)
+    assert geometric['levels'][0, gaps - 1] == pytest.approx(80.0 * 0.13)
+    ratios = geometric['levels'][0, 1:] / geometric['levels'][0, :-1]
+    assert np.allclose(ratios, ratios[0])
+    assert geometric['interval'][0] > arithmetic['interval'][0]  # Wider steps near the price
+
+
+def test_results_are_memoized_on_quantized_inputs():
+    before = cache_info().hits
+    first = solve_grid(12345.2, 67.891)
+    second = solve_grid(12345.4, 67.889)
+    assert cache_info().hits == before + 1
+    assert first['levels'] is second['levels']
+    with pytest.raises(ValueError):
+        first['levels'][0, 0] = 0.0
+
+
+def test_invalid_inputs_raise():
+    with pytest.raises(ValueError):
+        solve_grid(50000, [80.0, 0.0])
+    with pytest.raises(ValueError):
+        solve_grid(50000, 80.0, spacing='fibonacci')
@@ -1,5 +1,11 @@
+import asyncio
+import itertools
+from datetime import datetime, timezone
 import pytest
-from ibkr import IBKRClient
+from ib_async import CommissionReport, Execution, Fill, Order, OrderStatus, Stock, Trade
+from ibkr import AsyncIBKRClient, IBKRClient
+from database import TradeDB
+from settings import Settings
 import yaml
 import os
 
@@ -79,4 +85,183 @@ def test_order_management(ibkr_client):
     assert isinstance(buy_count, int)
     assert isinstance(sell_count, int)
     assert buy_count >= 0
-    assert sell_count >= 0
\ No newline at end of file
+    assert sell_count >= 0
+
+
+# --- Offline tests: a real AsyncIBKRClient on a bare IB() with the outbound calls stubbed ---
+
+@pytest.fixture
+def offline_client(tmp_path):
+    db = TradeDB(str(tmp_path / 'trade_logs.db'))
+    settings = Settings.from_dict({'symbol': 'TQQQ', 'api_max_messages_per_second': 1000,
+                                   'contract_cache_path': str(tmp_path / 'contract_cache.json')})
+    client = AsyncIBKRClient(db=db, settings=settings)
+    ids = itertools.count(100)
+    client.ib.client.getReqId = lambda: next(ids)
+    client.sent = []        # (orderId, parentId, transmit, lmtPrice, totalQuantity) as each order was sent
+    client.cancelled = []
+    client.trades = {}
+
+    def place_order(contract, order):
+        client.sent.append((order.orderId, order.parentId, order.transmit, order.lmtPrice, order.totalQuantity))
+        trade = client.trades.get(order.orderId)
+        if trade is None:
+            trade = client.trades[order.orderId] = Trade(contract, order, OrderStatus(orderId=order.orderId, status='PreSubmitted'))
+        return trade
+
+    def cancel_order(order):
+        client.cancelled.append(order.orderId)
+        trade = client.trades.get(order.orderId)
+        if trade is not None and trade.orderStatus.status != 'Filled':
+            trade.orderStatus.status = 'Cancelled'
+            client.ib.orderStatusEvent.emit(trade)
+
+    client.ib.placeOrder = place_order
+    client.ib.cancelOrder = cancel_order
+    client.get_trading_period = lambda: 'regular'
+    yield client
+    client.ledger.close()
+    db.close()
+
+
+TQQQ = Stock('TQQQ', 'SMART', 'USD')
+
+
+def test_cancel_order_without_live_trade_waits_for_ibkr(offline_client):
+    """An order loaded from the DB is cancelled by id and stays open until IBKR confirms"""
+    offline_client.ledger.add(7, 'TQQQ', 'BUY', 80.0, 30, persist=False)
+    asyncio.run(offline_client.cancel_order(7))
+    assert offline_client.cancelled == [7]
+    assert 7 in offline_client.ledger
+
+
+def test_cancel_orders_filters_and_splits_outcomes(offline_client):
+    """Only the symbol, side and band asked for are cancelled; fills, confirmations and unconfirmed cancels are told apart"""
+    client, ledger = offline_client, offline_client.ledger
+    for order_id, symbol, action, price in ((1, 'TQQQ', 'BUY', 80.0), (2, 'TQQQ', 'BUY', 79.0),
+                                            (4, 'TQQQ', 'BUY', 60.0), (5, 'TQQQ', 'SELL', 81.0),
+                                            (6, 'SOXL', 'BUY', 79.5)):
+        order = Order(orderId=order_id, action=action, totalQuantity=10, lmtPrice=price)
+        client.trades[order_id] = Trade(TQQQ, order, OrderStatus(orderId=order_id, status='Submitted'))
+        ledger.add(order_id, symbol, action, price, 10, trade=client.trades[order_id], persist=False)
+    client.trades[2].orderStatus.status = 'Filled'  # Filled before the cancel arrived
+    ledger.add(3, 'TQQQ', 'BUY', 78.0, 10, persist=False)  # Loaded from the DB, not seen live
+
+    result = asyncio.run(client.cancel_orders('TQQQ', 'BUY', min_price=70.0, timeout=0.1))
+    assert sorted(client.cancelled) == [1, 2, 3]
+    assert result == {'requested': 3, 'confirmed': 1, 'filled': 1, 'pending': 1}
+    assert [order_id for order_id in (1, 2, 3, 4, 5, 6) if order_id in ledger] == [3, 4, 5, 6]
+
+
+
+def test_cancel_wait_holds_no_ledger_batch_open(offline_client):
+    """Writes from other tasks are not held back while cancel_orders waits for confirmations"""
+    client, ledger = offline_client, offline_client.ledger
+    order = Order(orderId=1, action='BUY', totalQuantity=10, lmtPrice=80.0)
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10, trade=Trade(TQQQ, order, OrderStatus(orderId=1, status='Submitted')), persist=False)
+    client.ib.cancelOrder = lambda order: None  # IBKR never confirms
+
+    async def run():
+        cancel = asyncio.create_task(client.cancel_orders('TQQQ', timeout=0.2))
+        await asyncio.sleep(0.05)
+        batch_open = ledger._pending is not None
+        return batch_open, await cancel
+
+    batch_open, result = asyncio.run(run())
+    assert not batch_open
+    assert result['pending'] == 1 and 1 in ledger
+
+
+def test_modify_order_resends_the_same_id_and_keeps_the_fill(offline_client):
+    client = offline_client
+    (parent, take_profit), = asyncio.run(client.place_grid_ladder(TQQQ, [(80.0, 10)], ack_timeout=0))
+    client.ledger.apply_fill(parent.order.orderId, 4)
+
+    asyncio.run(client.modify_order(parent.order.orderId, price=79.5))
+    assert client.sent[-1] == (parent.order.orderId, 0, True, 79.5, 10)  # Released even though first sent held
+    record = client.ledger.get(parent.order.orderId)
+    assert (record.price, record.filled) == (79.5, 4)
+    assert client.ledger.get(take_profit.order.orderId).parent_id == parent.order.orderId
+
+
+def test_reprice_ladder_modifies_cancels_and_places_only_what_changed(offline_client):
+    client = offline_client
+    asyncio.run(client.place_grid_ladder(TQQQ, [(80.0, 10), (79.0, 10), (78.0, 10)], ack_timeout=0))
+    sent = len(client.sent)
+
+    counts = asyncio.run(client.reprice_ladder(TQQQ, [(80.0, 10), (79.5, 10)]))
+    assert counts == {'modified': 1, 'unchanged': 1, 'placed': 0, 'cancelled': 1}
+    assert [order[0] for order in client.sent[sent:]] == [102, 103]  # The 79.0 bracket, both legs
+    assert client.cancelled == [104]  # The 78.0 parent; its take-profit goes with it at IBKR
+    assert [level['parent'].price for level in client.get_bracket_levels('TQQQ')] == [80.0, 79.5]
+
+    counts = asyncio.run(client.reprice_ladder(TQQQ, [(80.0, 10), (79.5, 10), (77.0, 10)]))
+    assert counts == {'modified': 0, 'unchanged': 2, 'placed': 1, 'cancelled': 0}
+    assert [level['parent'].price for level in client.get_bracket_levels('TQQQ')] == [80.0, 79.5, 77.0]
+
+
+
+def test_grid_ladder_is_sent_as_linked_brackets(offline_client):
+    """Ids are pre-allocated; each parent is held (transmit=False) until its take-profit releases it"""
+    client = offline_client
+    pairs = asyncio.run(client.place_grid_ladder(TQQQ, [(80.0, 10), (78.0, 12)], ack_timeout=0))
+    assert client.sent == [(100, 0, False, 80.0, 10), (101, 100, True, 81.2, 10),
+                           (102, 0, False, 78.0, 12), (103, 102, True, 79.17, 12)]
+    assert [[trade.order.orderId for trade in pair] for pair in pairs] == [[100, 101], [102, 103]]
+    assert client.ledger.count_open('TQQQ', 'BUY') == 2 and client.ledger.get(103).parent_id == 102
+    assert client.db.get_lot(100)['child_order_id'] == 101  # Linked before anything was sent
+
+
+def test_ack_wait_counts_acknowledged_orders(offline_client):
+    client = offline_client
+    pairs = asyncio.run(client.place_grid_ladder(TQQQ, [(80.0, 10), (79.0, 10)], ack_timeout=0))
+    trades = [trade for pair in pairs for trade in pair]
+    trades[3].orderStatus.status = 'PendingSubmit'
+    assert asyncio.run(client.wait_for_acks(trades, timeout=0.05)) == 3
+
+
+def execution_fill(exec_id, order_id, shares, cum_qty, price, when):
+    execution = Execution(execId=exec_id, time=when, side='BOT', shares=shares, price=price, orderId=order_id,
+                          cumQty=cum_qty, avgPrice=price, permId=order_id + 9000)
+    return Fill(TQQQ, execution, CommissionReport(), when)
+
+
+def test_fills_are_booked_once_with_partial_and_final(offline_client):
+    """A replayed execId is ignored; committed cash drops by what filled and the order closes on the last fill"""
+    client, ledger = offline_client, offline_client.ledger
+    order = Order(orderId=1, action='BUY', totalQuantity=10, lmtPrice=80.0)
+    trade = Trade(TQQQ, order, OrderStatus(orderId=1, status='Submitted'))
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10, trade=trade, persist=False)
+    first = execution_fill('0001.01', 1, 4, 4, 80.0, datetime(2025, 1, 2, 15, 0, tzinfo=timezone.utc))
+    last = execution_fill('0001.02', 1, 6, 10, 80.0, datetime(2025, 1, 2, 15, 0, 5, tzinfo=timezone.utc))
+
+    assert client._process_fills([(trade, first)]) == 1
+    assert ledger.committed_cash('TQQQ') == pytest.approx(480.0) and 1 in ledger
+    assert client._process_fills([(trade, first)]) == 0  # Replayed (e.g. after a reconnect)
+    assert ledger.committed_cash('TQQQ') == pytest.approx(480.0)
+    assert client._process_fills([(trade, last)]) == 1
+    assert 1 not in ledger and ledger.committed_cash('TQQQ') == 0.0
+
+    fills = [client.fill_queue.get_nowait() for _ in range(client.fill_queue.qsize())]
+    assert [(fill['quantity'], fill['final']) for fill in fills] == [(4, False), (6, True)]
+
+
+def test_backfill_replays_executions_since_the_cursor_oldest_first(offline_client):
+    client, ledger, db = offline_client, offline_client.ledger, offline_client.db
+    db.record_executions([('0000.01', 9, 'TQQQ', 'BUY', 79.0, 10, '2025-01-02T10:00:00-05:00', 9)])
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10, persist=False)  # Loaded from the DB; ib_async has no trade for it
+    requested = []
+
+    async def req_executions(exec_filter):
+        requested.append(exec_filter.time)
+        return [execution_fill('0001.02', 1, 6, 10, 80.0, datetime(2025, 1, 2, 15, 0, 5, tzinfo=timezone.utc)),
+                execution_fill('0001.01', 1, 4, 4, 80.0, datetime(2025, 1, 2, 15, 0, tzinfo=timezone.utc))]
+
+    client.ib.reqExecutionsAsync = req_executions
+    assert asyncio.run(client.backfill_executions()) == 2
+    assert requested == ['20250102-15:00:00']  # The cursor, in UTC
+    ledger.flush()
+    assert db.get_trade_by_order_id(1)['quantity'] == 10  # Cumulative fill ends at the latest execution
+    assert 1 not in ledger
+    assert db.get_exec_cursor() == ('2025-01-02T15:00:05+00:00', '0001.02')
+
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from ladder import DONE, EMPTY, HOLDING, WORKING, GridLadder
+from order_ledger import OrderLedger
+
+
+def fill(order_id, final=True):
+    return {'order_id': order_id, 'final': final}
+
+
+def test_levels_are_steps_from_the_anchor():
+    ladder = GridLadder('TQQQ', 100.0, 2.0)
+    assert ladder.price_for(3) == 94.0
+    assert ladder.step_for(93.9) == 3
+    # The levels strictly below the price, nearest first
+    assert ladder.vacant(99.0, 3) == [1, 2, 3]
+    assert ladder.vacant(98.0, 3) == [2, 3, 4]
+
+
+def test_level_lifecycle_and_targeted_vacancies():
+    ladder = GridLadder('TQQQ', 100.0, 1.0)
+    for step in (1, 2, 3):
+        ladder.place(step, step * 10, step * 10 + 1, 30)
+    assert ladder.vacant(100.0, 5) == [4, 5]
+
+    ladder.on_fill(fill(20, final=False))
+    assert ladder.state(2) == WORKING  # Partial fill keeps the level working
+    ladder.on_fill(fill(20))
+    assert ladder.state(2) == HOLDING
+    assert ladder.vacant(100.0, 5) == [4, 5]  # A bought level is not bought again
+
+    ladder.on_fill(fill(21))
+    assert ladder.state(2) == DONE
+    assert ladder.vacant(100.0, 5) == [2, 4, 5]
+    assert not ladder.place(1, 99, 100, 30)  # Still working
+
+    ladder.place(2, 50, 51, 30)
+    assert ladder.on_fill(fill(20)) is None  # The old bracket no longer maps to the level
+    assert ladder.get_stats()['levels'] == {EMPTY: 0, WORKING: 3, HOLDING: 0, DONE: 0}
+    assert ladder.get_stats()['round_trips'] == 1
+
+
+def test_reconcile_catches_finished_orders():
+    ledger = OrderLedger()
+    ladder = GridLadder('TQQQ', 100.0, 1.0)
+    for step in (1, 2, 3):
+        ladder.place(step, step * 10, step * 10 + 1, 30)
+        ledger.add(step * 10, 'TQQQ', 'BUY', 100.0 - step, 30, persist=False)
+        ledger.add(step * 10 + 1, 'TQQQ', 'SELL', 101.0 - step, 30, parent_id=step * 10, persist=False)
+    ledger.set_status(10, 'Filled', persist=False)      # Bought while we were away
+    ledger.set_status(20, 'Cancelled', persist=False)   # Bracket cancelled
+    ledger.set_status(21, 'Cancelled', persist=False)
+    ladder.reconcile(ledger)
+    assert [ladder.state(step) for step in (1, 2, 3)] == [HOLDING, EMPTY, WORKING]
+
+    ledger.set_status(11, 'Filled', persist=False)
+    ladder.reconcile(ledger)
+    assert ladder.state(1) == DONE
+
+
+def test_rebuild_from_broker_and_db_state():
+    def record(order_id, price):
+        return SimpleNamespace(order_id=order_id, price=price, quantity=30)
+    brackets = [{'parent': record(1, 98.0), 'child': record(2, 99.47)},
+                {'parent': record(3, 97.0), 'child': record(4, 98.46)}]
+    lots = [{'parent_order_id': 5, 'child_order_id': 6, 'quantity': 30, 'buy_price': 95.02}]
+    ladder = GridLadder.rebuild('TQQQ', 96.5, 1.0, brackets=brackets, lots=lots)
+    assert ladder.anchor == 99.0
+    assert [ladder.state(step) for step in (1, 2, 3, 4)] == [WORKING, WORKING, EMPTY, HOLDING]
+    assert ladder.vacant(96.5, 3) == [3, 5]
+
+    assert GridLadder.rebuild('TQQQ', 96.5, 1.0).anchor == 96.5
+
+
+def test_rebuild_uses_the_spacing_the_brackets_were_placed_with():
+    """A recomputed interval must not fold working brackets onto one level and undercount them"""
+    def record(order_id, price):
+        return SimpleNamespace(order_id=order_id, price=price, quantity=30)
+    brackets = [{'parent': record(i, price), 'child': record(i + 100, price * 1.015)}
+                for i, price in enumerate((79.0, 78.0, 77.0, 76.0, 75.0))]
+    lots = [{'parent_order_id': 50, 'child_order_id': 51, 'quantity': 30, 'buy_price': 77.1}]
+    ladder = GridLadder.rebuild('TQQQ', 80.0, 2.5, brackets=brackets, lots=lots)
+    assert ladder.interval == 1.0
+    assert ladder.count(WORKING) == 5 and ladder.count(HOLDING) == 1
+    assert ladder.vacant(80.0, 5) == []
@@ -0,0 +1,162 @@
+import asyncio
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from market_data import MarketDataManager
+from pacing import Pacer
+
+
+class FakeEvent:
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def emit(self, *args):
+        for handler in self.handlers:
+            handler(*args)
+
+
+class FakeIB:
+    """Just enough of ib_async.IB for the market data layer"""
+
+    def __init__(self):
+        self.pendingTickersEvent = FakeEvent()
+        self.requests = []
+        self.snapshots = []
+        self.cancels = []
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, *args, **kwargs):
+        (self.snapshots if snapshot else self.requests).append(contract.symbol)
+        return SimpleNamespace(contract=contract, bid=math.nan, ask=math.nan, last=math.nan, close=math.nan)
+
+    def cancelMktData(self, contract):
+        self.cancels.append(contract.symbol)
+
+
+def tick(ib, ticker, **fields):
+    for name, value in fields.items():
+        setattr(ticker, name, value)
+    ib.pendingTickersEvent.emit([ticker])
+
+
+def test_one_stream_per_contract():
+    """Subscriptions are reference counted and cancelled with the last reference"""
+    ib = FakeIB()
+    md = MarketDataManager(ib)
+    contract = SimpleNamespace(symbol='TQQQ')
+    md.subscribe(contract)
+    md.subscribe(contract)
+    assert ib.requests == ['TQQQ']
+    md.unsubscribe('TQQQ')
+    assert ib.cancels == []
+    md.unsubscribe('TQQQ')
+    assert ib.cancels == ['TQQQ']
+    assert not md.is_subscribed('TQQQ')
+
+
+def test_latest_price_from_cache():
+    """Ticks populate the cache; reads prefer last inside the spread, then the midpoint"""
+    ib = FakeIB()
+    md = MarketDataManager(ib)
+    ticker = md.subscribe(SimpleNamespace(symbol='TQQQ'))
+    assert md.latest_price('TQQQ') is None
+    tick(ib, ticker, bid=80.0, ask=80.1, last=80.05)
+    assert md.latest_price('TQQQ') == 80.05
+    tick(ib, ticker, last=81.0)
+    assert md.latest_price('TQQQ') == pytest.approx(80.05)
+    tick(ib, ticker, bid=math.nan, ask=math.nan, last=math.nan, close=79.5)
+    assert md.latest_price('TQQQ') == 79.5
+
+
+def test_stale_quote_is_not_returned():
+    """A quote older than stale_after is treated as missing"""
+    ib = FakeIB()
+    md = MarketDataManager(ib, stale_after=60)
+    ticker = md.subscribe(SimpleNamespace(symbol='TQQQ'))
+    tick(ib, ticker, last=80.0)
+    md._quotes['TQQQ'].updated -= 61
+    assert md.is_stale('TQQQ')
+    assert md.latest_price('TQQQ') is None
+    assert md.latest_price('TQQQ', max_age=120) == 80.0
+
+
+def test_next_tick():
+    """next_tick resolves on the following update"""
+    ib = FakeIB()
+    md = MarketDataManager(ib)
+    ticker = md.subscribe(SimpleNamespace(symbol='TQQQ'))
+
+    async def scenario():
+        waiter = asyncio.ensure_future(md.next_tick('TQQQ', timeout=1))
+        await asyncio.sleep(0)
+        tick(ib, ticker, last=80.0)
+        return await waiter
+
+    quote = asyncio.run(scenario())
+    assert quote.price() == 80.0
+
+
+def test_lines_go_to_symbols_nearest_the_touch():
+    """Only the closest symbols within near_touch stream; lines are recycled when priorities change"""
+    ib = FakeIB()
+    md = MarketDataManager(ib, max_lines=4, snapshot_lines=2, near_touch=0.02)
+    for symbol, distance in (('AAA', 0.001), ('BBB', 0.01), ('CCC', 0.015), ('DDD', 0.5)):
+        md.watch(SimpleNamespace(symbol=symbol), distance)
+    assert md.rebalance() == {'AAA', 'BBB'}
+    assert ib.requests == ['AAA', 'BBB']
+
+    md.set_priority('AAA', 0.3)
+    md.rebalance()
+    assert ib.cancels == ['AAA']
+    assert md.is_subscribed('CCC') and not md.is_subscribed('AAA')
+    assert md.get_stats()['recycled_lines'] == 1
+
+
+def test_snapshot_rotation_serves_symbols_without_lines():
+    """Unstreamed symbols get snapshots, most overdue first, within the free lines"""
+    ib = FakeIB()
+    md = MarketDataManager(ib, max_lines=2, snapshot_lines=2, snapshot_interval=30, idle_snapshot_interval=120)
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        md.watch(SimpleNamespace(symbol=symbol), 0.1)
+    assert md.refresh_snapshots() == 2
+    assert md.lines_in_use() == 2
+
+    # A completed snapshot frees its line and prices the symbol from the cache
+    ticker = SimpleNamespace(contract=SimpleNamespace(symbol=ib.snapshots[0]), bid=math.nan, ask=math.nan,
+                             last=math.nan, close=math.nan)
+    tick(ib, ticker, bid=10.0, ask=10.2)
+    assert md.latest_price(ib.snapshots[0]) == pytest.approx(10.1)
+    assert md.freshness()[ib.snapshots[0]]['source'] == 'snapshot'
+    assert md.refresh_snapshots() == 1
+    assert sorted(ib.snapshots) == ['AAA', 'BBB', 'CCC']
+
+    # Fresh snapshots are not re-requested until they age past the target interval
+    assert md.refresh_snapshots() == 0
+
+
+def test_paced_requests_never_block_the_loop():
+    """With the bucket empty, requests are queued in order and sent by a task instead of sleeping"""
+    ib = FakeIB()
+    pacer = Pacer(max_rate=100, burst=1)
+    pacer.sleep = lambda seconds: pytest.fail('synchronous pacer wait on the event loop')
+    md = MarketDataManager(ib, pacer=pacer, near_touch=0.02)
+    for symbol in ('AAA', 'BBB', 'CCC'):
+        md.watch(SimpleNamespace(symbol=symbol), 0.01)
+
+    async def run():
+        md.rebalance()
+        sent_at_once = list(ib.requests)
+        md.set_priority('AAA', 0.5)
+        md.rebalance()  # AAA's cancel queues behind the opens
+        while md._sender is not None:
+            await asyncio.sleep(0.005)
+        return sent_at_once
+
+    assert asyncio.run(run()) == ['AAA']
+    assert ib.requests == ['AAA', 'BBB', 'CCC'] and ib.cancels == ['AAA']
+    assert md.is_subscribed('BBB') and md._tickers['BBB'].contract.symbol == 'BBB'
@@ -0,0 +1,93 @@
+import pytest
+
+from database import TradeDB
+from order_ledger import OrderLedger, OrderRecord
+
+
+@pytest.fixture
+def db(tmp_path):
+    trade_db = TradeDB(str(tmp_path / 'trade_logs.db'))
+    yield trade_db
+    trade_db.close()
+
+
+def test_record_uses_slots():
+    """Order records carry no per-instance __dict__"""
+    record = OrderRecord(1, 'TQQQ', 'BUY', 80.0, 10)
+    assert not hasattr(record, '__dict__')
+
+
+def test_aggregates_track_open_orders():
+    """Open counts and committed cash follow adds and status changes"""
+    ledger = OrderLedger()
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10)
+    ledger.add(2, 'TQQQ', 'SELL', 81.2, 10, parent_id=1)
+    ledger.add(3, 'TQQQ', 'BUY', 79.0, 10)
+    ledger.add(4, 'SOXL', 'BUY', 20.0, 50)
+    assert ledger.count_open('TQQQ', 'BUY') == 2
+    assert ledger.count_open('TQQQ', 'SELL') == 1
+    assert ledger.committed_cash('TQQQ') == pytest.approx(1590.0)
+    assert ledger.ids('TQQQ', 'BUY') == {1, 3}
+
+    ledger.set_status(1, 'Filled')
+    assert ledger.count_open('TQQQ', 'BUY') == 1
+    assert ledger.committed_cash('TQQQ') == pytest.approx(790.0)
+    assert 1 not in ledger
+    assert ledger.ids('TQQQ') == {2, 3}
+
+
+def test_re_adding_an_order_does_not_double_count():
+    """Re-tracking an order id replaces the old record"""
+    ledger = OrderLedger()
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10)
+    ledger.add(1, 'TQQQ', 'BUY', 79.5, 10)
+    assert ledger.count_open('TQQQ', 'BUY') == 1
+    assert ledger.committed_cash('TQQQ') == pytest.approx(795.0)
+
+
+def test_write_behind_persists_batch(db):
+    """Changes reach the database after flush, including bracket lot links"""
+    ledger = OrderLedger(db, flush_interval=0.01)
+    with ledger.batch():
+        ledger.add(1, 'TQQQ', 'BUY', 80.0, 10)
+        ledger.add(2, 'TQQQ', 'SELL', 81.2, 10, parent_id=1)
+    ledger.set_status(1, 'Filled')
+    ledger.flush()
+    assert db.count_open_orders('TQQQ', 'BUY') == 0
+    assert db.count_open_orders('TQQQ', 'SELL') == 1
+    assert db.get_lot(1)['child_order_id'] == 2
+    ledger.close()
+
+
+def test_load_from_database(db):
+    """A new ledger can be seeded from the open orders already in the database"""
+    db.record_orders([('TQQQ', 'BUY', 80.0, 10, 1), ('TQQQ', 'BUY', 79.0, 10, 2)])
+    ledger = OrderLedger(db)
+    ledger.load(db.get_open_orders())
+    assert ledger.count_open('TQQQ', 'BUY') == 2
+    assert ledger.pending_writes() == 0
+
+
+def test_partial_fill_releases_committed_cash():
+    """Only the unfilled remainder of a BUY counts as committed cash"""
+    ledger = OrderLedger()
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10)
+    ledger.apply_fill(1, 4)
+    assert ledger.committed_cash('TQQQ') == pytest.approx(480.0)
+    assert ledger.count_open('TQQQ', 'BUY') == 1
+    ledger.apply_fill(1, 6)
+    assert ledger.committed_cash('TQQQ') == pytest.approx(0.0)
+
+
+def test_modifying_a_partly_filled_order_keeps_its_fill():
+    """A price change re-indexes the record in place instead of replacing it"""
+    ledger = OrderLedger()
+    ledger.add(2, 'TQQQ', 'SELL', 81.2, 10, parent_id=1)
+    ledger.add(3, 'TQQQ', 'BUY', 80.0, 10)
+    ledger.apply_fill(3, 4)
+    ledger.update(3, price=79.0)
+    record = ledger.get(3)
+    assert (record.price, record.filled) == (79.0, 4)
+    assert ledger.committed_cash('TQQQ') == pytest.approx(79.0 * 6)
+    ledger.update(2, price=80.5, quantity=8)
+    assert ledger.get(2).parent_id == 1 and ledger.count_open('TQQQ', 'SELL') == 1
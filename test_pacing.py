@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from pacing import CANCEL, DATA, ORDER, Pacer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_burst_within_budget_is_not_delayed(clock):
+    """Requests inside the bucket capacity go out immediately"""
+    pacer = Pacer(max_rate=10, clock=clock, sleep=clock.sleep)
+    for _ in range(10):
+        pacer.wait(ORDER)
+    assert clock.now == 0.0
+    assert pacer.get_stats()['lanes']['order']['throttled'] == 0
+
+
+def test_rate_limit_enforced(clock):
+    """Once the bucket is empty requests are spaced at the configured rate"""
+    pacer = Pacer(max_rate=10, clock=clock, sleep=clock.sleep)
+    for _ in range(30):
+        pacer.wait(ORDER)
+    assert clock.now == pytest.approx(2.0)
+    stats = pacer.get_stats()['lanes']['order']
+    assert stats['requests'] == 30
+    assert stats['throttled'] == 20
+    assert stats['max_wait'] == pytest.approx(0.1)
+
+
+def test_historical_window(clock):
+    """Historical requests beyond 60 per 10 minutes wait for the window to roll"""
+    pacer = Pacer(max_rate=100, burst=100, historical_requests=2, historical_window=600,
+                  clock=clock, sleep=clock.sleep)
+    pacer.wait(DATA, historical=True)
+    pacer.wait(DATA, historical=True)
+    pacer.wait(DATA)  # Non-historical data is unaffected
+    assert clock.now == 0.0
+    pacer.wait(DATA, historical=True)
+    assert clock.now == pytest.approx(600.0)
+    assert pacer.get_stats()['historical_waits'] == 1
+
+
+def test_lanes_served_by_priority():
+    """Queued cancels go before queued orders, which go before data requests"""
+    pacer = Pacer(max_rate=50, burst=1)
+    sent = []
+
+    async def request(lane, name):
+        await pacer.acquire(lane)
+        sent.append(name)
+
+    async def run():
+        await pacer.acquire(DATA)  # Drain the bucket so everything below has to queue
+        tasks = [asyncio.create_task(request(DATA, 'data')),
+                 asyncio.create_task(request(ORDER, 'order')),
+                 asyncio.create_task(request(CANCEL, 'cancel'))]
+        await asyncio.sleep(0)
+        assert pacer.queue_depth() == 3
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert sent == ['cancel', 'order', 'data']
+    assert pacer.queue_depth() == 0
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from database import TradeDB
+from position_book import PositionBook
+
+TQQQ = SimpleNamespace(conId=72539702, symbol='TQQQ')
+
+
+def position(qty, avg_cost, account='DU1'):
+    return SimpleNamespace(account=account, contract=TQQQ, position=qty, avgCost=avg_cost)
+
+
+def portfolio(qty, avg_cost, unrealized, account='DU1'):
+    return SimpleNamespace(account=account, contract=TQQQ, position=qty, averageCost=avg_cost,
+                           marketPrice=81.0, marketValue=81.0 * qty, unrealizedPNL=unrealized, realizedPNL=0.0)
+
+
+class CountingDB:
+    def __init__(self):
+        self.writes = []
+
+    def update_position(self, *args):
+        self.writes.append(args)
+
+
+def test_lookups_follow_events():
+    """Position, average cost and unrealized PnL come from the latest events"""
+    book = PositionBook()
+    assert not book.has_position('TQQQ')
+    book.on_position(position(30, 80.0))
+    book.on_portfolio(portfolio(30, 80.0, 30.0))
+    assert book.position('TQQQ') == 30
+    assert book.avg_cost('TQQQ') == pytest.approx(80.0)
+    assert book.unrealized_pnl('TQQQ') == pytest.approx(30.0)
+
+
+def test_accounts_are_aggregated_per_symbol():
+    """The same contract held in two accounts is summed with a weighted average cost"""
+    book = PositionBook()
+    book.on_position(position(10, 80.0, 'DU1'))
+    book.on_position(position(30, 76.0, 'DU2'))
+    assert book.position('TQQQ') == 40
+    assert book.avg_cost('TQQQ') == pytest.approx(77.0)
+    assert len(book.get('TQQQ', account='DU2')) == 1
+
+
+def test_persists_only_on_change():
+    """Repeated identical events do not touch the database"""
+    db = CountingDB()
+    book = PositionBook(db)
+    book.on_position(position(30, 80.0))
+    book.on_position(position(30, 80.0))
+    book.persist('TQQQ')
+    assert len(db.writes) == 1
+    book.on_position(position(0, 0.0))
+    assert len(db.writes) == 2
+
+
+def test_positions_table_round_trip(tmp_path):
+    """Persisted summaries include average cost and unrealized PnL"""
+    db = TradeDB(str(tmp_path / 'trade_logs.db'))
+    try:
+        PositionBook(db).on_portfolio(portfolio(30, 80.0, 30.0))
+        assert db.get_all_positions() == [{'symbol': 'TQQQ', 'position': 30, 'avg_cost': 80.0,
+                                           'unrealized_pnl': 30.0, 'market_value': 2430.0}]
+    finally:
+        db.close()
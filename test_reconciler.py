@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from order_ledger import OrderLedger
+from reconciler import OrderReconciler
+
+
+def make_trade(order_id, action='BUY', price=80.0, quantity=10, status='Submitted', symbol='TQQQ', parent_id=0):
+    return SimpleNamespace(
+        order=SimpleNamespace(orderId=order_id, action=action, totalQuantity=quantity, lmtPrice=price, parentId=parent_id),
+        contract=SimpleNamespace(symbol=symbol),
+        orderStatus=SimpleNamespace(status=status),
+    )
+
+
+def test_first_reconcile_takes_snapshot():
+    """Without a prior snapshot the full open-order list is diffed, and stale ledger orders are removed"""
+    ledger = OrderLedger()
+    ledger.add(9, 'TQQQ', 'BUY', 70.0, 10)
+    reconciler = OrderReconciler(ledger, symbols={'TQQQ'})
+    result = reconciler.reconcile(snapshot=lambda: [make_trade(1), make_trade(2, 'SELL', 81.2, parent_id=1)])
+    assert result['full']
+    assert (result['added'], result['removed']) == (2, 1)
+    assert ledger.ids('TQQQ') == {1, 2}
+    assert ledger.get(2).parent_id == 1
+
+
+def test_incremental_reconcile_only_diffs_dirty_orders():
+    """After the snapshot, only orders reported by events are examined"""
+    ledger = OrderLedger()
+    reconciler = OrderReconciler(ledger, symbols={'TQQQ'})
+    reconciler.reconcile(snapshot=lambda: [make_trade(1), make_trade(2)])
+
+    snapshot_calls = []
+    reconciler.on_trade(make_trade(1, price=79.5))        # Modified
+    reconciler.on_trade(make_trade(2, status='Cancelled'))  # Removed
+    reconciler.on_trade(make_trade(3))                    # Placed elsewhere
+    reconciler.on_trade(make_trade(4, symbol='SOXL'))     # Not ours
+    result = reconciler.reconcile(snapshot=lambda: snapshot_calls.append(1) or [])
+    assert not snapshot_calls
+    assert (result['added'], result['changed'], result['removed']) == (1, 1, 1)
+    assert ledger.get(1).price == 79.5
+    assert 2 not in ledger and 4 not in ledger
+    assert reconciler.pending() == 0
+
+
+def test_unchanged_event_is_not_written():
+    """Status updates that do not change the tracked fields produce an empty diff"""
+    ledger = OrderLedger()
+    reconciler = OrderReconciler(ledger)
+    reconciler.reconcile(snapshot=lambda: [make_trade(1)])
+    reconciler.on_trade(make_trade(1, status='PreSubmitted'))
+    result = reconciler.reconcile()
+    assert (result['added'], result['changed'], result['removed']) == (0, 0, 0)
+
+
+def test_mark_stale_forces_snapshot():
+    """A reconnect makes the next reconcile take a full snapshot again"""
+    clock = SimpleNamespace(now=0.0)
+    reconciler = OrderReconciler(OrderLedger(), integrity_interval=300, clock=lambda: clock.now)
+    reconciler.reconcile(snapshot=list)
+    assert not reconciler.snapshot_due()
+    reconciler.mark_stale()
+    assert reconciler.reconcile(snapshot=list)['full']
+    clock.now = 301
+    assert reconciler.snapshot_due()
+
+
+def test_filled_while_away_is_not_cancelled():
+    """An order that vanished from the snapshot after backfilled fills is marked Filled"""
+    ledger = OrderLedger()
+    ledger.add(1, 'TQQQ', 'BUY', 80.0, 10)
+    ledger.add(2, 'TQQQ', 'BUY', 79.0, 10)
+    ledger.apply_fill(1, 10)
+    statuses = []
+    ledger.enqueue = lambda **rows: statuses.extend(rows.get('statuses', ()))
+    OrderReconciler(ledger).reconcile(snapshot=list)
+    assert sorted(statuses) == [(1, 'Filled'), (2, 'Cancelled')]
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from order_ledger import OrderLedger
+from retention import RetentionManager, resident_memory
+
+NOW = datetime(2025, 6, 2, 15, 0, tzinfo=timezone.utc).timestamp()
+
+
+def at(seconds_ago):
+    return datetime.fromtimestamp(NOW - seconds_ago, timezone.utc)
+
+
+def make_trade(order_id, status, finished_ago, log_entries=1):
+    return SimpleNamespace(
+        order=SimpleNamespace(orderId=order_id, permId=order_id * 100),
+        orderStatus=SimpleNamespace(status=status),
+        log=[SimpleNamespace(time=at(finished_ago + i)) for i in reversed(range(log_entries))],
+    )
+
+
+class FakeDB:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def get_exec_cursor(self):
+        return self.cursor
+
+
+def make_ib(trades, fills):
+    wrapper = SimpleNamespace(
+        trades={(2, trade.order.orderId): trade for trade in trades},
+        permId2Trade={trade.order.permId: trade for trade in trades},
+        fills=fills,
+    )
+    return SimpleNamespace(wrapper=wrapper)
+
+
+def test_prunes_only_old_finished_untracked_trades():
+    """Done trades past the window go; working, recent or still-tracked ones stay"""
+    old_filled = make_trade(1, 'Filled', 7200)
+    recent_cancelled = make_trade(2, 'Cancelled', 60)
+    working = make_trade(3, 'Submitted', 7200, log_entries=50)
+    tracked = make_trade(4, 'Filled', 7200)
+    ledger = OrderLedger()
+    ledger.add(4, 'TQQQ', 'SELL', 90.0, 30)
+    ib = make_ib([old_filled, recent_cancelled, working, tracked], {})
+    retention = RetentionManager(ib, ledger, keep_seconds=3600, max_log_entries=20, clock=lambda: NOW)
+
+    assert retention.prune()['trades'] == 1
+    assert sorted(key[1] for key in ib.wrapper.trades) == [2, 3, 4]
+    assert 100 not in ib.wrapper.permId2Trade
+    assert len(working.log) == 20
+    assert retention.get_stats()['trimmed_log_entries'] == 30
+
+
+def test_fills_pruned_only_once_persisted():
+    """Fills are kept until the execution cursor has moved past them"""
+    fills = {
+        'e1': SimpleNamespace(time=at(7200)),
+        'e2': SimpleNamespace(time=at(5000)),
+        'e3': SimpleNamespace(time=at(60)),
+    }
+    db = FakeDB((at(6000).isoformat(), 'e1x'))
+    retention = RetentionManager(make_ib([], fills), OrderLedger(), db=db, keep_seconds=3600, clock=lambda: NOW)
+
+    assert retention.prune()['fills'] == 1
+    assert sorted(fills) == ['e2', 'e3']
+
+    db.cursor = None
+    assert RetentionManager(make_ib([], fills), OrderLedger(), db=db, clock=lambda: NOW).prune()['fills'] == 0
+
+
+def test_maybe_prune_is_throttled():
+    clock = SimpleNamespace(now=NOW)
+    retention = RetentionManager(make_ib([], {}), OrderLedger(), interval=300, clock=lambda: clock.now)
+    assert retention.maybe_prune() is not None
+    clock.now += 10
+    assert retention.maybe_prune() is None
+    clock.now += 300
+    assert retention.maybe_prune() is not None
+
+
+def test_stats_report_counts_and_memory():
+    ib = make_ib([make_trade(1, 'Filled', 10, log_entries=3)], {'e1': SimpleNamespace(time=at(10))})
+    stats = RetentionManager(ib, OrderLedger()).get_stats()
+    assert stats['trades'] == 1 and stats['done_trades'] == 1
+    assert stats['trade_log_entries'] == 3
+    assert stats['fills'] == 1
+    rss = resident_memory()
+    assert rss is None or rss > 0
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from scheduler import StrategyScheduler
+
+
+def test_triggers_within_debounce_are_coalesced():
+    """A burst of triggers produces one batch with every key and reason"""
+    scheduler = StrategyScheduler(debounce=0.01)
+
+    async def run():
+        for _ in range(50):
+            scheduler.trigger('TQQQ', 'price')
+        scheduler.trigger('TQQQ', 'fill')
+        scheduler.trigger('SOXL', 'fill')
+        batch = await asyncio.wait_for(scheduler.next_batch(), 1)
+        return batch, scheduler._ready.is_set()
+
+    batch, still_ready = asyncio.run(run())
+    assert batch == {'TQQQ': {'price', 'fill'}, 'SOXL': {'fill'}}
+    assert not still_ready
+    assert scheduler.batches == 1
+    assert scheduler.triggers['price'] == 50
+
+
+def test_idle_scheduler_does_not_wake():
+    scheduler = StrategyScheduler(debounce=0.001)
+
+    async def run():
+        try:
+            await asyncio.wait_for(scheduler.next_batch(), 0.05)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    assert asyncio.run(run()) is False
+
+
+def test_timer_is_replaced_not_stacked():
+    scheduler = StrategyScheduler(debounce=0.001)
+
+    async def run():
+        scheduler.after('TQQQ', 10)
+        scheduler.after('TQQQ', 0.01)
+        batch = await asyncio.wait_for(scheduler.next_batch(), 1)
+        return batch, len(scheduler._timers)
+
+    assert asyncio.run(run()) == ({'TQQQ': {'timer'}}, 0)
+
+
+def test_price_trigger_fires_once_per_anchor():
+    scheduler = StrategyScheduler(debounce=0.001)
+
+    async def run():
+        scheduler.anchor('TQQQ', 100.0, 0.01)
+        scheduler.on_price('TQQQ', 100.5)
+        scheduler.on_price('TQQQ', 98.9)
+        scheduler.on_price('TQQQ', 97.0)  # Not re-armed yet
+        return await asyncio.wait_for(scheduler.next_batch(), 1)
+
+    assert asyncio.run(run()) == {'TQQQ': {'price'}}
+    assert scheduler.triggers['price'] == 1
+
+
+def test_session_transition_wakes_every_key():
+    """The session timer is armed for the next boundary (here 09:31 ET on a weekday)"""
+    now = datetime(2025, 6, 2, 9, 30, 59, tzinfo=ZoneInfo('America/New_York'))
+    scheduler = StrategyScheduler(debounce=0.001, now=lambda: now)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        scheduler.watch_sessions(lambda: ['TQQQ', 'SOXL'])
+        delay = scheduler._session_timer.when() - loop.time()
+        scheduler._session_timer._run()  # Fire it without waiting for the boundary
+        batch = await asyncio.wait_for(scheduler.next_batch(), 1)
+        scheduler.close()
+        return delay, batch
+
+    delay, batch = asyncio.run(run())
+    assert 0 < delay < 3
+    assert batch == {'TQQQ': {'session'}, 'SOXL': {'session'}}
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from settings import ConfigWatcher, Settings, diff_settings, load_settings
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_parses_types_and_grid_defaults():
+    settings = Settings.from_dict({'symbol': 'TQQQ', 'tws_port': '4001', 'strategy_budget': 50000, 'lot_size': 10,
+                                   'grids': [{'symbol': 'TQQQ'}, {'symbol': 'SOXL', 'profit_pct': 0.02}]})
+    assert settings.tws_port == 4001 and isinstance(settings.strategy_budget, float)
+    assert Settings.from_dict({'symbol': 'TQQQ', 'paper_trading': 'false'}).paper_trading is False
+    assert settings.grid('SOXL').profit_pct == 0.02 and settings.grid('TQQQ').profit_pct == 0.015
+    # Dict-style access keeps working, including for keys the settings do not declare
+    assert settings['symbol'] == 'TQQQ' and settings.get('lot_size') == 10 and settings.get('missing', 1) == 1
+    with pytest.raises(KeyError):
+        settings['missing']
+
+
+@pytest.mark.parametrize('raw', [
+    {'profit_pct': 0.015},
+    {'symbol': 'TQQQ', 'crash_pct': 1.5},
+    {'symbol': 'TQQQ', 'num_levels': 2.5},
+    {'symbol': 'TQQQ', 'strategy_budget': 'lots'},
+    {'symbol': 'TQQQ', 'paper_trading': 'maybe'},
+    {'symbol': 'TQQQ', 'grids': [{'symbol': 'A', 'profit_pc': 0.02}]},
+    {'symbol': 'TQQQ', 'grids': [{'symbol': 'A'}, {'symbol': 'A'}]},
+])
+def test_invalid_config_is_rejected(raw):
+    with pytest.raises(ValueError):
+        Settings.from_dict(raw)
+
+
+def test_file_is_parsed_once_per_change(tmp_path):
+    path = tmp_path / 'config.yaml'
+    write(path, "symbol: TQQQ\n", 10**18)
+    first = load_settings(str(path))
+    assert load_settings(str(path)) is first
+    write(path, "symbol: TQQQ\nprofit_pct: 0.02\n", 2 * 10**18)
+    assert load_settings(str(path)).profit_pct == 0.02
+
+
+def test_diff_reports_changed_added_and_removed():
+    old = Settings.from_dict({'symbol': 'TQQQ', 'grids': [{'symbol': 'TQQQ'}, {'symbol': 'SOXL'}]})
+    new = Settings.from_dict({'symbol': 'TQQQ', 'profit_pct': 0.02, 'client_id': 7,
+                              'grids': [{'symbol': 'TQQQ'}, {'symbol': 'TSLA'}]})
+    changes = diff_settings(old, new)
+    assert changes['settings'] == {'profit_pct', 'client_id'}
+    assert changes['grids'] == {'TQQQ': {'profit_pct'}}
+    assert changes['added'] == ['TSLA'] and changes['removed'] == ['SOXL']
+
+
+def test_watcher_stages_valid_edits_and_ignores_bad_ones(tmp_path):
+    path = tmp_path / 'config.yaml'
+    write(path, "symbol: TQQQ\n", 10**18)
+    watcher = ConfigWatcher(str(path))
+    assert not watcher.check()
+
+    write(path, "symbol: TQQQ\ncrash_pct: 3\n", 2 * 10**18)
+    assert not watcher.check() and watcher.rejected == 1
+    assert not watcher.check() and watcher.rejected == 1  # Reported once per edit
+
+    write(path, "symbol: TQQQ\nprofit_pct: 0.02\n", 3 * 10**18)
+    assert watcher.check()
+    settings, changes = watcher.take()
+    assert settings.profit_pct == 0.02 and changes['settings'] == {'profit_pct'}
+    assert watcher.settings is settings and watcher.take() == (None, None)
+
+
+def test_watcher_applies_a_new_poll_interval(tmp_path):
+    path = tmp_path / 'config.yaml'
+    write(path, "symbol: TQQQ\n", 10**18)
+    watcher = ConfigWatcher(str(path))
+    assert watcher.interval == 5.0
+    write(path, "symbol: TQQQ\nconfig_poll_seconds: 1\n", 2 * 10**18)
+    assert watcher.check()
+    watcher.take()
+    assert watcher.interval == 1.0
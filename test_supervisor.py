@@ -0,0 +1,82 @@
+import asyncio
+
+from supervisor import ConnectionSupervisor
+
+
+class FakeEvent:
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def emit(self, *args):
+        for handler in list(self.handlers):
+            handler(*args)
+
+
+class FakeIB:
+    def __init__(self, failures=0):
+        self.disconnectedEvent = FakeEvent()
+        self.failures = failures
+        self.attempts = 0
+
+    async def connectAsync(self, host, port, clientId, timeout):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionRefusedError('gateway restarting')
+
+
+class FakeClient:
+    port = 4002
+    client_id = 2
+
+    def __init__(self, ib):
+        self.ib = ib
+        self.connected = True
+        self.resumed = 0
+
+    async def resume(self):
+        self.resumed += 1
+        self.connected = True
+
+
+def test_reconnects_with_backoff_and_resumes():
+    """A dropped connection is retried until it comes back, then state is resumed once"""
+    client = FakeClient(FakeIB(failures=2))
+    supervisor = ConnectionSupervisor(client, base_delay=0.001, max_delay=0.01)
+    supervisor.start()
+
+    async def run():
+        client.ib.disconnectedEvent.emit()
+        assert not client.connected
+        assert await supervisor.wait_connected(timeout=1)
+
+    asyncio.run(run())
+    assert client.ib.attempts == 3
+    assert client.resumed == 1
+    stats = supervisor.get_stats()
+    assert stats['disconnects'] == 1 and stats['reconnects'] == 1 and stats['failed_attempts'] == 2
+    assert stats['last_time_to_recover'] >= stats['last_downtime'] > 0
+
+
+def test_intentional_disconnect_is_ignored():
+    """After stop() a disconnect does not trigger a reconnect"""
+    client = FakeClient(FakeIB())
+    supervisor = ConnectionSupervisor(client)
+    supervisor.start()
+    supervisor.stop()
+    client.ib.disconnectedEvent.emit()
+    assert supervisor.get_stats()['disconnects'] == 0
+
+
+def test_backoff_is_capped_and_jittered():
+    supervisor = ConnectionSupervisor(FakeClient(FakeIB()), base_delay=1, max_delay=8, jitter=0.5)
+    delays = [supervisor.backoff(10) for _ in range(50)]
+    assert all(4 <= delay <= 12 for delay in delays)
+    assert len(set(delays)) > 1
@@ -1,7 +1,7 @@
 # grid-trading/utils.py
 
 import os
-from datetime import datetime
+from datetime import datetime, time as dtime, timedelta
 import logging
 from math import floor
 import math
@@ -17,8 +17,53 @@ def setup_logger(log_file):
         logger.addHandler(handler)
     return logger
 
-def round_price(price):
-    return round(price, 2)
+def round_price(price, min_tick=0.01):
+    """Round a price to the nearest multiple of the contract's minimum tick"""
+    if not min_tick or min_tick <= 0:
+        return round(price, 2)
+    decimals = max(0, -math.floor(math.log10(min_tick)))
+    return round(round(price / min_tick) * min_tick, decimals)
+
+# Customizable session boundaries (US/Eastern)
+PRE_MARKET_OPEN = dtime(4, 5)
+PRE_MARKET_CLOSE = dtime(7, 30)
+REGULAR_OPEN = dtime(9, 31)
+REGULAR_CLOSE = dtime(15, 57)
+AFTER_HOURS_OPEN = dtime(16, 10)
+AFTER_HOURS_CLOSE = dtime(19, 45)
+OVERNIGHT_OPEN = dtime(20, 15)
+OVERNIGHT_CLOSE = dtime(3, 45)
+SESSION_BOUNDARIES = (dtime(0, 0), OVERNIGHT_CLOSE, PRE_MARKET_OPEN, PRE_MARKET_CLOSE, REGULAR_OPEN,
+                      REGULAR_CLOSE, AFTER_HOURS_OPEN, AFTER_HOURS_CLOSE, OVERNIGHT_OPEN)
+
+def trading_period(now):
+    """Trading period at an Eastern time: 'pre-market', 'regular', 'after-hours', 'overnight' or 'closed'"""
+    # Check if it's weekend (Saturday = 5, Sunday = 6)
+    if now.weekday() >= 5:
+        return 'closed'
+    now_time = now.time()
+    if PRE_MARKET_OPEN <= now_time < PRE_MARKET_CLOSE:
+        return 'pre-market'
+    elif REGULAR_OPEN <= now_time < REGULAR_CLOSE:
+        return 'regular'
+    elif AFTER_HOURS_OPEN <= now_time < AFTER_HOURS_CLOSE:
+        return 'after-hours'
+    elif (now_time >= OVERNIGHT_OPEN) or (now_time < OVERNIGHT_CLOSE):
+        return 'overnight'
+    else:
+        return 'closed'
+
+def next_session_change(now):
+    """First Eastern datetime after now at which trading_period() changes"""
+    current = trading_period(now)
+    for day in range(4):  # A weekend is the longest stretch without a change
+        date = (now + timedelta(days=day)).date()
+        for boundary in SESSION_BOUNDARIES:
+            candidate = now.tzinfo.localize(datetime.combine(date, boundary)) if hasattr(now.tzinfo, 'localize') \
+                else datetime.combine(date, boundary, tzinfo=now.tzinfo)
+            if candidate > now and trading_period(candidate) != current:
+                return candidate
+    return None
 
 def calculate_lot_size_and_interval(cash, current_price, crash_pct=0.87, range_fraction=0.565):
     """